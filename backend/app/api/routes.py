@@ -1,10 +1,63 @@
-from fastapi import APIRouter, HTTPException
-from app.models.schemas import TaskAnalysisRequest, TaskAnalysisResponse, ErrorResponse
-from app.services.parser import parse_tasks, validate_task_count
+import asyncio
+import os
+import time
+from typing import AsyncGenerator, AsyncIterator, Dict, List, Tuple
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import ValidationError
+from app.models.schemas import BatchAnalysisRequest, JobStatus, TaskAnalysisRequest, TaskAnalysisResponse, ErrorResponse
+from app.services.parser import parse_task_records, task_parents, validate_task_count
 from app.services.ai_service import AIService
+from app.services.admission import AdmissionController, AdmissionRejected, admission_scope
+from app.services.jobs import JobQueue
+from app.services.metrics import REGISTRY, MetricsDirectory
+from app.services.resilience import DeadlineExceeded, deadline_scope
+from app.services.serialization import dumps, render_analysis
+from app.services.tracing import exporter_from_env, span, start_trace
 
 router = APIRouter()
 
+PARSE_SECONDS = REGISTRY.histogram("parse_tasks_seconds", "Time spent in parse_tasks")
+REQUEST_SECONDS = REGISTRY.histogram("analyze_request_seconds", "Total time to handle POST /api/analyze")
+TASKS_PER_REQUEST = REGISTRY.histogram(
+    "analyze_tasks_per_request",
+    "Number of parsed tasks per analysis",
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+)
+
+# Maximum number of batch items analyzed at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# Maximum tasks per list; lists above AIService.shard_size are analyzed in parallel shards
+MAX_TASKS = int(os.getenv("MAX_TASKS", "500"))
+
+# Number of trusted proxies in front of the app, each appending the address it
+# was connected from to X-Forwarded-For; 0 uses the connecting address itself
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+# Per-client rate limits and the global in-flight limit on LLM work
+admission = AdmissionController.from_env()
+
+# Background analyses submitted to POST /jobs (JOB_WORKERS, JOB_MAX_QUEUED, JOB_RESULT_TTL_SECONDS)
+jobs = JobQueue.from_env()
+
+# Processes serving this socket; app.serve sets it to the number it forked
+WORKER_PROCESSES = int(os.getenv("WEB_CONCURRENCY") or "1")
+
+# Where the workers share their metrics and stats (METRICS_DIR, set by app.serve); None for one process
+metrics_directory = MetricsDirectory.from_env()
+
+# Jobs hold no connection open, so they may run longer than a request
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "120"))
+
+# Where finished request traces go (TRACE_EXPORT_PATH / TRACE_OTLP_ENDPOINT); None disables export
+trace_exporter = exporter_from_env()
+
+# Open a connection to the model API during startup warm-up
+WARMUP_CONNECTIONS = os.getenv("WARMUP_CONNECTIONS", "true").lower() in ("1", "true", "yes")
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "5"))
+
 # Initialize AI service (will be created once)
 _ai_service = None
 
@@ -16,8 +69,87 @@ def get_ai_service() -> AIService:
     return _ai_service
 
 
+async def warm_up() -> Dict[str, object]:
+    """
+    Build the AI service and open its connection to the model API ahead of the first request.
+    
+    Returns:
+        What was warmed and how long it took, for the readiness endpoint
+        
+    Raises:
+        ValueError: If the AI service cannot be built (e.g. no API key)
+    """
+    start = time.perf_counter()
+    ai_service = get_ai_service()
+    # First use of the validators, serializers and heuristic engine builds their lazy state
+    render_analysis(ai_service.local_engine.analyze(["Warm up the service"]))
+    report: Dict[str, object] = {}
+    if WARMUP_CONNECTIONS:
+        # Any authenticated call leaves a TLS connection in the client's pool
+        try:
+            await asyncio.wait_for(ai_service.async_client.models.list(), timeout=WARMUP_TIMEOUT_SECONDS)
+            report["connection"] = "open"
+        except Exception as e:
+            report["connection"] = f"failed: {type(e).__name__}"
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    return report
+
+
+def client_id(http_request: Request) -> str:
+    """
+    Rate-limit key for a request: the client's address.
+    
+    Client-supplied identifiers such as an X-API-Key header are ignored: the
+    app does not validate keys, so a client could send a fresh one per
+    request to dodge its limit and push real clients out of the buckets.
+    
+    Behind TRUSTED_PROXY_HOPS proxies the address is the X-Forwarded-For
+    entry the outermost of them appended, counted from the right. Entries
+    further left were sent by the client and could be anything.
+    """
+    if TRUSTED_PROXY_HOPS > 0:
+        forwarded = [entry.strip() for entry in http_request.headers.get("x-forwarded-for", "").split(",")]
+        if len(forwarded) >= TRUSTED_PROXY_HOPS and forwarded[-TRUSTED_PROXY_HOPS]:
+            return f"ip:{forwarded[-TRUSTED_PROXY_HOPS]}"
+    return f"ip:{http_request.client.host if http_request.client else 'unknown'}"
+
+
+def _rejection(e: AdmissionRejected) -> HTTPException:
+    """HTTP error for a request shed by admission control."""
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={"Retry-After": e.retry_after_header}
+    )
+
+
+def _count_error(error: Exception) -> None:
+    """Count a failed or rejected analysis by exception class."""
+    REGISTRY.counter(
+        "analyze_errors_total",
+        "Failed or rejected analyses by exception class",
+        labels={"error": type(error).__name__}
+    ).inc()
+
+
+def _parse(text: str) -> Tuple[List[str], Dict[str, str]]:
+    """The tasks in text and the task each sub-item is nested under, timed for the metrics endpoint."""
+    with PARSE_SECONDS.time(), span("parse"):
+        records = parse_task_records(text)
+        return [record.text for record in records], task_parents(records)
+
+
+def _admit_client(http_request: Request, cost: float = 1) -> None:
+    """Charge the calling client, rejecting with 429 when it is over its rate."""
+    try:
+        admission.check_client(client_id(http_request), cost)
+    except AdmissionRejected as e:
+        _count_error(e)
+        raise _rejection(e)
+
+
 @router.post("/analyze", response_model=TaskAnalysisResponse)
-async def analyze_tasks(request: TaskAnalysisRequest) -> TaskAnalysisResponse:
+async def analyze_tasks(request: TaskAnalysisRequest, http_request: Request) -> Response:
     """
     Analyze tasks and return prioritized breakdown with next action.
     
@@ -25,14 +157,36 @@ async def analyze_tasks(request: TaskAnalysisRequest) -> TaskAnalysisResponse:
         request: TaskAnalysisRequest with tasks text
         
     Returns:
-        TaskAnalysisResponse with priorities, breakdowns, and next action
+        TaskAnalysisResponse with priorities, breakdowns, and next action,
+        with per-stage timings in the Server-Timing header. The result is
+        already validated, so it is rendered here rather than revalidated
+        through response_model (which still documents the schema).
         
     Raises:
-        HTTPException: If analysis fails
+        HTTPException: If analysis fails, or 429/503 with Retry-After when shed
     """
+    with REQUEST_SECONDS.time(), start_trace("POST /api/analyze") as trace:
+        try:
+            result = await _analyze(request, http_request)
+            with span("serialize"):
+                body = render_analysis(result)
+        finally:
+            trace.finish()
+            if trace_exporter is not None:
+                trace_exporter.submit(trace)
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={"Server-Timing": trace.server_timing()}
+        )
+
+
+async def _analyze(request: TaskAnalysisRequest, http_request: Request) -> TaskAnalysisResponse:
+    """Body of POST /analyze, timed as a whole by analyze_tasks."""
+    _admit_client(http_request)
     try:
         # Parse tasks from input
-        tasks = parse_tasks(request.tasks)
+        tasks, parents = _parse(request.tasks)
         
         if not tasks:
             raise HTTPException(
@@ -41,17 +195,32 @@ async def analyze_tasks(request: TaskAnalysisRequest) -> TaskAnalysisResponse:
             )
         
         # Validate task count
-        validate_task_count(tasks)
+        with span("validate"):
+            validate_task_count(tasks, max_tasks=MAX_TASKS)
+        TASKS_PER_REQUEST.observe(len(tasks))
         
-        # Get AI service and analyze
+        # Get AI service and analyze without blocking the event loop
         ai_service = get_ai_service()
-        result = ai_service.analyze_tasks(tasks)
+        # Queueing, retries and model calls all share one deadline; every
+        # model call (one per shard) waits for its own in-flight slot
+        with deadline_scope(), admission_scope(admission), span("analyze", tasks=len(tasks)):
+            result = await ai_service.analyze_tasks_async(tasks, parents=parents)
         
         return result
         
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        _count_error(e)
+        raise _rejection(e)
+    except DeadlineExceeded as e:
+        _count_error(e)
+        raise HTTPException(status_code=504, detail=str(e))
     except ValueError as e:
+        _count_error(e)
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        _count_error(e)
         # Log the error (in production, use proper logging)
         error_msg = str(e)
         if "OPENAI_API_KEY" in error_msg:
@@ -64,3 +233,278 @@ async def analyze_tasks(request: TaskAnalysisRequest) -> TaskAnalysisResponse:
             detail=f"Failed to analyze tasks: {error_msg}"
         )
 
+
+
+def _format_sse(event: str, data) -> str:
+    """Encode one Server-Sent Events message."""
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+
+async def _sse_stream(
+    events: AsyncGenerator[Tuple[str, Dict], None],
+    controller: AdmissionController
+) -> AsyncIterator[str]:
+    """Relay analysis events as SSE while holding an in-flight slot, reporting failures as a final error event."""
+    # The slot is taken and released in here, so a client that leaves before
+    # streaming starts never holds one
+    try:
+        async with controller.slot():
+            async for event, data in events:
+                yield _format_sse(event, data)
+    except Exception as e:
+        # Headers are already sent, so the error has to travel in-band
+        yield _format_sse("error", {"detail": f"Failed to analyze tasks: {e}"})
+    finally:
+        await events.aclose()
+
+
+async def _close_stream(stream: AsyncGenerator) -> None:
+    await stream.aclose()
+
+
+@router.post("/analyze/stream")
+async def analyze_tasks_stream(request: TaskAnalysisRequest, http_request: Request) -> StreamingResponse:
+    """
+    Analyze tasks and stream the result as Server-Sent Events.
+    
+    Emits next_action first, then priorities, then one breakdown event per
+    task as soon as each is generated, and a final complete event carrying
+    the full TaskAnalysisResponse.
+    
+    Args:
+        request: TaskAnalysisRequest with tasks text
+        
+    Returns:
+        text/event-stream response
+        
+    Raises:
+        HTTPException: If the input is invalid or the AI service is unavailable,
+            or 429/503 with Retry-After when shed
+    """
+    _admit_client(http_request)
+    tasks, parents = _parse(request.tasks)
+    if not tasks:
+        raise HTTPException(
+            status_code=400,
+            detail="No valid tasks found in input. Please provide at least one task."
+        )
+    try:
+        ai_service = get_ai_service()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    try:
+        # Streaming runs a single completion, so the list must fit one model answer
+        validate_task_count(tasks, max_tasks=ai_service.max_stream_tasks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Shed now if the server is full; the slot itself is held while the stream runs
+    try:
+        admission.check_capacity()
+    except AdmissionRejected as e:
+        _count_error(e)
+        raise _rejection(e)
+    
+    stream = _sse_stream(ai_service.stream_analysis(tasks, parents=parents), admission)
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Starlette does not close a body it stopped iterating (client gone);
+        # closing it here runs the slot's release at once
+        background=BackgroundTask(_close_stream, stream)
+    )
+
+
+def _batch_item_tasks(text: str) -> Tuple[List[str], Dict[str, str]]:
+    """Validate and parse one batch item the same way /analyze treats its body."""
+    try:
+        text = TaskAnalysisRequest(tasks=text).tasks
+    except ValidationError as e:
+        raise ValueError(e.errors()[0]["msg"])
+    tasks, parents = _parse(text)
+    if not tasks:
+        raise ValueError("No valid tasks found in input. Please provide at least one task.")
+    validate_task_count(tasks, max_tasks=MAX_TASKS)
+    return tasks, parents
+
+
+async def _batch_results(items: List[str], ai_service: AIService, concurrency: int) -> AsyncIterator[str]:
+    """Analyze items concurrently and yield NDJSON lines in completion order."""
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run(index: int, text: str) -> Dict:
+        async with semaphore:
+            try:
+                tasks, parents = _batch_item_tasks(text)
+                with deadline_scope(), admission_scope(admission):
+                    result = await ai_service.analyze_tasks_async(tasks, parents=parents)
+                return {"index": index, "result": result.model_dump(), "error": None}
+            except Exception as e:
+                _count_error(e)
+                return {"index": index, "result": None, "error": str(e)}
+    
+    pending = [asyncio.ensure_future(run(i, text)) for i, text in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(pending):
+            item = await next_done
+            yield dumps(item) + b"\n"
+    finally:
+        # Stop outstanding work if the client goes away mid-stream
+        for task in pending:
+            task.cancel()
+
+
+@router.post("/analyze/batch")
+async def analyze_tasks_batch(request: BatchAnalysisRequest, http_request: Request) -> StreamingResponse:
+    """
+    Analyze several task lists concurrently and stream the results as NDJSON.
+    
+    Each output line is {"index": i, "result": TaskAnalysisResponse | null,
+    "error": str | null}, written as soon as that item finishes, so one slow
+    list does not hold back the others. At most BATCH_CONCURRENCY items are
+    analyzed at once. The client is charged one rate-limit token per item.
+    
+    Args:
+        request: BatchAnalysisRequest with one raw task text per item
+        
+    Returns:
+        application/x-ndjson response
+        
+    Raises:
+        HTTPException: If the AI service is unavailable, or 429 with Retry-After
+            when the client is over its rate
+    """
+    _admit_client(http_request, cost=len(request.items))
+    try:
+        ai_service = get_ai_service()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return StreamingResponse(
+        _batch_results(request.items, ai_service, BATCH_CONCURRENCY),
+        media_type="application/x-ndjson"
+    )
+
+
+async def _run_job(ai_service: AIService, tasks: List[str], parents: Dict[str, str]) -> Dict:
+    """One job's work: the /analyze pipeline under the job deadline, traced like a request."""
+    with start_trace("job") as trace:
+        try:
+            # Every model call (one per shard) takes an in-flight slot like a request's would,
+            # waiting for one as background work instead of being shed
+            with deadline_scope(JOB_DEADLINE_SECONDS), admission_scope(admission, background=True):
+                with span("analyze", tasks=len(tasks)):
+                    result = await ai_service.analyze_tasks_async(tasks, parents=parents)
+        except Exception as e:
+            _count_error(e)
+            raise
+        finally:
+            trace.finish()
+            if trace_exporter is not None:
+                trace_exporter.submit(trace)
+    return result.model_dump()
+
+
+@router.post("/jobs", status_code=202, response_model=JobStatus)
+async def create_job(request: TaskAnalysisRequest, http_request: Request) -> Response:
+    """
+    Queue an analysis and return its job id without waiting for it.
+    
+    The job runs the same pipeline as /analyze on a background worker;
+    poll GET /api/jobs/{id} (also sent as the Location header) for the result.
+    
+    Args:
+        request: TaskAnalysisRequest with tasks text
+        
+    Returns:
+        202 with the queued JobStatus
+        
+    Raises:
+        HTTPException: If the input is invalid or the AI service is unavailable,
+            503 if several workers run without a shared store, or 429/503 with
+            Retry-After when the client is over its rate or the job queue is full
+    """
+    if jobs.store is None and WORKER_PROCESSES > 1:
+        # Polls would land on a worker that never saw the job about half the time
+        raise HTTPException(
+            status_code=503,
+            detail="Background jobs need ANALYSIS_STORE_PATH when the server runs more than one worker"
+        )
+    _admit_client(http_request)
+    tasks, parents = _parse(request.tasks)
+    if not tasks:
+        raise HTTPException(
+            status_code=400,
+            detail="No valid tasks found in input. Please provide at least one task."
+        )
+    try:
+        validate_task_count(tasks, max_tasks=MAX_TASKS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    TASKS_PER_REQUEST.observe(len(tasks))
+    
+    try:
+        ai_service = get_ai_service()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    try:
+        job = await jobs.submit(lambda: _run_job(ai_service, tasks, parents))
+    except AdmissionRejected as e:
+        _count_error(e)
+        raise _rejection(e)
+    return Response(
+        content=dumps(job.view()),
+        status_code=202,
+        media_type="application/json",
+        headers={"Location": f"{http_request.url.path}/{job.id}"}
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str) -> Response:
+    """
+    Return a job's status, and its result or error once finished.
+    
+    Raises:
+        HTTPException: 404 if the job is unknown or its result has expired
+    """
+    view = await jobs.get(job_id)
+    if view is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return Response(content=dumps(view), media_type="application/json")
+
+
+def worker_stats() -> dict:
+    """This worker's cache, coalescing, admission and job counters."""
+    ai_service = get_ai_service()
+    stats = {
+        "analysis": ai_service.result_cache.stats(),
+        "breakdown": ai_service.breakdown_cache.stats(),
+        "coalescing": ai_service.inflight.stats(),
+        "admission": admission.stats(),
+        "jobs": jobs.stats(),
+    }
+    if ai_service.store is not None:
+        stats["store"] = ai_service.store.stats()
+    if ai_service.similar is not None:
+        stats["similarity"] = ai_service.similar.stats()
+    return stats
+
+
+@router.get("/cache/stats")
+async def cache_stats() -> dict:
+    """
+    Return cache, coalescing and load counters for sizing the caches and limits.
+
+    The top level is the worker that answered. With several workers, "workers"
+    holds every live worker's latest counters by process id.
+    """
+    stats = worker_stats()
+    if metrics_directory is not None:
+        await asyncio.to_thread(metrics_directory.write, stats)
+        stats["worker"] = str(os.getpid())
+        stats["workers"] = await asyncio.to_thread(metrics_directory.worker_stats)
+    return stats
@@ -1,12 +1,62 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
+import logging
 import os
 from app.api import routes
+from app.services.metrics import REGISTRY, MetricsDirectory
 
 load_dotenv()
 
-app = FastAPI(title="ToDo Prioritizer API", version="1.0.0")
+logger = logging.getLogger(__name__)
+
+# Filled in by the startup warm-up; /ready answers 503 until it succeeds
+readiness = {"ready": False, "warmup": None}
+
+
+async def warm_up() -> None:
+    """Run the startup warm-up and record the outcome for /ready."""
+    try:
+        readiness["warmup"] = await routes.warm_up()
+        readiness["ready"] = True
+        logger.info("Warm-up finished: %s", readiness["warmup"])
+    except Exception as e:
+        readiness["warmup"] = {"error": str(e)}
+        logger.exception("Warm-up failed; the instance will not report ready")
+
+
+async def publish_metrics(directory: MetricsDirectory) -> None:
+    """Write this worker's metrics snapshot every flush_seconds so other workers' scrapes include it."""
+    while True:
+        try:
+            await asyncio.to_thread(directory.write, routes.worker_stats())
+        except Exception:
+            logger.exception("Could not write the metrics snapshot to %s", directory.directory)
+        await asyncio.sleep(directory.flush_seconds)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so /health answers while it runs
+    task = asyncio.ensure_future(warm_up())
+    publisher = None
+    if routes.metrics_directory is not None:
+        publisher = asyncio.ensure_future(publish_metrics(routes.metrics_directory))
+    yield
+    task.cancel()
+    await routes.jobs.close()
+    if routes.trace_exporter is not None:
+        await asyncio.to_thread(routes.trace_exporter.close)
+    if publisher is not None:
+        publisher.cancel()
+        # A last snapshot, so the totals keep what this worker counted after it exits
+        routes.metrics_directory.write()
+
+
+app = FastAPI(title="ToDo Prioritizer API", version="1.0.0", lifespan=lifespan)
 
 # CORS configuration
 frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
@@ -29,3 +79,20 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the AI service is built and warmed up, 503 until then."""
+    if not readiness["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming", "warmup": readiness["warmup"]})
+    return {"status": "ready", "warmup": readiness["warmup"]}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint; with several workers, the sum over all of them."""
+    directory = routes.metrics_directory
+    if directory is None:
+        text = REGISTRY.render()
+    else:
+        await asyncio.to_thread(directory.write)
+        text = (await asyncio.to_thread(directory.merged)).render()
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4; charset=utf-8")
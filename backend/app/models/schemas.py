@@ -1,9 +1,13 @@
+import os
 from pydantic import BaseModel, Field, field_validator
 from typing import Dict, List, Optional
 
+# Room for MAX_TASKS (500) tasks of up to ~100 characters; large lists are analyzed in shards
+MAX_INPUT_CHARS = int(os.getenv("MAX_INPUT_CHARS", "50000"))
+
 
 class TaskAnalysisRequest(BaseModel):
-    tasks: str = Field(..., min_length=1, max_length=2000, description="Raw task input text")
+    tasks: str = Field(..., min_length=1, max_length=MAX_INPUT_CHARS, description="Raw task input text")
 
     @field_validator('tasks')
     @classmethod
@@ -13,6 +17,15 @@ class TaskAnalysisRequest(BaseModel):
         return v.strip()
 
 
+class BatchAnalysisRequest(BaseModel):
+    items: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=100,
+        description="Raw task input texts, each analyzed as a separate task list"
+    )
+
+
 class TaskStep(BaseModel):
     step: str = Field(..., description="Actionable step description")
     minutes: int = Field(..., ge=2, le=20, description="Estimated time in minutes (2-20)")
@@ -38,6 +51,20 @@ class TaskAnalysisResponse(BaseModel):
         description="Task breakdowns mapped by task name"
     )
     next_action: NextAction = Field(..., description="The next action to take")
+    degraded: bool = Field(
+        False,
+        description="True when the AI backend was unavailable and the analysis was produced locally"
+    )
+
+
+class JobStatus(BaseModel):
+    id: str = Field(..., description="Job id, for GET /api/jobs/{id}")
+    status: str = Field(..., description="queued, running, done or failed")
+    created_at: float = Field(..., description="Unix time the job was submitted")
+    started_at: Optional[float] = Field(None, description="Unix time a worker started the job")
+    finished_at: Optional[float] = Field(None, description="Unix time the job finished")
+    result: Optional[TaskAnalysisResponse] = Field(None, description="The analysis, once the job is done")
+    error: Optional[str] = Field(None, description="Why the job failed")
 
 
 class ErrorResponse(BaseModel):
@@ -0,0 +1,172 @@
+"""
+Production entry point: WEB_CONCURRENCY uvicorn workers pre-forked from one preloaded app.
+
+The master process imports the app (and the openai client library) once,
+binds the listening socket and forks the workers, so every worker starts
+with the modules already loaded and shares their memory copy-on-write.
+Each worker then warms itself up (see app.main.lifespan) and reports ready
+on /ready. Workers that die are replaced; SIGTERM or SIGINT stops them all
+gracefully.
+
+    HOST=0.0.0.0 PORT=8000 WEB_CONCURRENCY=4 python -m app.serve
+
+WEB_CONCURRENCY defaults to DEFAULT_WORKERS, not the CPU count. Workers
+spend most of their time awaiting the model, so a couple of them keep a
+host busy. The admission limits, client rate buckets and job queue are
+also per worker, and one worker per CPU would multiply them by whatever
+machine the image lands on. When raising WEB_CONCURRENCY, divide
+ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE, CLIENT_RATE_PER_SECOND,
+CLIENT_BURST, JOB_WORKERS and JOB_MAX_QUEUED by the same factor to keep
+the host's totals.
+
+Each worker's metrics and counters only cover the requests it served, so
+with more than one worker they share snapshots in METRICS_DIR (a fresh
+temporary directory unless set) and /metrics and /api/cache/stats report
+the sum over all of them (see app.services.metrics.MetricsDirectory).
+
+uvicorn's own --workers mode is not used because it starts each worker as
+a fresh interpreter that imports everything again.
+"""
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger("app.serve")
+
+# A worker that exits sooner than this after starting is treated as crashing
+MIN_WORKER_LIFETIME_SECONDS = 1.0
+DEFAULT_WORKERS = 2
+
+
+def worker_count() -> int:
+    """WEB_CONCURRENCY, defaulting to DEFAULT_WORKERS whatever the number of CPUs."""
+    configured = os.getenv("WEB_CONCURRENCY")
+    if configured:
+        return max(1, int(configured))
+    return DEFAULT_WORKERS
+
+
+def share_metrics(workers: int) -> Optional[str]:
+    """
+    Point the workers at one METRICS_DIR and clear snapshots left by an earlier run.
+
+    Returns the directory if it was created here (and is removed on exit), else None.
+    """
+    if workers < 2 and not os.getenv("METRICS_DIR"):
+        return None
+    created = None
+    if not os.getenv("METRICS_DIR"):
+        created = tempfile.mkdtemp(prefix="app-metrics-")
+        os.environ["METRICS_DIR"] = created
+    from app.services.metrics import MetricsDirectory
+    MetricsDirectory.from_env().clear()
+    return created
+
+
+def preload():
+    """Import everything the workers need before forking."""
+    from app.main import app
+    # Imported lazily by AIService and on first API call (openai loads its ~500
+    # resource modules then); loading them here keeps them out of every worker's warm-up
+    import anyio._backends._asyncio  # noqa: F401
+    import openai  # noqa: F401
+    import openai.pagination  # noqa: F401
+    import openai.resources  # noqa: F401
+    return app
+
+
+def bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket) -> None:
+    """Serve on the shared socket until uvicorn shuts down (it handles SIGTERM itself)."""
+    import uvicorn
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(
+        app,
+        log_level=os.getenv("LOG_LEVEL", "info"),
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        timeout_graceful_shutdown=float(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "30")),
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "8000"))
+    workers = worker_count()
+    # Lets the app see how many processes share the socket (see routes.WORKER_PROCESSES)
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    created_metrics_dir = share_metrics(workers)
+
+    start = time.perf_counter()
+    app = preload()
+    logger.info("Preloaded the app in %.2fs", time.perf_counter() - start)
+    sock = bind(host, port)
+
+    children: Dict[int, float] = {}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app, sock)
+            finally:
+                os._exit(0)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+    logger.info("Serving on %s:%d with %d workers", host, port, workers)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        logger.warning("Worker %d exited with status %d; starting a replacement", pid, status)
+        if time.monotonic() - started < MIN_WORKER_LIFETIME_SECONDS:
+            # Back off instead of fork-looping on a worker that cannot start
+            time.sleep(MIN_WORKER_LIFETIME_SECONDS)
+        spawn()
+
+    sock.close()
+    if created_metrics_dir:
+        shutil.rmtree(created_metrics_dir, ignore_errors=True)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import asyncio
+import contextvars
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, Tuple
+from app.services.metrics import REGISTRY
+
+RATE_LIMITED = REGISTRY.counter(
+    "admission_rate_limited_total",
+    "Requests rejected with 429 because the client ran out of tokens"
+)
+OVERLOADED = REGISTRY.counter(
+    "admission_overloaded_total",
+    "Requests rejected with 503 because the in-flight limit and wait queue were full"
+)
+
+# The controller of the current admission scope and whether its work is background work
+_current_admission: contextvars.ContextVar[Optional[Tuple["AdmissionController", bool]]] = contextvars.ContextVar(
+    "admission", default=None
+)
+
+
+class AdmissionRejected(Exception):
+    """
+    A request was refused before any work was done.
+
+    Attributes:
+        status_code: 429 (client over its rate) or 503 (server at capacity)
+        retry_after: Seconds the client should wait before retrying
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """Retry-After value in whole seconds (at least 1)."""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """
+    Classic token bucket: refills at rate tokens per second up to capacity.
+
+    A request costing more than capacity is let through from a full bucket
+    and leaves it in debt, so it is still paid for in full before the next.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float, cost: float = 1.0) -> float:
+        """
+        Take cost tokens.
+
+        Returns:
+            0 if the tokens were taken, otherwise the seconds until they will be available
+        """
+        # More than a full bucket can never be on hand, so that is all an oversized request waits for
+        needed = min(cost, self.capacity)
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= needed:
+            self.tokens -= cost
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (needed - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Shed load before it reaches the model.
+
+    Two independent checks:
+      - per-client token buckets (429 when a client exceeds its rate)
+      - a global limit on in-flight LLM work with a bounded wait queue
+        (503 when the queue is full or a waiter times out)
+
+    Both rejections carry a Retry-After estimate. All state lives on the
+    event loop, so no locking is needed.
+
+    Background work (queued jobs) holds no client connection, so it is never
+    shed: it waits for a slot as long as it takes. It may hold or wait for
+    at most background_share of the slots, so requests never queue behind
+    more than that much of it.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 32,
+        max_queue: int = 64,
+        queue_timeout: float = 10.0,
+        client_rate: float = 1.0,
+        client_burst: float = 10.0,
+        max_clients: int = 10000,
+        background_share: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self._clock = clock
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.max_background = max(1, int(max_in_flight * background_share))
+        self._background = asyncio.Semaphore(self.max_background)
+        self._in_flight = 0
+        self._waiting = 0
+        self._background_in_flight = 0
+        # Smoothed time a slot is held, used to estimate Retry-After on overload
+        self._hold_seconds = 1.0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """Build the controller from the ADMISSION_* and CLIENT_* environment variables."""
+        return cls(
+            max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32")),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+            queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10")),
+            client_rate=float(os.getenv("CLIENT_RATE_PER_SECOND", "1")),
+            client_burst=float(os.getenv("CLIENT_BURST", "10")),
+            background_share=float(os.getenv("ADMISSION_BACKGROUND_SHARE", "0.5")),
+        )
+
+    def check_client(self, client_id: str, cost: float = 1.0) -> None:
+        """
+        Charge a client for a request.
+
+        Raises:
+            AdmissionRejected: 429 if the client's bucket does not have enough tokens
+        """
+        now = self._clock()
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = TokenBucket(self.client_rate, self.client_burst, now)
+            self._buckets[client_id] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client_id)
+        wait = bucket.take(now, cost)
+        if wait:
+            RATE_LIMITED.inc()
+            raise AdmissionRejected(429, "Too many requests, please slow down", wait)
+
+    def check_capacity(self) -> None:
+        """
+        Fail fast when a new request could not even wait for a slot.
+
+        Raises:
+            AdmissionRejected: 503 if every slot is taken and the wait queue is full
+        """
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            OVERLOADED.inc()
+            raise AdmissionRejected(503, "Server is at capacity, please retry shortly", self._retry_after())
+
+    async def acquire(self, background: bool = False) -> None:
+        """
+        Take an in-flight slot, waiting in the bounded queue if all are busy.
+
+        Background work waits for its share of the slots instead, without
+        a time limit or a place in the queue.
+
+        Raises:
+            AdmissionRejected: 503 if the queue is full or the wait times out
+        """
+        if background:
+            await self._background.acquire()
+            try:
+                await self._semaphore.acquire()
+            except BaseException:
+                self._background.release()
+                raise
+            self._background_in_flight += 1
+        elif self._semaphore.locked():
+            self.check_capacity()
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                OVERLOADED.inc()
+                raise AdmissionRejected(503, "Timed out waiting for capacity, please retry shortly", self._retry_after())
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self._in_flight += 1
+
+    def release(self, held_seconds: Optional[float] = None, background: bool = False) -> None:
+        """Give back a slot taken with acquire()."""
+        self._in_flight -= 1
+        self._semaphore.release()
+        if background:
+            self._background_in_flight -= 1
+            self._background.release()
+        if held_seconds is not None:
+            self._hold_seconds += 0.2 * (held_seconds - self._hold_seconds)
+
+    @asynccontextmanager
+    async def slot(self, background: bool = False) -> AsyncIterator[None]:
+        """Hold an in-flight slot for the duration of the block."""
+        await self.acquire(background)
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.release(self._clock() - start, background)
+
+    def _retry_after(self) -> float:
+        # Time for the work ahead of a new arrival to drain through the slots
+        return self._hold_seconds * (self._waiting + 1) / max(1, self.max_in_flight)
+
+    def stats(self) -> Dict[str, float]:
+        """Current load and limits."""
+        return {
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "background_in_flight": self._background_in_flight,
+            "max_background": self.max_background,
+            "clients": len(self._buckets),
+        }
+
+
+@contextmanager
+def admission_scope(controller: AdmissionController, background: bool = False) -> Iterator[None]:
+    """
+    Make every llm_slot() inside the block, including in tasks it spawns, take a slot of controller.
+
+    With background, the slots are taken as background work (see AdmissionController).
+    """
+    token = _current_admission.set((controller, background))
+    try:
+        yield
+    finally:
+        _current_admission.reset(token)
+
+
+@asynccontextmanager
+async def llm_slot() -> AsyncIterator[None]:
+    """
+    Hold an in-flight slot of the current admission scope around one model call.
+
+    Outside a scope this does nothing. A sharded analysis takes one slot
+    per shard, so the in-flight limit counts model calls, not requests.
+
+    Raises:
+        AdmissionRejected: 503 if the controller is at capacity
+    """
+    scope = _current_admission.get()
+    if scope is None:
+        yield
+        return
+    controller, background = scope
+    async with controller.slot(background):
+        yield
@@ -1,8 +1,120 @@
+import asyncio
 import os
 import json
-from typing import List, Dict
-from openai import OpenAI
-from app.models.schemas import TaskAnalysisResponse, TaskBreakdown, TaskStep, NextAction
+import logging
+import time
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from app.models.schemas import TaskAnalysisResponse, TaskBreakdown, NextAction
+from app.services.admission import llm_slot
+from app.services.cache import TTLLRUCache, analysis_cache_key, normalize_task
+from app.services.dedup import NearDuplicateDetector, expand_duplicates
+from app.services.json_stream import StreamingJSONParser, salvage_json_object
+from app.services.metrics import REGISTRY
+from app.services.parser import ParsedTask, presort_tasks
+from app.services.prioritizer import HeuristicPrioritizer, RoutingPolicy
+from app.services.resilience import (
+    DEFAULT_DEADLINE_SECONDS,
+    CircuitBreaker,
+    Deadline,
+    DeadlineExceeded,
+    LatencyTracker,
+    RetryPolicy,
+    current_deadline,
+    hedge,
+    iterate_within,
+    retry_async,
+    retry_sync,
+)
+from app.services.serialization import loads, parse_analysis, render_analysis, validate_analysis
+from app.services.sharding import merge_shard_results, split_into_shards
+from app.services.similarity import SimilarityIndex
+from app.services.singleflight import SingleFlight
+from app.services.store import PersistentStore
+from app.services.tokens import completion_cap, estimate_tokens, max_completion_tokens, tasks_within
+from app.services.tracing import span
+
+# Bump whenever the prompt changes so cached analyses from the old prompt are not reused
+PROMPT_VERSION = "5"
+
+logger = logging.getLogger(__name__)
+
+SALVAGED_RESPONSES = REGISTRY.counter(
+    "llm_salvaged_responses_total",
+    "Truncated or malformed completions recovered instead of failing the request"
+)
+SALVAGE_RECOVERED_BREAKDOWNS = REGISTRY.counter(
+    "llm_salvage_recovered_breakdowns_total",
+    "Task breakdowns recovered from salvaged completions"
+)
+SALVAGE_EXPECTED_BREAKDOWNS = REGISTRY.counter(
+    "llm_salvage_expected_breakdowns_total",
+    "Task breakdowns requested in salvaged completions"
+)
+PROMPT_TOKENS = REGISTRY.counter("llm_prompt_tokens_total", "Prompt tokens reported by the API")
+CACHED_PROMPT_TOKENS = REGISTRY.counter(
+    "llm_cached_prompt_tokens_total",
+    "Prompt tokens served from the provider prompt cache"
+)
+COMPLETION_TOKENS = REGISTRY.counter("llm_completion_tokens_total", "Completion tokens reported by the API")
+LOCAL_ANALYSES = REGISTRY.counter(
+    "prioritizer_local_analyses_total",
+    "Analyses answered by the local heuristic engine instead of the LLM"
+)
+ESTIMATED_PROMPT_TOKENS = REGISTRY.counter(
+    "llm_prompt_tokens_estimated_total",
+    "Prompt tokens estimated locally before sending"
+)
+DEGRADED_RESPONSES = REGISTRY.counter(
+    "degraded_responses_total",
+    "Analyses answered locally because the LLM circuit breaker was open"
+)
+FALLBACK_BREAKDOWNS = REGISTRY.counter(
+    "analysis_fallback_breakdowns_total",
+    "Default \"Start working on / Complete\" breakdowns filled in for tasks the model skipped"
+)
+PROMPT_BUILD_SECONDS = REGISTRY.histogram("analysis_prompt_build_seconds", "Time spent building the analysis prompt")
+LLM_SECONDS = REGISTRY.histogram("llm_request_seconds", "Latency of one chat completion call")
+LLM_TTFT_SECONDS = REGISTRY.histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from opening a streamed completion to its first content token"
+)
+RESPONSE_PARSE_SECONDS = REGISTRY.histogram(
+    "analysis_response_parse_seconds",
+    "Time spent validating the model output in _parse_ai_response"
+)
+NEAR_DUPLICATES_COLLAPSED = REGISTRY.counter(
+    "near_duplicate_tasks_collapsed_total",
+    "Reworded duplicate tasks merged before the LLM call"
+)
+
+# Static instructions shared by every request; everything request-specific goes
+# in the user message after it. At ~500 tokens this is below OpenAI's 1024-token
+# minimum for automatic prompt caching, so cached prompt tokens stay at 0 unless
+# it grows past that (keep it byte-for-byte stable if it does).
+SYSTEM_PROMPT = """You are an expert task prioritization and productivity coach. You help people overcome procrastination by breaking overwhelming tasks into tiny, actionable micro-steps.
+
+PRIORITIZE each task using, in order of importance: urgency (deadlines, time-sensitive commitments), impact (consequences of doing or not doing it), dependencies (blocks other tasks or people) and effort (lower effort is easier to start).
+- must: high urgency OR high impact OR blocking others OR has a deadline
+- should: important but not urgent, medium impact, no immediate deadline
+- optional: low priority, nice-to-have, can be deferred
+
+BREAK DOWN each task into 3-8 micro-steps (never fewer than 2):
+- One concrete action per step, starting with an action verb ("Open email client", not "Check email")
+- Each step takes 2-20 minutes: 2-5 for simple actions, 10-15 for moderate, 15-20 for complex ones
+- The first step is so easy it is impossible to say no to (e.g. "Open the document", "Find the phone number") and takes 2-5 minutes
+- Steps build logically on each other
+
+NEXT ACTION: the first step of the highest-priority task (must > should > optional), preferring the smallest action that needs the least preparation.
+
+Reply with one JSON object, keys in this order (next_action first):
+{"next_action": {"task": "<task>", "step": "<first step>", "minutes": 2},
+ "priorities": {"must": ["<task>"], "should": ["<task>"], "optional": ["<task>"]},
+ "breakdown": {"<task>": {"steps": [{"step": "<action>", "minutes": 2}]}}}
+
+Tasks are listed most urgent first. Text in [brackets] after a task is a pre-extracted hint (deadline, effort, urgency), not part of the task name. "part of: <task>" marks a sub-task of another listed task: keep it as its own task, but prioritize and break it down as a step toward that task.
+
+Rules: use the EXACT task names given; put every task in exactly one priority list; give every task a breakdown unless it is listed as already broken down."""
+SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT)
 
 
 class AIService:
@@ -10,15 +122,53 @@ class AIService:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is not set")
-        self.client = OpenAI(api_key=api_key)
+        # openai is by far the slowest import of the app, so it is loaded only
+        # once a service is built (at startup warm-up, not on every import)
+        from openai import AsyncOpenAI, OpenAI
+        # Retries are done by retry_policy, within the request deadline
+        self.client = OpenAI(api_key=api_key, max_retries=0)
+        self.async_client = AsyncOpenAI(api_key=api_key, max_retries=0)
         self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")  # Default to gpt-4o-mini, can use gpt-4o or gpt-3.5-turbo
+        self.result_cache = TTLLRUCache(
+            max_size=int(os.getenv("ANALYSIS_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "3600")),
+        )
+        self.breakdown_cache = TTLLRUCache(
+            max_size=int(os.getenv("BREAKDOWN_CACHE_SIZE", "4096")),
+            ttl_seconds=float(os.getenv("BREAKDOWN_CACHE_TTL_SECONDS", "86400")),
+        )
+        self.inflight = SingleFlight()
+        # Completion budget ceiling, within what this model can produce at once
+        self.max_completion_tokens = completion_cap(self.model)
+        # Lists longer than this are analyzed as concurrent shards (async path only);
+        # a shard never holds more tasks than one completion has room for
+        self.shard_size = min(int(os.getenv("SHARD_SIZE", "20")), tasks_within(self.max_completion_tokens))
+        # stream_analysis answers with a single completion, so its lists are capped the same way
+        self.max_stream_tasks = tasks_within(self.max_completion_tokens)
+        # Short, simple lists are answered locally without a model round-trip
+        self.local_engine = HeuristicPrioritizer()
+        self.routing = RoutingPolicy.from_env(self.local_engine)
+        # Reworded repeats ("Email Bob re: invoice" / "email bob about the invoice")
+        # are sent to the model once; a threshold above 1 turns this off
+        self.dedup = NearDuplicateDetector(float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8")))
+        self.retry_policy = RetryPolicy.from_env()
+        # With LLM_HEDGING on, a call slower than the recent p90 gets a duplicate racing it
+        self.hedging = os.getenv("LLM_HEDGING", "false").lower() in ("1", "true", "yes")
+        self.latency = LatencyTracker()
+        # While the model backend is failing, requests get an immediate local answer
+        self.breaker = CircuitBreaker.from_env()
+        # With ANALYSIS_STORE_PATH set, results survive restarts and are shared across workers
+        self.store = PersistentStore.from_env()
+        # Breakdowns are also reused for reworded tasks seen before in this process
+        self.similar = SimilarityIndex.from_env()
     
-    def analyze_tasks(self, tasks: List[str]) -> TaskAnalysisResponse:
+    def analyze_tasks(self, tasks: List[str], parents: Optional[Dict[str, str]] = None) -> TaskAnalysisResponse:
         """
         Analyze tasks and return prioritized breakdown with next action.
         
         Args:
             tasks: List of task strings
+            parents: Task it is nested under, for each sub-item (see parser.task_parents)
             
         Returns:
             TaskAnalysisResponse with priorities, breakdowns, and next action
@@ -26,150 +176,645 @@ class AIService:
         if not tasks:
             raise ValueError("Tasks list cannot be empty")
         
-        # Create the prompt
-        prompt = self._create_analysis_prompt(tasks)
+        if self.routing.use_local(tasks):
+            LOCAL_ANALYSES.inc()
+            return self.local_engine.analyze(tasks)
+        
+        parents = self._parents_within(tasks, parents)
+        cache_key = self._cache_key(tasks, parents)
+        cached = self._cached_result(cache_key)
+        if cached is not None:
+            return cached
+        
+        unique_tasks, aliases = self._collapse_duplicates(tasks)
+        if aliases:
+            result = expand_duplicates(self.analyze_tasks(unique_tasks, parents), aliases)
+            self._cache_result(cache_key, result)
+            return result
+        
+        if not self.breaker.allow():
+            return self._degraded_analysis(tasks)
+        
+        known_breakdowns = self._known_breakdowns(tasks)
+        response = self._create_completion(self._completion_params(tasks, known_breakdowns, parents))
+        result, new_breakdowns = self._build_response(response, tasks, known_breakdowns)
+        self._cache_result(cache_key, result, new_breakdowns)
+        return result
+    
+    async def analyze_tasks_async(self, tasks: List[str], parents: Optional[Dict[str, str]] = None) -> TaskAnalysisResponse:
+        """
+        Async variant of analyze_tasks built on AsyncOpenAI.
+        
+        Awaits the completion instead of blocking, so the event loop keeps
+        serving other requests while the model is generating.
+        
+        Args:
+            tasks: List of task strings
+            parents: Task it is nested under, for each sub-item (see parser.task_parents)
+            
+        Returns:
+            TaskAnalysisResponse with priorities, breakdowns, and next action
+        """
+        if not tasks:
+            raise ValueError("Tasks list cannot be empty")
+        
+        if self.routing.use_local(tasks):
+            LOCAL_ANALYSES.inc()
+            return self.local_engine.analyze(tasks)
+        
+        parents = self._parents_within(tasks, parents)
+        cache_key = self._cache_key(tasks, parents)
+        cached = await self._cached_result_async(cache_key)
+        if cached is not None:
+            return cached
+        
+        unique_tasks, aliases = self._collapse_duplicates(tasks)
+        if aliases:
+            result = expand_duplicates(await self.analyze_tasks_async(unique_tasks, parents), aliases)
+            await self._cache_result_async(cache_key, result)
+            return result
+        
+        shards = split_into_shards(tasks, self.shard_size)
+        if len(shards) > 1:
+            # Several small completions in parallel finish far sooner than one long
+            # one and stay clear of max_tokens truncation
+            results = await asyncio.gather(*(self.analyze_tasks_async(shard, parents) for shard in shards))
+            result = merge_shard_results(list(results))
+            await self._cache_result_async(cache_key, result)
+            return result
+        
+        # Identical requests already in flight share that call instead of starting their own
+        return await self.inflight.do(cache_key, lambda: self._analyze_uncached_async(tasks, cache_key, parents))
+    
+    async def _analyze_uncached_async(
+        self, tasks: List[str], cache_key: str, parents: Optional[Dict[str, str]] = None
+    ) -> TaskAnalysisResponse:
+        """Run the model for a task list that missed the result cache."""
+        if not self.breaker.allow():
+            return self._degraded_analysis(tasks)
+        
+        known_breakdowns = await self._known_breakdowns_async(tasks)
+        # Each completion (one per shard) holds its own in-flight slot
+        async with llm_slot():
+            response = await self._create_completion_async(self._completion_params(tasks, known_breakdowns, parents))
+        result, new_breakdowns = self._build_response(response, tasks, known_breakdowns)
+        await self._cache_result_async(cache_key, result, new_breakdowns)
+        return result
+    
+    async def stream_analysis(
+        self, tasks: List[str], parents: Optional[Dict[str, str]] = None
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Analyze tasks with a streaming completion, yielding parts as they complete.
+        
+        Yields ("next_action", ...), then ("priorities", ...), then one
+        ("breakdown", {"task": ..., "steps": [...]}) per task as soon as each part
+        of the model output is closed, and finally ("complete", full response).
+        Parts the model omitted are filled in from the validated response
+        before the "complete" event.
+        
+        Args:
+            tasks: List of task strings
+            parents: Task it is nested under, for each sub-item (see parser.task_parents)
+            
+        Yields:
+            (event name, JSON-serializable payload) tuples
+        """
+        if not tasks:
+            raise ValueError("Tasks list cannot be empty")
+        
+        if self.routing.use_local(tasks):
+            LOCAL_ANALYSES.inc()
+            for event in self._stream_leftovers(self.local_engine.analyze(tasks), set()):
+                yield event
+            return
+        
+        parents = self._parents_within(tasks, parents)
+        cache_key = self._cache_key(tasks, parents)
+        cached = await self._cached_result_async(cache_key)
+        if cached is not None:
+            for event in self._stream_leftovers(cached, set()):
+                yield event
+            return
+        
+        if not self.breaker.allow():
+            for event in self._stream_leftovers(self._degraded_analysis(tasks), set()):
+                yield event
+            return
+        
+        # Only one task per group of near-duplicates goes to the model
+        tasks, aliases = self._collapse_duplicates(tasks)
+        known_breakdowns = await self._known_breakdowns_async(tasks)
+        params = self._completion_params(tasks, known_breakdowns, parents)
+        start = time.perf_counter()
+        deadline = current_deadline() or Deadline(DEFAULT_DEADLINE_SECONDS)
+        # Only opening the stream is retried; nothing has been emitted at that point
+        stream = await self._guarded_async(retry_async(
+            lambda: self.async_client.chat.completions.create(
+                **params,
+                stream=True,
+                stream_options={"include_usage": True}
+            ),
+            self.retry_policy,
+            deadline
+        ))
+        parser = StreamingJSONParser(max_depth=2)
+        emitted = set()
+        # A stalled stream is abandoned at the deadline rather than the client's own timeout
+        async for chunk in iterate_within(stream, deadline):
+            if not chunk.choices:
+                # The final chunk carries only the token usage
+                self._record_usage(getattr(chunk, "usage", None))
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if not parser.text:
+                LLM_TTFT_SECONDS.observe(time.perf_counter() - start)
+            for path, value in parser.feed(delta):
+                for event in self._stream_event(path, value, known_breakdowns, emitted):
+                    yield event
         
-        # Call OpenAI
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
+        result, new_breakdowns = self._analysis_from_result(
+            self._decode_content(parser.text, tasks), tasks, known_breakdowns
+        )
+        # Merged duplicates arrive with the leftovers, sharing their original's breakdown
+        result = expand_duplicates(result, aliases)
+        await self._cache_result_async(cache_key, result, new_breakdowns)
+        for event in self._stream_leftovers(result, emitted):
+            yield event
+    
+    def _stream_event(
+        self,
+        path: Tuple,
+        value,
+        known_breakdowns: Dict[str, TaskBreakdown],
+        emitted: set
+    ) -> List[Tuple[str, Dict]]:
+        """Turn one completed part of the streamed JSON into SSE-ready events."""
+        events = []
+        if path == ("next_action",) and isinstance(value, dict):
+            if value.get("task") and value.get("step"):
+                self._apply_known_first_step(value, known_breakdowns)
+                next_action = NextAction(
+                    task=value["task"],
+                    step=value["step"],
+                    minutes=max(2, min(20, int(value.get("minutes", 5))))
+                )
+                events.append(("next_action", next_action.model_dump()))
+                emitted.add("next_action")
+        elif path == ("priorities",) and isinstance(value, dict):
+            events.append(("priorities", {
+                "must": value.get("must", []),
+                "should": value.get("should", []),
+                "optional": value.get("optional", [])
+            }))
+            emitted.add("priorities")
+            # Cached breakdowns are ready as soon as the ranking is known
+            for task_name, task_breakdown in known_breakdowns.items():
+                events.append(("breakdown", {"task": task_name, **task_breakdown.model_dump()}))
+                emitted.add(("breakdown", task_name))
+        elif len(path) == 2 and path[0] == "breakdown" and isinstance(value, dict):
+            task_name = path[1]
+            if task_name not in known_breakdowns and ("breakdown", task_name) not in emitted:
+                task_breakdown = self._parse_breakdown(task_name, value)
+                events.append(("breakdown", {"task": task_name, **task_breakdown.model_dump()}))
+                emitted.add(("breakdown", task_name))
+        return events
+    
+    def _stream_leftovers(self, result: TaskAnalysisResponse, emitted: set) -> List[Tuple[str, Dict]]:
+        """Events for every part not streamed yet, followed by the complete response."""
+        events = []
+        if "next_action" not in emitted:
+            events.append(("next_action", result.next_action.model_dump()))
+        if "priorities" not in emitted:
+            events.append(("priorities", result.priorities))
+        for task_name, task_breakdown in result.breakdown.items():
+            if ("breakdown", task_name) not in emitted:
+                events.append(("breakdown", {"task": task_name, **task_breakdown.model_dump()}))
+        events.append(("complete", result.model_dump()))
+        return events
+    
+    def _collapse_duplicates(self, tasks: List[str]) -> Tuple[List[str], Dict[str, str]]:
+        """Merge near-duplicate tasks; returns (unique tasks, {duplicate: original})."""
+        unique_tasks, aliases = self.dedup.collapse(tasks)
+        if aliases:
+            NEAR_DUPLICATES_COLLAPSED.inc(len(aliases))
+        return unique_tasks, aliases
+    
+    def _cache_key(self, tasks: List[str], parents: Optional[Dict[str, str]] = None) -> str:
+        """Content-addressed cache key for a parsed task list and its nesting."""
+        return analysis_cache_key(tasks, self.model, PROMPT_VERSION, parents)
+    
+    def _parents_within(self, tasks: List[str], parents: Optional[Dict[str, str]]) -> Dict[str, str]:
+        """The entries of parents for these tasks, so shards and sub-lists key and prompt on their own."""
+        if not parents:
+            return {}
+        return {task: parents[task] for task in tasks if task in parents}
+    
+    def _breakdown_cache_key(self, task: str) -> tuple:
+        """Per-task cache key: the normalized task text under this model and prompt."""
+        return (self.model, PROMPT_VERSION, normalize_task(task))
+    
+    def _cached_breakdowns(self, tasks: List[str]) -> Dict[str, TaskBreakdown]:
+        """Look up previously generated breakdowns for the given tasks, in memory then in the store."""
+        known = self._remembered_breakdowns(tasks)
+        known.update(self._stored_breakdowns([task for task in tasks if task not in known]))
+        return known
+    
+    def _remembered_breakdowns(self, tasks: List[str]) -> Dict[str, TaskBreakdown]:
+        """Breakdowns for the given tasks held in this process's memory."""
+        known = {}
+        for task in tasks:
+            cached = self.breakdown_cache.get(self._breakdown_cache_key(task))
+            if cached is not None:
+                known[task] = cached
+        return known
+    
+    def _stored_breakdowns(self, tasks: List[str]) -> Dict[str, TaskBreakdown]:
+        """Breakdowns for the given tasks from the persistent store, kept in memory once read."""
+        if self.store is None:
+            return {}
+        known = {}
+        for task in tasks:
+            cache_key = self._breakdown_cache_key(task)
+            data = self.store.get(self._store_key("breakdown", *cache_key))
+            if data is None:
+                continue
+            try:
+                cached = TaskBreakdown.model_validate_json(data)
+            except ValueError:
+                continue
+            self.breakdown_cache.set(cache_key, cached)
+            known[task] = cached
+        return known
+    
+    def _similar_breakdowns(self, tasks: List[str]) -> Dict[str, TaskBreakdown]:
+        """Breakdowns stored for differently worded tasks ("prep the quarterly report")."""
+        if self.similar is None or not len(self.similar) or not tasks:
+            return {}
+        found = {}
+        for task, match in zip(tasks, self.similar.lookup_many(tasks)):
+            if match is not None:
+                found[task] = match[1]
+        return found
+    
+    def _known_breakdowns(self, tasks: List[str]) -> Dict[str, TaskBreakdown]:
+        """Breakdowns that need not be generated again: exact cache hits, then similar tasks."""
+        known = self._remembered_breakdowns(tasks)
+        known.update(self._looked_up_breakdowns([task for task in tasks if task not in known]))
+        return known
+    
+    async def _known_breakdowns_async(self, tasks: List[str]) -> Dict[str, TaskBreakdown]:
+        """_known_breakdowns with the store reads and the similarity search run off the event loop."""
+        known = self._remembered_breakdowns(tasks)
+        missing = [task for task in tasks if task not in known]
+        if missing and (self.store is not None or (self.similar is not None and len(self.similar))):
+            # SQLite reads block, and the batched search is a matrix product NumPy runs without the GIL
+            known.update(await asyncio.to_thread(self._looked_up_breakdowns, missing))
+        return known
+    
+    def _looked_up_breakdowns(self, tasks: List[str]) -> Dict[str, TaskBreakdown]:
+        """Breakdowns missing from memory: from the store, then from similar tasks."""
+        known = self._stored_breakdowns(tasks)
+        known.update(self._similar_breakdowns([task for task in tasks if task not in known]))
+        return known
+    
+    def _store_key(self, kind: str, *parts: str) -> str:
+        """Persistent store key; the kind keeps analyses and breakdowns apart."""
+        return ":".join((kind, *parts))
+    
+    def _completion_params(
+        self,
+        tasks: List[str],
+        known_breakdowns: Optional[Dict[str, TaskBreakdown]] = None,
+        parents: Optional[Dict[str, str]] = None,
+    ) -> Dict:
+        """Build the chat completion request shared by the sync and async paths."""
+        with PROMPT_BUILD_SECONDS.time(), span("prompt"):
+            prompt = self._create_analysis_prompt(tasks, known_breakdowns, parents)
+        ESTIMATED_PROMPT_TOKENS.inc(SYSTEM_PROMPT_TOKENS + estimate_tokens(prompt))
+        return {
+            "model": self.model,
+            "messages": [
                 {
                     "role": "system",
-                    "content": """You are an expert task prioritization and productivity coach. Your goal is to help people overcome procrastination by breaking down overwhelming tasks into tiny, actionable micro-steps.
-
-Key principles:
-1. The first step should be so easy it's impossible to say no
-2. Each step should be 2-20 minutes and feel achievable
-3. Prioritize based on urgency, impact, dependencies, and effort
-4. Always provide the smallest possible next action to reduce friction
-
-Provide structured JSON responses that are practical and actionable."""
+                    "content": SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
                     "content": prompt
                 }
             ],
-            response_format={"type": "json_object"},
-            temperature=0.5,  # Lower temperature for more consistent results
-            max_tokens=3000  # Increased for detailed breakdowns
-        )
+            "response_format": {"type": "json_object"},
+            "temperature": 0.5,  # Lower temperature for more consistent results
+            # Sized from the tasks that still need breakdowns instead of a fixed ceiling
+            "max_tokens": max_completion_tokens(tasks, len(known_breakdowns or {}), self.max_completion_tokens)
+        }
+    
+    def _create_completion(self, params: Dict):
+        """Blocking completion call, retried within the request deadline."""
+        deadline = current_deadline() or Deadline(DEFAULT_DEADLINE_SECONDS)
+        start = time.monotonic()
+        try:
+            response = retry_sync(
+                lambda remaining: self._timed_completion_sync(params, remaining),
+                self.retry_policy,
+                deadline
+            )
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        self.breaker.record_success(time.monotonic() - start)
+        return response
+    
+    async def _create_completion_async(self, params: Dict):
+        """Completion call with retries within the request deadline and optional hedging."""
+        deadline = current_deadline() or Deadline(DEFAULT_DEADLINE_SECONDS)
+        hedge_after = self.latency.percentile(0.9) if self.hedging else None
+        return await self._guarded_async(retry_async(
+            lambda: hedge(lambda: self._timed_completion(params), hedge_after),
+            self.retry_policy,
+            deadline
+        ))
+    
+    async def _guarded_async(self, call):
+        """Await a model call, reporting its outcome and duration to the circuit breaker."""
+        start = time.monotonic()
+        try:
+            response = await call
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        self.breaker.record_success(time.monotonic() - start)
+        return response
+    
+    def _record_failure(self, error: Exception) -> None:
+        """
+        Count a failed model call against the circuit breaker if the backend is to blame.
+        
+        Only errors worth retrying (connection errors, timeouts, 408/409/429,
+        5xx) say anything about the backend's health; a 400 or 401 is the
+        request's fault. A deadline counts only when it ran out during a call,
+        not when it was already spent before one was made.
+        """
+        if isinstance(error, DeadlineExceeded):
+            blamed = error.__cause__ is not None
+        else:
+            blamed = self.retry_policy.is_retryable(error)
+        if blamed:
+            self.breaker.record_failure()
+    
+    def _degraded_analysis(self, tasks: List[str]) -> TaskAnalysisResponse:
+        """Immediate local analysis, marked degraded, for when the model backend is unavailable."""
+        DEGRADED_RESPONSES.inc()
+        return self.local_engine.analyze(tasks).model_copy(update={"degraded": True})
+    
+    def _cached_result(self, cache_key: str) -> Optional[TaskAnalysisResponse]:
+        """Look up a full analysis in memory, then in the persistent store."""
+        cached = self.result_cache.get(cache_key)
+        if cached is None and self.store is not None:
+            cached = self._stored_result(cache_key)
+        return cached
+    
+    async def _cached_result_async(self, cache_key: str) -> Optional[TaskAnalysisResponse]:
+        """_cached_result with the store read run off the event loop."""
+        cached = self.result_cache.get(cache_key)
+        if cached is None and self.store is not None:
+            cached = await asyncio.to_thread(self._stored_result, cache_key)
+        return cached
+    
+    def _stored_result(self, cache_key: str) -> Optional[TaskAnalysisResponse]:
+        """A full analysis from the persistent store, kept in memory once read."""
+        data = self.store.get(self._store_key("analysis", cache_key))
+        if data is None:
+            return None
+        try:
+            cached = parse_analysis(data)
+        except ValueError:
+            # Written by an incompatible version; the fresh result will replace it
+            return None
+        self.result_cache.set(cache_key, cached)
+        return cached
+    
+    def _cache_result(
+        self,
+        cache_key: str,
+        result: TaskAnalysisResponse,
+        breakdowns: Optional[Dict[str, TaskBreakdown]] = None
+    ) -> None:
+        """
+        Cache a full analysis and the breakdowns generated for it, in memory and in the store.
         
-        # Parse response
+        Degraded answers are never cached.
+        """
+        if self._remember_result(cache_key, result, breakdowns):
+            self._store_result(cache_key, result, breakdowns)
+    
+    async def _cache_result_async(
+        self,
+        cache_key: str,
+        result: TaskAnalysisResponse,
+        breakdowns: Optional[Dict[str, TaskBreakdown]] = None
+    ) -> None:
+        """_cache_result with the store writes run off the event loop."""
+        if self._remember_result(cache_key, result, breakdowns):
+            await asyncio.to_thread(self._store_result, cache_key, result, breakdowns)
+    
+    def _remember_result(
+        self,
+        cache_key: str,
+        result: TaskAnalysisResponse,
+        breakdowns: Optional[Dict[str, TaskBreakdown]]
+    ) -> bool:
+        """Cache in memory and in the similarity index; True if the store should get it too."""
+        if result.degraded:
+            return False
+        self.result_cache.set(cache_key, result)
+        for task, breakdown in (breakdowns or {}).items():
+            self.breakdown_cache.set(self._breakdown_cache_key(task), breakdown)
+            if self.similar is not None:
+                self.similar.add(task, breakdown)
+        return self.store is not None
+    
+    def _store_result(
+        self,
+        cache_key: str,
+        result: TaskAnalysisResponse,
+        breakdowns: Optional[Dict[str, TaskBreakdown]]
+    ) -> None:
+        """Write an analysis to the store, and its new breakdowns in one transaction."""
+        if breakdowns:
+            self.store.set_many({
+                self._store_key("breakdown", *self._breakdown_cache_key(task)):
+                    breakdown.model_dump_json().encode("utf-8")
+                for task, breakdown in breakdowns.items()
+            }, self.breakdown_cache.ttl_seconds)
+        self.store.set(
+            self._store_key("analysis", cache_key),
+            render_analysis(result),
+            self.result_cache.ttl_seconds
+        )
+    
+    async def _timed_completion(self, params: Dict):
+        """One completion call, recording its latency for the hedging threshold."""
+        start = time.perf_counter()
+        with span("llm", model=self.model):
+            response = await self.async_client.chat.completions.create(**params)
+        elapsed = time.perf_counter() - start
+        self.latency.record(elapsed)
+        LLM_SECONDS.observe(elapsed)
+        return response
+    
+    def _timed_completion_sync(self, params: Dict, timeout: float):
+        """One blocking completion call, recording its latency."""
+        with LLM_SECONDS.time(), span("llm", model=self.model):
+            return self.client.chat.completions.create(**params, timeout=timeout)
+    
+    def _record_usage(self, usage) -> None:
+        """Add the token usage reported by the API to the token counters."""
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+        if isinstance(prompt_tokens, int):
+            PROMPT_TOKENS.inc(prompt_tokens)
+        if isinstance(completion_tokens, int):
+            COMPLETION_TOKENS.inc(completion_tokens)
+        if isinstance(cached_tokens, int):
+            CACHED_PROMPT_TOKENS.inc(cached_tokens)
+    
+    def _build_response(
+        self,
+        response,
+        tasks: List[str],
+        known_breakdowns: Optional[Dict[str, TaskBreakdown]] = None
+    ) -> Tuple[TaskAnalysisResponse, Dict[str, TaskBreakdown]]:
+        """Decode a chat completion; see _analysis_from_result for what is returned."""
+        self._record_usage(getattr(response, "usage", None))
         content = response.choices[0].message.content
-        result = json.loads(content)
+        result = self._decode_content(content, tasks)
+        return self._analysis_from_result(result, tasks, known_breakdowns)
+    
+    def _decode_content(self, content: str, tasks: List[str]) -> Dict:
+        """
+        Decode the model's JSON, salvaging what is complete if it is truncated or malformed.
+        
+        Only the parts that could not be recovered are later filled in by the
+        defaults in _parse_ai_response.
+        """
+        try:
+            return loads(content)
+        except json.JSONDecodeError:
+            result = salvage_json_object(content or "")
+            if not result:
+                raise
+        
+        breakdown = result.get("breakdown")
+        if not isinstance(breakdown, dict):
+            breakdown = result["breakdown"] = {}
+        recovered = sum(
+            1 for task in tasks
+            if isinstance(breakdown.get(task), dict) and breakdown[task].get("steps")
+        )
+        SALVAGED_RESPONSES.inc()
+        SALVAGE_RECOVERED_BREAKDOWNS.inc(recovered)
+        SALVAGE_EXPECTED_BREAKDOWNS.inc(len(tasks))
+        logger.warning(
+            "Salvaged malformed AI response: recovered %d/%d breakdowns",
+            recovered, len(tasks)
+        )
+        return result
+    
+    def _analysis_from_result(
+        self,
+        result: Dict,
+        tasks: List[str],
+        known_breakdowns: Optional[Dict[str, TaskBreakdown]] = None
+    ) -> Tuple[TaskAnalysisResponse, Dict[str, TaskBreakdown]]:
+        """
+        Merge cached breakdowns into a decoded AI result and validate it.
+        
+        Returns the analysis and the breakdowns the model wrote for tasks not
+        already known, to be cached with it by _cache_result.
+        """
+        # Remember which breakdowns the model actually wrote before defaults are filled in
+        generated = {
+            task_name for task_name, task_data in result.get("breakdown", {}).items()
+            if isinstance(task_data, dict) and task_data.get("steps")
+        }
+        if known_breakdowns:
+            self._merge_known_breakdowns(result, known_breakdowns)
         
         # Validate and structure the response
-        return self._parse_ai_response(result, tasks)
+        with RESPONSE_PARSE_SECONDS.time(), span("parse_response"):
+            analysis = self._parse_ai_response(result, tasks)
+        
+        new_breakdowns = {
+            task_name: analysis.breakdown[task_name]
+            for task_name in generated.intersection(tasks)
+            if task_name not in (known_breakdowns or {})
+        }
+        return analysis, new_breakdowns
     
-    def _create_analysis_prompt(self, tasks: List[str]) -> str:
-        """Create the prompt for task analysis."""
-        tasks_text = "\n".join([f"{i+1}. {task}" for i, task in enumerate(tasks)])
+    def _merge_known_breakdowns(self, result: Dict, known_breakdowns: Dict[str, TaskBreakdown]) -> None:
+        """Insert cached breakdowns into a raw AI result in place."""
+        breakdown = result.setdefault("breakdown", {})
+        for task_name, task_breakdown in known_breakdowns.items():
+            breakdown[task_name] = task_breakdown.model_dump()
         
-        prompt = f"""Analyze the following tasks and provide a comprehensive JSON response with prioritization, breakdowns, and next action.
-
-TASKS TO ANALYZE:
+        self._apply_known_first_step(result.get("next_action") or {}, known_breakdowns)
+    
+    def _apply_known_first_step(self, next_action: Dict, known_breakdowns: Dict[str, TaskBreakdown]) -> None:
+        """Keep a raw next action consistent with the cached first step of its task."""
+        task_name = next_action.get("task")
+        if task_name in known_breakdowns:
+            first_step = known_breakdowns[task_name].steps[0]
+            next_action["step"] = first_step.step
+            next_action["minutes"] = first_step.minutes
+    
+    def _create_analysis_prompt(
+        self,
+        tasks: List[str],
+        known_breakdowns: Optional[Dict[str, TaskBreakdown]] = None,
+        parents: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """Create the request-specific part of the prompt (the task list)."""
+        # Pre-sorted and annotated locally, so the model does not have to infer
+        # deadlines, and sub-items are not read as unrelated tasks
+        parents = parents or {}
+        records = presort_tasks([ParsedTask(task) for task in tasks])
+        tasks_text = "\n".join(
+            f"{i+1}. {record.text} {record.annotation(parents.get(record.text))}".rstrip()
+            for i, record in enumerate(records)
+        )
+        
+        known_text = ""
+        if known_breakdowns:
+            known_lines = "\n".join(
+                f'- {task} (first step: "{b.steps[0].step}", {b.steps[0].minutes} min)'
+                for task, b in known_breakdowns.items()
+            )
+            known_text = f"""
+ALREADY BROKEN DOWN (prioritize these, but do NOT include them in "breakdown"):
+{known_lines}
+"""
+        
+        prompt = f"""TASKS:
 {tasks_text}
-
-=== PRIORITIZATION CRITERIA ===
-
-Evaluate each task using these factors (in order of importance):
-1. URGENCY: Deadlines, time-sensitive commitments
-2. IMPACT: Consequences of doing/not doing, value created
-3. DEPENDENCIES: Blocks other tasks or people waiting on this
-4. EFFORT: Time and energy required (lower effort = easier to start)
-
-Categorize as:
-- MUST: High urgency OR high impact OR blocking others OR has deadline
-- SHOULD: Important but not urgent, medium impact, no immediate deadline
-- OPTIONAL: Low priority, nice-to-have, can be deferred
-
-=== BREAKDOWN RULES ===
-
-For EACH task, create micro-steps that follow these rules:
-
-1. STEP SIZE: Each step must be 2-20 minutes. Prefer smaller steps (2-5 min) for the first few steps.
-
-2. ACTION FORMAT: 
-   - Start with action verbs: "Open", "Write", "Call", "Find", "Create", "Send", etc.
-   - Be specific and concrete: "Open email client" not "Check email"
-   - One clear action per step
-
-3. FIRST STEP RULE (Critical!):
-   - The FIRST step must be extremely easy - so easy it's impossible to say no
-   - Examples: "Open the document", "Find the phone number", "Open the app"
-   - Should take 2-5 minutes maximum
-   - Should require minimal mental energy
-
-4. PROGRESSION:
-   - Steps should build logically on each other
-   - Each step should feel achievable
-   - Break complex tasks into 3-8 steps typically
-
-5. TIME ESTIMATES:
-   - Be realistic: 2-5 min for simple actions, 10-15 min for moderate, 15-20 min for complex
-   - First step should always be 2-5 minutes
-
-=== NEXT ACTION SELECTION ===
-
-Choose the NEXT ACTION that:
-1. Comes from the highest priority task (Must > Should > Optional)
-2. Is the FIRST step of that task's breakdown
-3. Takes 2-5 minutes (prefer shorter)
-4. Requires minimal context or preparation
-5. Is the absolute smallest viable action to get started
-
-The next action should eliminate all friction - it should be so easy that starting feels effortless.
-
-=== OUTPUT FORMAT ===
-
-Return JSON in this exact structure:
-{{
-  "priorities": {{
-    "must": ["exact task name 1", "exact task name 2"],
-    "should": ["exact task name 3"],
-    "optional": ["exact task name 4"]
-  }},
-  "breakdown": {{
-    "exact task name 1": {{
-      "steps": [
-        {{"step": "Open the document or file needed", "minutes": 2}},
-        {{"step": "Review the key sections", "minutes": 5}},
-        {{"step": "Write the introduction paragraph", "minutes": 10}},
-        {{"step": "Complete the main content", "minutes": 15}}
-      ]
-    }},
-    "exact task name 2": {{
-      "steps": [
-        {{"step": "Find the contact information", "minutes": 3}},
-        {{"step": "Draft the message or talking points", "minutes": 5}},
-        {{"step": "Make the call or send the message", "minutes": 10}}
-      ]
-    }}
-  }},
-  "next_action": {{
-    "task": "exact task name 1",
-    "step": "Open the document or file needed",
-    "minutes": 2
-  }}
-}}
-
-=== CRITICAL REQUIREMENTS ===
-
-1. Use EXACT task names as provided (match them precisely)
-2. Every task must appear in exactly ONE priority category
-3. Every task must have a breakdown with at least 2 steps
-4. First step of each task must be 2-5 minutes and extremely easy
-5. Next action must be the first step of the highest priority task
-6. All step descriptions must start with action verbs
-7. Time estimates must be between 2-20 minutes per step
-
-Now analyze the tasks and provide your response:"""
+{known_text}
+Respond with the JSON object."""
         
         return prompt
     
     def _parse_ai_response(self, result: Dict, original_tasks: List[str]) -> TaskAnalysisResponse:
-        """Parse and validate AI response."""
+        """
+        Parse and validate AI response.
+        
+        The response is normalized as plain dicts and validated once as a
+        whole, instead of building every nested model separately.
+        """
         # Extract priorities
         priorities = result.get("priorities", {})
         must = priorities.get("must", [])
@@ -189,32 +834,19 @@ Now analyze the tasks and provide your response:"""
         breakdown_dict = result.get("breakdown", {})
         breakdown = {}
         for task_name, task_data in breakdown_dict.items():
-            steps_data = task_data.get("steps", [])
-            if not steps_data:
-                # If no steps provided, create a default breakdown
-                steps_data = [
-                    {"step": f"Start working on {task_name}", "minutes": 5},
-                    {"step": f"Complete {task_name}", "minutes": 15}
-                ]
-            
-            # Validate and fix step times
-            validated_steps = []
-            for s in steps_data:
-                step_text = s.get("step", "")
-                minutes = s.get("minutes", 5)
-                # Ensure minutes are within valid range
-                minutes = max(2, min(20, int(minutes)))
-                validated_steps.append(TaskStep(step=step_text, minutes=minutes))
-            
-            breakdown[task_name] = TaskBreakdown(steps=validated_steps)
+            # Counted here, not in _breakdown_data, which also runs for every streamed breakdown
+            if not task_data.get("steps"):
+                FALLBACK_BREAKDOWNS.inc()
+            breakdown[task_name] = self._breakdown_data(task_name, task_data)
         
         # Create breakdowns for tasks that don't have one
         for task in original_tasks:
             if task not in breakdown:
-                breakdown[task] = TaskBreakdown(steps=[
-                    TaskStep(step=f"Start working on {task}", minutes=5),
-                    TaskStep(step=f"Complete {task}", minutes=15)
-                ])
+                FALLBACK_BREAKDOWNS.inc()
+                breakdown[task] = {"steps": [
+                    {"step": f"Start working on {task}", "minutes": 5},
+                    {"step": f"Complete {task}", "minutes": 15}
+                ]}
         
         # Extract next action
         next_action_data = result.get("next_action", {})
@@ -234,27 +866,49 @@ Now analyze the tasks and provide your response:"""
                 priority_task = optional[0]
             
             if priority_task and priority_task in breakdown:
-                first_step = breakdown[priority_task].steps[0]
+                first_step = breakdown[priority_task]["steps"][0]
                 next_task = priority_task
-                next_step = first_step.step
-                next_minutes = first_step.minutes
+                next_step = first_step["step"]
+                next_minutes = first_step["minutes"]
         
         # Validate next action minutes
         next_minutes = max(2, min(20, int(next_minutes)))
         
-        next_action = NextAction(
-            task=next_task,
-            step=next_step,
-            minutes=next_minutes
-        )
-        
-        return TaskAnalysisResponse(
-            priorities={
+        return validate_analysis({
+            "priorities": {
                 "must": must,
                 "should": should,
                 "optional": optional
             },
-            breakdown=breakdown,
-            next_action=next_action
-        )
-
+            "breakdown": breakdown,
+            "next_action": {
+                "task": next_task,
+                "step": next_step,
+                "minutes": next_minutes
+            }
+        })
+    
+    def _parse_breakdown(self, task_name: str, task_data: Dict) -> TaskBreakdown:
+        """Validate one task's breakdown, filling in default steps when none are given."""
+        return TaskBreakdown.model_validate(self._breakdown_data(task_name, task_data))
+    
+    def _breakdown_data(self, task_name: str, task_data: Dict) -> Dict:
+        """One task's breakdown as plain data, with defaults filled in and step times clamped."""
+        steps_data = task_data.get("steps", [])
+        if not steps_data:
+            # If no steps provided, create a default breakdown
+            steps_data = [
+                {"step": f"Start working on {task_name}", "minutes": 5},
+                {"step": f"Complete {task_name}", "minutes": 15}
+            ]
+        
+        # Validate and fix step times
+        validated_steps = []
+        for s in steps_data:
+            step_text = s.get("step", "")
+            minutes = s.get("minutes", 5)
+            # Ensure minutes are within valid range
+            minutes = max(2, min(20, int(minutes)))
+            validated_steps.append({"step": step_text, "minutes": minutes})
+        
+        return {"steps": validated_steps}
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_task(task: str) -> str:
+    """
+    Normalize a task string for per-task cache lookups.
+
+    Lowercases, collapses internal whitespace and strips trailing punctuation,
+    so "Call dentist." and "call  dentist" share one entry.
+    """
+    return _WHITESPACE_RE.sub(" ", task).strip().rstrip(".!?;:").strip().lower()
+
+
+def analysis_cache_key(
+    tasks: List[str], model: str, prompt_version: str, parents: Optional[Dict[str, str]] = None
+) -> str:
+    """
+    Build a content-addressed key for an analysis request.
+
+    Args:
+        tasks: Parsed task list (output of parse_tasks)
+        model: Model name the analysis is produced with
+        prompt_version: Version of the prompt template
+        parents: Nesting of sub-items (see parser.task_parents); flat lists leave it out
+
+    Returns:
+        Hex SHA-256 digest of the canonical request
+    """
+    request = {"tasks": tasks, "model": model, "prompt_version": prompt_version}
+    if parents:
+        request["parents"] = parents
+    payload = json.dumps(
+        request,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTLLRUCache:
+    """
+    Thread-safe LRU cache with a size bound and a per-entry TTL.
+
+    A max_size of 0 disables the cache: lookups always miss and nothing is stored.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max(0, max_size)
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value under key, evicting the least recently used entries if full."""
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, self._clock() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and current occupancy."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+        }
@@ -0,0 +1,182 @@
+import re
+from typing import Dict, FrozenSet, List, Set, Tuple
+from app.models.schemas import TaskAnalysisResponse
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_NUMBER_RE = re.compile(r"\d+")
+_CAPITALIZED_RE = re.compile(r"\b[A-Z][A-Za-z]*")
+# Filler words that do not change what a task is about
+_STOPWORDS = frozenset((
+    "a", "an", "the", "to", "re", "about", "regarding", "for", "of", "on", "with",
+    "my", "our", "your", "and", "please", "some", "this", "that",
+))
+SHINGLE_SIZE = 3
+
+
+def _fold(word: str) -> str:
+    """Fold a simple plural onto its singular."""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def canonical_task(task: str) -> str:
+    """Lowercase the task, drop punctuation and filler words, and fold simple plurals."""
+    return " ".join(_fold(word) for word in _WORD_RE.findall(task.lower()) if word not in _STOPWORDS)
+
+
+def task_words(task: str) -> FrozenSet[str]:
+    """Every word and number of the task, lowercased and plural-folded, filler words included."""
+    return frozenset(_fold(word) for word in _WORD_RE.findall(task.lower())) | frozenset(_NUMBER_RE.findall(task))
+
+
+def task_specifics(task: str) -> FrozenSet[str]:
+    """
+    Words that tell otherwise similar tasks apart.
+
+    Numbers ("invoice 12"), short labels ("client B") and capitalized names
+    after the first word ("Alice") change little of a task's text but all
+    of its meaning, so similarity of the text alone cannot be trusted for them.
+    """
+    specifics = set(_NUMBER_RE.findall(task))
+    for word in _WORD_RE.findall(task.lower()):
+        if len(word) <= 2 and word not in _STOPWORDS:
+            specifics.add(word)
+    for match in _CAPITALIZED_RE.finditer(task):
+        if match.start():
+            specifics.add(_fold(match.group().lower()))
+    return frozenset(specifics)
+
+
+def same_specifics(
+    first_specifics: FrozenSet[str],
+    first_words: FrozenSet[str],
+    second_specifics: FrozenSet[str],
+    second_words: FrozenSet[str],
+) -> bool:
+    """Whether each task mentions every specific of the other (see task_specifics)."""
+    return first_specifics <= second_words and second_specifics <= first_words
+
+
+def shingles(task: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Character shingles of the canonical task text."""
+    text = f" {canonical_task(task)} "
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class NearDuplicateDetector:
+    """
+    Find tasks that are worded differently but mean the same thing.
+
+    Tasks are compared by the Jaccard similarity of their character shingles,
+    computed exactly through an inverted index, so only tasks sharing at least
+    one shingle are ever compared. Tasks are never merged unless each mentions
+    the other's numbers, short labels and names ("Pay invoice 12" / "Pay
+    invoice 13", "client A" / "client B", "Alice" / "Alicia").
+
+    A threshold above 1 disables the detector.
+    """
+
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+
+    @property
+    def enabled(self) -> bool:
+        return 0 < self.threshold <= 1
+
+    def collapse(self, tasks: List[str]) -> Tuple[List[str], Dict[str, str]]:
+        """
+        Collapse near-duplicate tasks onto the first task of each group.
+
+        Args:
+            tasks: Parsed task list
+
+        Returns:
+            (unique tasks in input order, {duplicate task: task it was merged into})
+        """
+        unique: List[str] = []
+        aliases: Dict[str, str] = {}
+        if not self.enabled or len(tasks) < 2:
+            return list(tasks), aliases
+
+        signatures: List[Tuple[Set[str], FrozenSet[str], FrozenSet[str]]] = []
+        index: Dict[str, List[int]] = {}
+        for task in tasks:
+            task_shingles = shingles(task)
+            specifics = task_specifics(task)
+            words = task_words(task)
+            shared: Dict[int, int] = {}
+            for shingle in task_shingles:
+                for candidate in index.get(shingle, ()):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+
+            match = None
+            best = 0.0
+            for candidate, overlap in shared.items():
+                candidate_shingles, candidate_specifics, candidate_words = signatures[candidate]
+                if not same_specifics(specifics, words, candidate_specifics, candidate_words):
+                    continue
+                similarity = overlap / (len(task_shingles) + len(candidate_shingles) - overlap)
+                if similarity >= self.threshold and similarity > best:
+                    match, best = candidate, similarity
+
+            if match is not None:
+                aliases[task] = unique[match]
+                continue
+            for shingle in task_shingles:
+                index.setdefault(shingle, []).append(len(unique))
+            signatures.append((task_shingles, specifics, words))
+            unique.append(task)
+
+        return unique, aliases
+
+
+def expand_duplicates(result: TaskAnalysisResponse, aliases: Dict[str, str]) -> TaskAnalysisResponse:
+    """
+    Map an analysis of collapsed tasks back onto the original task names.
+
+    Every merged task is ranked right after the task it was merged into and
+    shares its breakdown.
+
+    Args:
+        result: Analysis of the unique tasks
+        aliases: {duplicate task: task it was merged into} from collapse()
+
+    Returns:
+        TaskAnalysisResponse covering every original task
+    """
+    if not aliases:
+        return result
+
+    followers: Dict[str, List[str]] = {}
+    for alias, original in aliases.items():
+        followers.setdefault(original, []).append(alias)
+
+    placed = set()
+    priorities = {}
+    for bucket, bucket_tasks in result.priorities.items():
+        expanded = []
+        for task in bucket_tasks:
+            expanded.append(task)
+            for alias in followers.get(task, ()):
+                if alias not in placed:
+                    expanded.append(alias)
+                    placed.add(alias)
+        priorities[bucket] = expanded
+    unplaced = [alias for alias in aliases if alias not in placed]
+    if unplaced:
+        priorities.setdefault("optional", []).extend(unplaced)
+
+    breakdown = dict(result.breakdown)
+    for alias, original in aliases.items():
+        if original in breakdown:
+            breakdown[alias] = breakdown[original]
+
+    return TaskAnalysisResponse(
+        priorities=priorities,
+        breakdown=breakdown,
+        next_action=result.next_action,
+        degraded=result.degraded
+    )
@@ -0,0 +1,247 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.services.admission import AdmissionRejected
+from app.services.metrics import REGISTRY
+from app.services.serialization import dumps, loads
+from app.services.store import PersistentStore
+
+logger = logging.getLogger(__name__)
+
+JOBS_QUEUED = REGISTRY.gauge("jobs_queued", "Analysis jobs waiting for a worker")
+JOBS_RUNNING = REGISTRY.gauge("jobs_running", "Analysis jobs being worked on")
+JOBS_REJECTED = REGISTRY.counter("jobs_rejected_total", "Jobs refused because the queue was full")
+JOB_WAIT_SECONDS = REGISTRY.histogram("job_queue_wait_seconds", "Time a job waited before a worker took it")
+JOB_RUN_SECONDS = REGISTRY.histogram("job_run_seconds", "Time a worker spent on a job")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# A job's work: an async callable returning the JSON-ready result
+Work = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+class Job:
+    """One submitted job and, once finished, its result or error."""
+
+    __slots__ = ("id", "status", "created_at", "started_at", "finished_at", "result", "error")
+
+    def __init__(self, job_id: str, created_at: float):
+        self.id = job_id
+        self.status = QUEUED
+        self.created_at = created_at
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+    def view(self) -> Dict[str, Any]:
+        """The job as returned by GET /api/jobs/{id}."""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Bounded in-process job queue drained by a fixed pool of asyncio workers.
+
+    submit() returns at once with a job id; at most `workers` jobs run at a
+    time and at most `max_queued` wait, beyond which submissions are refused
+    with a 503 AdmissionRejected. Finished jobs are kept for ttl_seconds.
+
+    Jobs live in the worker process that accepted them. With a store, every
+    status change is also written there (off the event loop, in order), so
+    any worker sharing the store can answer for any job.
+
+    The workers start on the first submit, in the running event loop.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_queued: int = 1000,
+        ttl_seconds: float = 3600.0,
+        store: Optional[PersistentStore] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self._clock = clock
+        self._jobs: Dict[str, Job] = {}
+        # Finished job ids in the order they expire
+        self._expiry: "OrderedDict[str, float]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = 0
+        # Moving average of job run time, for Retry-After when the queue is full
+        self._run_seconds = 1.0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        """Build the queue from the JOB_* environment variables, sharing ANALYSIS_STORE_PATH if set."""
+        return cls(
+            workers=int(os.getenv("JOB_WORKERS", "4")),
+            max_queued=int(os.getenv("JOB_MAX_QUEUED", "1000")),
+            ttl_seconds=float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600")),
+            store=PersistentStore.from_env(),
+        )
+
+    async def submit(self, work: Work) -> Job:
+        """
+        Queue work as a new job.
+
+        Raises:
+            AdmissionRejected: 503 if max_queued jobs are already waiting
+        """
+        for abandoned in self._start():
+            await self._publish(abandoned)
+        if self._queue.qsize() >= self.max_queued:
+            self.rejected += 1
+            JOBS_REJECTED.inc()
+            raise AdmissionRejected(503, "Job queue is full, please retry shortly", self._retry_after())
+        self._expire()
+        job = Job(uuid.uuid4().hex, self._clock())
+        self._jobs[job.id] = job
+        # Published before a worker can take it, so "queued" never lands after "running"
+        await self._publish(job)
+        self._queue.put_nowait((job, work))
+        JOBS_QUEUED.set(self._queue.qsize())
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job's current view, or None if it is unknown or has expired."""
+        self._expire()
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.view()
+        if self.store is not None:
+            data = await asyncio.to_thread(self.store.get, self._store_key(job_id))
+            if data is not None:
+                return loads(data)
+        return None
+
+    def _start(self) -> List[Job]:
+        """
+        Start the workers in the running loop, if they are not running there yet.
+
+        Returns the jobs left unfinished on a previous loop, now failed.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return []
+        # Jobs still waiting on a previous loop can no longer run
+        abandoned = [job for job in self._jobs.values() if job.finished_at is None]
+        for job in abandoned:
+            job.status = FAILED
+            job.error = "The worker restarted before the job finished"
+            self._finish(job)
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        # Workers start from an empty context so they do not inherit the first caller's trace or deadline
+        self._tasks = [contextvars.Context().run(loop.create_task, self._work()) for _ in range(self.workers)]
+        return abandoned
+
+    async def _work(self) -> None:
+        while True:
+            job, work = await self._queue.get()
+            JOBS_QUEUED.set(self._queue.qsize())
+            job.status = RUNNING
+            job.started_at = self._clock()
+            JOB_WAIT_SECONDS.observe(job.started_at - job.created_at)
+            self._running += 1
+            JOBS_RUNNING.set(self._running)
+            await self._publish(job)
+            start = time.perf_counter()
+            try:
+                job.result = await work()
+                job.status = DONE
+                self.completed += 1
+            except Exception as e:
+                logger.warning("Job %s failed: %s", job.id, e)
+                job.status = FAILED
+                job.error = str(e) or type(e).__name__
+                self.failed += 1
+            finally:
+                self._running -= 1
+                JOBS_RUNNING.set(self._running)
+            elapsed = time.perf_counter() - start
+            JOB_RUN_SECONDS.observe(elapsed)
+            self._run_seconds += 0.2 * (elapsed - self._run_seconds)
+            REGISTRY.counter(
+                "jobs_finished_total",
+                "Finished analysis jobs by outcome",
+                labels={"status": job.status}
+            ).inc()
+            self._finish(job)
+            await self._publish(job)
+
+    def _finish(self, job: Job) -> None:
+        job.finished_at = self._clock()
+        self._expiry[job.id] = job.finished_at + self.ttl_seconds
+
+    def _expire(self) -> None:
+        """Forget finished jobs whose results have expired."""
+        now = self._clock()
+        while self._expiry:
+            job_id, expires_at = next(iter(self._expiry.items()))
+            if expires_at > now:
+                break
+            del self._expiry[job_id]
+            self._jobs.pop(job_id, None)
+
+    async def _publish(self, job: Job) -> None:
+        """Write the job's current view to the store, if there is one."""
+        if self.store is not None:
+            await asyncio.to_thread(
+                self.store.set, self._store_key(job.id), dumps(job.view()), self.ttl_seconds
+            )
+
+    @staticmethod
+    def _store_key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    def _retry_after(self) -> float:
+        # Time for the queue ahead of a new job to drain through the workers
+        return self._run_seconds * (self._queue.qsize() + 1) / self.workers
+
+    async def close(self) -> None:
+        """Stop the workers; jobs still queued or running are abandoned."""
+        tasks, self._tasks, self._loop = self._tasks, [], None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._running = 0
+        JOBS_RUNNING.set(0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Current load and totals."""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self._running,
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "jobs": len(self._jobs),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
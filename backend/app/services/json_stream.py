@@ -0,0 +1,189 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+_WHITESPACE = " \t\r\n"
+
+
+class _Frame:
+    """One open object or array on the scanner stack."""
+
+    __slots__ = ("kind", "key", "index", "value_start", "expect_key")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.key: Optional[str] = None
+        self.index = 0
+        self.value_start: Optional[int] = None
+        self.expect_key = kind == "{"
+
+    def path_part(self):
+        return self.key if self.kind == "{" else self.index
+
+
+class StreamingJSONParser:
+    """
+    Incremental scanner for a streamed JSON object.
+
+    Feed it text chunks as they arrive; it reports every value nested at most
+    max_depth levels deep as soon as that value is complete, as (path, value)
+    pairs. The path is a tuple of object keys and array indices, e.g.
+    ("breakdown", "Call dentist"). The top-level object itself is not reported.
+    """
+
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self.text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[Tuple, Any]]:
+        """
+        Consume the next chunk of text.
+
+        Args:
+            chunk: Next piece of the JSON document
+
+        Returns:
+            List of (path, value) pairs completed by this chunk, in document order
+        """
+        self.text += chunk
+        events: List[Tuple[Tuple, Any]] = []
+        text = self.text
+        stack = self._stack
+
+        for i in range(self._pos, len(text)):
+            if self.done:
+                break
+            c = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    frame = stack[-1]
+                    if frame.kind == "{" and frame.expect_key:
+                        try:
+                            frame.key = json.loads(text[self._string_start:i + 1])
+                        except ValueError:
+                            frame.key = text[self._string_start + 1:i]
+                continue
+
+            if not self._started:
+                # Skip anything (e.g. a code fence) before the opening brace
+                if c == "{":
+                    self._started = True
+                    stack.append(_Frame("{"))
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                self._begin_value(i)
+            elif c == "{" or c == "[":
+                self._begin_value(i)
+                stack.append(_Frame(c))
+            elif c == "}" or c == "]":
+                self._end_value(i, events)
+                stack.pop()
+                if not stack:
+                    self.done = True
+                else:
+                    self._end_value(i + 1, events)
+            elif c == ",":
+                frame = stack[-1]
+                self._end_value(i, events)
+                if frame.kind == "{":
+                    frame.expect_key = True
+                    frame.key = None
+                else:
+                    frame.index += 1
+            elif c == ":":
+                stack[-1].expect_key = False
+            elif c not in _WHITESPACE:
+                self._begin_value(i)
+
+        self._pos = len(text)
+        return events
+
+    @property
+    def depth(self) -> int:
+        """Number of containers currently open."""
+        return len(self._stack)
+
+    def open_path(self) -> Tuple:
+        """Path of the innermost container that is still open."""
+        return tuple(frame.path_part() for frame in self._stack[:-1])
+
+    def _begin_value(self, i: int) -> None:
+        frame = self._stack[-1]
+        if frame.kind == "{" and frame.expect_key:
+            return
+        if frame.value_start is None:
+            frame.value_start = i
+
+    def _end_value(self, end: int, events: List[Tuple[Tuple, Any]]) -> None:
+        frame = self._stack[-1]
+        start = frame.value_start
+        if start is None:
+            return
+        frame.value_start = None
+        if len(self._stack) > self.max_depth:
+            return
+        try:
+            value = json.loads(self.text[start:end])
+        except ValueError:
+            return
+        path = tuple(f.path_part() for f in self._stack)
+        events.append((path, value))
+
+
+def salvage_json_object(text: str, max_depth: int = 3) -> Dict:
+    """
+    Recover every complete value from a truncated or malformed JSON object.
+
+    Values nested up to max_depth levels are kept as soon as they are closed,
+    so a document cut off inside its third breakdown still yields the first
+    two breakdowns and any completed priority lists.
+
+    Args:
+        text: Raw (possibly truncated) JSON text
+        max_depth: Deepest level at which complete values are recovered
+
+    Returns:
+        Dict holding the recovered values (empty if nothing could be recovered)
+    """
+    parser = StreamingJSONParser(max_depth=max_depth)
+    result: Dict = {}
+    # Children complete before their parents, so a closed container simply
+    # overwrites the partial version assembled from its children
+    for path, value in parser.feed(text):
+        _assign(result, path, value)
+    return result
+
+
+def _assign(root: Dict, path: Tuple, value: Any) -> None:
+    container = root
+    for part, next_part in zip(path, path[1:]):
+        empty = [] if isinstance(next_part, int) else {}
+        if isinstance(container, list):
+            if part >= len(container):
+                container.append(empty)
+            container = container[part]
+        else:
+            container = container.setdefault(part, empty)
+    last = path[-1]
+    if isinstance(container, list):
+        if last >= len(container):
+            container.append(value)
+        else:
+            container[last] = value
+    else:
+        container[last] = value
@@ -0,0 +1,305 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Latency buckets in seconds, from sub-millisecond local work up to slow completions
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonically increasing, thread-safe counter."""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[Tuple[str, str], ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels)} {_format_value(self.value)}"]
+
+
+class Gauge(Counter):
+    """Thread-safe value that can go up and down, such as a queue depth."""
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+
+class Histogram:
+    """
+    Thread-safe histogram with fixed upper bounds, in the Prometheus model.
+
+    observe() is a binary search and three increments under a lock, cheap
+    enough for every request on the hot path.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels: Tuple[Tuple[str, str], ...] = ()
+        self.buckets = tuple(sorted(buckets))
+        # One slot per bucket plus the implicit +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def add(self, counts: Sequence[int], total: float, count: int) -> None:
+        """Add the bucket counts, sum and count of another histogram with the same buckets."""
+        with self._lock:
+            self.counts = [mine + theirs for mine, theirs in zip(self.counts, counts)]
+            self.sum += total
+            self.count += count
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the wall-clock duration of the block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {_format_value(total)}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+Metric = Union[Counter, Gauge, Histogram]
+
+
+class MetricsRegistry:
+    """Process-wide collection of named metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labels: Optional[Dict[str, str]] = None) -> Counter:
+        """Return the counter registered under name (and labels), creating it on first use."""
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = Counter(name, documentation, key[1])
+                self._metrics[key] = metric
+            return metric
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        """Return the gauge registered under name, creating it on first use."""
+        key = (name, ())
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = Gauge(name, documentation)
+                self._metrics[key] = metric
+            return metric
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Return the histogram registered under name, creating it on first use."""
+        key = (name, ())
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = Histogram(name, documentation, buckets)
+                self._metrics[key] = metric
+            return metric
+
+    def snapshot(self) -> Dict[str, float]:
+        """Current value of every counter and gauge, and the count and sum of every histogram."""
+        values = {}
+        for (name, labels), metric in list(self._metrics.items()):
+            if isinstance(metric, Histogram):
+                values[f"{name}_count"] = metric.count
+                values[f"{name}_sum"] = metric.sum
+            else:
+                values[f"{name}{_format_labels(labels)}"] = metric.value
+        return values
+
+    def state(self) -> List[Dict[str, Any]]:
+        """Every metric as a JSON-serializable entry that merge() can add into another registry."""
+        entries = []
+        for (name, labels), metric in list(self._metrics.items()):
+            entry: Dict[str, Any] = {"name": name, "documentation": metric.documentation, "labels": dict(labels)}
+            if isinstance(metric, Histogram):
+                with metric._lock:
+                    entry.update(
+                        kind="histogram", buckets=list(metric.buckets), counts=list(metric.counts),
+                        sum=metric.sum, count=metric.count,
+                    )
+            else:
+                entry.update(kind="gauge" if isinstance(metric, Gauge) else "counter", value=metric.value)
+            entries.append(entry)
+        return entries
+
+    def merge(self, state: List[Dict[str, Any]], gauges: bool = True) -> None:
+        """Add the values of a state() from another registry to this one's; without gauges they are skipped."""
+        for entry in state:
+            kind = entry["kind"]
+            if kind == "histogram":
+                histogram = self.histogram(entry["name"], entry["documentation"], entry["buckets"])
+                if list(histogram.buckets) == entry["buckets"]:
+                    histogram.add(entry["counts"], entry["sum"], entry["count"])
+            elif kind == "gauge":
+                if gauges:
+                    self.gauge(entry["name"], entry["documentation"]).inc(entry["value"])
+            else:
+                self.counter(entry["name"], entry["documentation"], entry["labels"]).inc(entry["value"])
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        by_name: Dict[str, List[Metric]] = {}
+        for (name, _), metric in sorted(list(self._metrics.items()), key=lambda item: item[0]):
+            by_name.setdefault(name, []).append(metric)
+        lines = []
+        for name, metrics in by_name.items():
+            first = metrics[0]
+            if isinstance(first, Histogram):
+                kind = "histogram"
+            elif isinstance(first, Gauge):
+                kind = "gauge"
+            else:
+                kind = "counter"
+            lines.append(f"# HELP {name} {first.documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics:
+                lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsDirectory:
+    """
+    Metrics of every pre-forked worker, one snapshot file per process in a shared directory.
+
+    Each worker's registry only counts the requests that worker served, and a
+    scrape lands on whichever worker accepts it. So every worker writes its
+    registry, and any stats it is given, to <directory>/<pid>.json every
+    flush_seconds and before answering a scrape, and the scrape merges all
+    the files. Counters and histograms are summed over every worker that ran
+    since the directory was cleared, so totals do not go backwards when a
+    worker is replaced; gauges are summed over the workers still alive. The
+    other workers' figures are up to flush_seconds old.
+    """
+
+    def __init__(self, directory: str, registry: MetricsRegistry = REGISTRY, flush_seconds: float = 5.0):
+        self.directory = Path(directory)
+        self.registry = registry
+        self.flush_seconds = flush_seconds
+        self._stats: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_env(cls) -> Optional["MetricsDirectory"]:
+        """METRICS_DIR and METRICS_FLUSH_SECONDS; None when METRICS_DIR is unset (a single process)."""
+        directory = os.getenv("METRICS_DIR")
+        if not directory:
+            return None
+        return cls(directory, flush_seconds=float(os.getenv("METRICS_FLUSH_SECONDS", "5")))
+
+    def clear(self) -> None:
+        """Create the directory and remove the snapshots of an earlier run."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for path in self.directory.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+    def write(self, stats: Optional[Dict[str, Any]] = None) -> None:
+        """Replace this process's snapshot with its current metrics, and stats if given (else the last ones)."""
+        if stats is not None:
+            self._stats = stats
+        pid = os.getpid()
+        snapshot = {"pid": pid, "written": time.time(), "metrics": self.registry.state(), "stats": self._stats}
+        path = self.directory / f"{pid}.json"
+        partial = self.directory / f".{pid}.json.tmp"
+        partial.write_text(json.dumps(snapshot))
+        # Readers see either the previous snapshot or this one, never half of one
+        os.replace(partial, path)
+
+    def read(self) -> List[Dict[str, Any]]:
+        """Every worker's latest snapshot, with whether the worker is still alive."""
+        snapshots = []
+        for path in sorted(self.directory.glob("*.json")):
+            try:
+                snapshot = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            snapshot["alive"] = _alive(snapshot["pid"])
+            snapshots.append(snapshot)
+        return snapshots
+
+    def merged(self) -> MetricsRegistry:
+        """A registry holding the sum of every worker's metrics."""
+        registry = MetricsRegistry()
+        for snapshot in self.read():
+            registry.merge(snapshot["metrics"], gauges=snapshot["alive"])
+        return registry
+
+    def worker_stats(self) -> Dict[str, Any]:
+        """The stats each live worker last wrote, keyed by process id."""
+        return {
+            str(snapshot["pid"]): snapshot["stats"]
+            for snapshot in self.read()
+            if snapshot["alive"] and snapshot["stats"] is not None
+        }
@@ -1,5 +1,24 @@
 import re
-from typing import List
+from functools import lru_cache
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Bullet, numbering and "(a)" prefixes, removed in that order (each at most once).
+# Matches: -, *, •, 1., 1), (a), etc.
+_PREFIX_RE = re.compile(r'(?:[-*•]\s+)?(?:\d+[.)]\s+)?(?:\([a-zA-Z0-9]+\)\s+)?')
+
+# Characters read per chunk when streaming from a file object
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _clean_line(line: str) -> str:
+    """Strip whitespace and list prefixes from one input line."""
+    line = line.strip()
+    if not line:
+        return line
+    prefix_end = _PREFIX_RE.match(line).end()
+    if prefix_end:
+        line = line[prefix_end:].strip()
+    return line
 
 
 def parse_tasks(input_text: str) -> List[str]:
@@ -13,31 +32,14 @@ def parse_tasks(input_text: str) -> List[str]:
     Returns:
         List of parsed task strings
     """
-    if not input_text or not input_text.strip():
+    if not input_text:
         return []
     
-    # Normalize whitespace
-    text = input_text.strip()
-    
     # Split by common delimiters: newlines, bullets, commas
     # First, try splitting by newlines (most common for task lists)
-    lines = text.split('\n')
-    
     tasks = []
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Remove common bullet points and numbering
-        # Matches: -, *, •, 1., 1), etc.
-        line = re.sub(r'^[\s]*[-*•]\s+', '', line)
-        line = re.sub(r'^[\s]*\d+[.)]\s+', '', line)
-        line = re.sub(r'^[\s]*\([a-zA-Z0-9]+\)\s+', '', line)
-        
-        # Remove leading/trailing whitespace again
-        line = line.strip()
-        
+    for line in input_text.split('\n'):
+        line = _clean_line(line)
         if line:
             tasks.append(line)
     
@@ -59,6 +61,78 @@ def parse_tasks(input_text: str) -> List[str]:
     return unique_tasks
 
 
+def _iter_chunks(source: Union[str, IO[str], Iterable[str]], chunk_size: int) -> Iterator[str]:
+    if isinstance(source, str):
+        yield source
+    elif hasattr(source, "read"):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+
+def iter_tasks(source: Union[str, IO[str], Iterable[str]], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Stream tasks from a string, a text file object or an iterable of text chunks.
+    
+    Yields the same tasks, in the same order, as parse_tasks on the joined text,
+    but only holds one partial line plus the set of tasks already seen, so
+    multi-megabyte inputs can be consumed without loading them whole.
+    
+    Args:
+        source: Text, an object with read(), or any iterable of str chunks
+        chunk_size: Characters to read per call when source is a file object
+        
+    Yields:
+        Parsed task strings
+    """
+    seen = set()
+    # The first task is held back until a second line proves the input is not
+    # a single comma-separated line
+    first: Optional[str] = None
+    count = 0
+    partial = ""
+    
+    def emit(task: str) -> Iterator[str]:
+        task_lower = task.lower()
+        if task_lower not in seen:
+            seen.add(task_lower)
+            yield task
+    
+    for chunk in _iter_chunks(source, chunk_size):
+        lines = (partial + chunk).split('\n')
+        partial = lines.pop()
+        for line in lines:
+            line = _clean_line(line)
+            if not line:
+                continue
+            count += 1
+            if count == 1:
+                first = line
+                continue
+            if count == 2:
+                yield from emit(first)
+            yield from emit(line)
+    
+    line = _clean_line(partial)
+    if line:
+        count += 1
+        if count == 1:
+            first = line
+        else:
+            if count == 2:
+                yield from emit(first)
+            yield from emit(line)
+    
+    if count == 1:
+        comma_tasks = [t.strip() for t in first.split(',') if t.strip()] if ',' in first else []
+        for task in comma_tasks if len(comma_tasks) > 1 else [first]:
+            yield from emit(task)
+
+
 def validate_task_count(tasks: List[str], max_tasks: int = 50) -> None:
     """
     Validate that we don't have too many tasks.
@@ -73,3 +147,190 @@ def validate_task_count(tasks: List[str], max_tasks: int = 50) -> None:
     if len(tasks) > max_tasks:
         raise ValueError(f"Too many tasks. Maximum {max_tasks} tasks allowed.")
 
+
+# Urgency markers that make a task due today regardless of any deadline
+_URGENT_MARKER_RE = re.compile(r"\b(urgent|asap|immediately|right away|right now|overdue)\b", re.IGNORECASE)
+# Day names and their usual abbreviations only, so "on wedding" or "on monitor" are not deadlines
+_WEEKDAY = r"(?:mon|tue(?:s)?|wed(?:nes)?|thu(?:rs)?|fri|sat(?:ur)?|sun)(?:day)?\b"
+# One alternation per urgency level: 3 = today, 2 = within days, 1 = soon
+_DEADLINE_RE = re.compile(
+    r"\b(?:(?P<today>(?:by\s+)?(?:today|tonight|eod|end of (?:the )?day))"
+    r"|(?P<near>(?:by\s+)?tomorrow|this week"
+    r"|(?:by|before|on|due|until)\s+" + _WEEKDAY +
+    r"|(?:by|before|due|on)\s+\d{1,2}[/.]\d{1,2}"
+    r"|(?:by|before|due|at)\s+(?:\d{1,2}(?::\d{2})?\s*(?:am|pm)|\d{1,2}:\d{2}|noon))"
+    r"|(?P<soon>soon|next week|this month))\b",
+    re.IGNORECASE,
+)
+_DEADLINE_LEVELS = {"today": 3, "near": 2, "soon": 1}
+# "30 min", "1.5 hours", "45m", "2h", "for an hour"; a bare h/m unit must be attached to the number
+_EFFORT_RE = re.compile(
+    r"\(?\b(?:(?:for|in|takes)\s+)?(?:(?P<value>\d+(?:\.\d+)?)(?:\s*(?P<unit>hours?|hrs?|minutes?|mins?)|(?P<short>[hm]))"
+    r"|(?P<half>half an hour)|(?P<hour>an hour))\b\)?",
+    re.IGNORECASE,
+)
+_TITLE_CLEANUP_RE = re.compile(r"^[\s:;,\-!]+|[\s:;,\-!(]+$|\(\s*\)")
+_MULTISPACE_RE = re.compile(r"\s{2,}")
+
+
+class ParsedTask:
+    """
+    A parsed task with the details that can be detected locally.
+
+    Attributes:
+        text: Task string exactly as parse_tasks returns it (the task name)
+        title: text with deadline, effort and urgency phrases removed
+        deadline: Deadline phrase as written (e.g. "by Friday"), or None
+        effort_minutes: Estimated effort in minutes (e.g. "30 min"), or None
+        urgency: 0 (no signal) to 3 (due today)
+        markers: Urgency markers found in the text (e.g. ("urgent",))
+        parent: Index of the enclosing task for indented sub-items, or None
+        children: Indices of the task's indented sub-items
+    """
+
+    __slots__ = ("text", "title", "deadline", "effort_minutes", "urgency", "markers", "parent", "children")
+
+    def __init__(self, text: str, parent: Optional[int] = None):
+        self.text = text
+        self.parent = parent
+        self.children: List[int] = []
+        (self.title, self.deadline, self.effort_minutes,
+         self.urgency, self.markers) = extract_task_details(text)
+
+    def annotation(self, parent: Optional[str] = None) -> str:
+        """Short hint describing the extracted details and the parent task's text, or "" if there are none."""
+        hints = []
+        if parent:
+            hints.append(f"part of: {parent}")
+        if self.deadline:
+            hints.append(f"deadline: {self.deadline}")
+        if self.effort_minutes:
+            hints.append(f"effort: {self.effort_minutes} min")
+        if self.markers:
+            hints.append("urgent")
+        return f"[{' | '.join(hints)}]" if hints else ""
+
+    def __repr__(self) -> str:
+        return f"ParsedTask({self.text!r}, deadline={self.deadline!r}, urgency={self.urgency})"
+
+
+@lru_cache(maxsize=4096)
+def extract_task_details(text: str) -> Tuple[str, Optional[str], Optional[int], int, Tuple[str, ...]]:
+    """
+    Extract deadline, effort and urgency from a single task string.
+
+    Memoized, so every ParsedTask built for the same text along the pipeline
+    (parsing, prompt, local prioritizer) reuses one extraction.
+
+    Args:
+        text: One task
+
+    Returns:
+        (title, deadline, effort_minutes, urgency, markers)
+    """
+    urgency = 0
+    deadline = None
+    for match in _DEADLINE_RE.finditer(text):
+        level = _DEADLINE_LEVELS[match.lastgroup]
+        if level > urgency:
+            urgency = level
+            deadline = match.group(0)
+
+    markers = tuple(m.lower() for m in _URGENT_MARKER_RE.findall(text))
+    if markers:
+        urgency = 3
+
+    effort_minutes = None
+    effort = _EFFORT_RE.search(text)
+    if effort:
+        if effort.group("half"):
+            effort_minutes = 30
+        elif effort.group("hour"):
+            effort_minutes = 60
+        else:
+            value = float(effort.group("value"))
+            unit = (effort.group("unit") or effort.group("short")).lower()
+            effort_minutes = int(round(value * 60 if unit.startswith("h") else value))
+
+    title = text
+    if deadline or markers or effort:
+        title = _DEADLINE_RE.sub("", title)
+        title = _URGENT_MARKER_RE.sub("", title)
+        title = _EFFORT_RE.sub("", title)
+        title = _MULTISPACE_RE.sub(" ", _TITLE_CLEANUP_RE.sub("", title)).strip() or text
+
+    return title, deadline, effort_minutes, urgency, markers
+
+
+def parse_task_records(input_text: str) -> List[ParsedTask]:
+    """
+    Parse input text into ParsedTask records in a single pass.
+    
+    Produces the same tasks, in the same order, as parse_tasks, and additionally
+    records deadlines, effort, urgency and the nesting of indented sub-items.
+    
+    Args:
+        input_text: Raw text input from user
+        
+    Returns:
+        List of ParsedTask records
+    """
+    if not input_text or not input_text.strip():
+        return []
+    
+    records: List[ParsedTask] = []
+    index_by_key = {}
+    # (indent, record index) of the enclosing items for the current line
+    parents: List[Tuple[int, int]] = []
+    
+    for line in input_text.split('\n'):
+        line = line.expandtabs(4)
+        stripped = line.strip()
+        if not stripped:
+            continue
+        indent = len(line) - len(line.lstrip())
+        
+        task = _clean_line(stripped)
+        if not task:
+            continue
+        
+        while parents and parents[-1][0] >= indent:
+            parents.pop()
+        parent = parents[-1][1] if parents else None
+        
+        key = task.lower()
+        index = index_by_key.get(key)
+        if index is None:
+            index = len(records)
+            index_by_key[key] = index
+            records.append(ParsedTask(task, parent))
+            if parent is not None:
+                records[parent].children.append(index)
+        parents.append((indent, index))
+    
+    # A single line with commas is a comma-separated list
+    if len(records) == 1 and ',' in records[0].text:
+        parts = [t.strip() for t in records[0].text.split(',') if t.strip()]
+        if len(parts) > 1:
+            records = []
+            seen = set()
+            for part in parts:
+                if part.lower() not in seen:
+                    seen.add(part.lower())
+                    records.append(ParsedTask(part))
+    
+    return records
+
+
+def task_parents(records: List[ParsedTask]) -> Dict[str, str]:
+    """Map the text of every nested record to the text of the task it is nested under."""
+    return {
+        record.text: records[record.parent].text
+        for record in records
+        if record.parent is not None
+    }
+
+
+def presort_tasks(records: List[ParsedTask]) -> List[ParsedTask]:
+    """Order records by urgency (most urgent first), keeping input order for ties."""
+    return sorted(records, key=lambda record: -record.urgency)
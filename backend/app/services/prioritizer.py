@@ -0,0 +1,202 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from app.models.schemas import TaskAnalysisResponse, TaskBreakdown, TaskStep, NextAction
+from app.services.parser import ParsedTask
+
+_IMPACT_RE = re.compile(
+    r"\b(pay|bill|rent|tax(es)?|invoice|client|customer|boss|manager|doctor|dentist|"
+    r"medicine|insurance|contract|submit|interview|bank|visa|passport)\b",
+    re.IGNORECASE,
+)
+_OPTIONAL_RE = re.compile(r"\b(maybe|someday|if (i have )?time|nice to have|eventually|optional)\b", re.IGNORECASE)
+
+# Leading verb -> (verbs, step templates); "{object}" is the rest of the task text
+_TEMPLATES: List[Tuple[Tuple[str, ...], List[Tuple[str, int]]]] = [
+    (("call", "phone", "ring"), [
+        ("Look up the number for {object}", 2),
+        ("Jot down what you need to say", 3),
+        ("Make the call: {object}", 10),
+    ]),
+    (("email", "reply", "respond", "message", "text"), [
+        ("Open your inbox and find the thread for {object}", 2),
+        ("Draft the message", 10),
+        ("Reread it and send", 3),
+    ]),
+    (("buy", "order"), [
+        ("Write down exactly what you need for {object}", 2),
+        ("Decide where to get it", 3),
+        ("Buy it: {object}", 15),
+    ]),
+    (("pay", "renew"), [
+        ("Find the bill or account for {object}", 3),
+        ("Log in to the account", 3),
+        ("Complete the payment and save the receipt", 5),
+    ]),
+    (("write", "draft", "prepare", "finish", "update"), [
+        ("Open a blank document for {object}", 2),
+        ("Outline the main points", 10),
+        ("Write the first draft", 20),
+        ("Review and finalize", 15),
+    ]),
+    (("book", "schedule", "plan", "arrange"), [
+        ("Open your calendar", 2),
+        ("Pick two possible time slots", 3),
+        ("Book it: {object}", 10),
+    ]),
+    (("clean", "tidy", "organize", "wash", "sort"), [
+        ("Set a timer and clear one small area for {object}", 5),
+        ("Put away what is out of place", 15),
+        ("Finish the rest: {object}", 20),
+    ]),
+    (("read", "review", "study", "check"), [
+        ("Open {object}", 2),
+        ("Skim it and note the key points", 10),
+        ("Go through it in detail", 20),
+    ]),
+    (("fix", "repair", "submit", "file", "send"), [
+        ("Gather what you need for {object}", 5),
+        ("Do the core part of the work", 15),
+        ("Double-check and complete it", 10),
+    ]),
+]
+_VERB_TEMPLATES: Dict[str, List[Tuple[str, int]]] = {
+    verb: steps for verbs, steps in _TEMPLATES for verb in verbs
+}
+_GENERIC_STEPS = [
+    ("Write down what done looks like for {object}", 3),
+    ("Gather what you need", 5),
+    ("Work on {object} for a focused block", 20),
+]
+_LEADING_WORD_RE = re.compile(r"^\s*([A-Za-z]+)\s*(.*)$")
+
+PRIORITY_ORDER = ("must", "should", "optional")
+
+
+class HeuristicPrioritizer:
+    """
+    Deterministic, LLM-free prioritizer.
+
+    Buckets tasks from the deadlines and urgency markers the parser extracts,
+    impact keywords and "optional" markers, and breaks them down with verb
+    templates. It produces
+    a valid TaskAnalysisResponse in well under a millisecond for short lists.
+    """
+
+    def analyze(self, tasks: List[str]) -> TaskAnalysisResponse:
+        """
+        Analyze tasks locally.
+
+        Args:
+            tasks: List of task strings
+
+        Returns:
+            TaskAnalysisResponse with priorities, breakdowns, and next action
+        """
+        if not tasks:
+            raise ValueError("Tasks list cannot be empty")
+
+        # Parsed once and shared by classification and breakdown
+        records = [ParsedTask(task) for task in tasks]
+        scored = {bucket: [] for bucket in PRIORITY_ORDER}
+        for index, record in enumerate(records):
+            bucket, score = self._classify(record)
+            scored[bucket].append((-score, index, record.text))
+        priorities = {
+            bucket: [task for _, _, task in sorted(items)]
+            for bucket, items in scored.items()
+        }
+
+        breakdown = {record.text: self._breakdown(record.title) for record in records}
+
+        top_bucket = next(bucket for bucket in PRIORITY_ORDER if priorities[bucket])
+        # Smallest first step within the most important bucket wins
+        next_task = min(
+            priorities[top_bucket],
+            key=lambda task: breakdown[task].steps[0].minutes
+        )
+        first_step = breakdown[next_task].steps[0]
+
+        return TaskAnalysisResponse(
+            priorities=priorities,
+            breakdown=breakdown,
+            next_action=NextAction(task=next_task, step=first_step.step, minutes=first_step.minutes)
+        )
+
+    def breakdown(self, task: str) -> TaskBreakdown:
+        """Break a task down with the template for its leading verb."""
+        return self._breakdown(ParsedTask(task).title)
+
+    def _breakdown(self, title: str) -> TaskBreakdown:
+        verb, rest = self._split_verb(title)
+        templates = _VERB_TEMPLATES.get(verb, _GENERIC_STEPS)
+        subject = rest if verb in _VERB_TEMPLATES and rest else title
+        return TaskBreakdown(steps=[
+            TaskStep(step=text.format(object=subject), minutes=minutes)
+            for text, minutes in templates
+        ])
+
+    def recognizes(self, task: str) -> bool:
+        """Whether the task starts with a verb the templates know."""
+        verb, rest = self._split_verb(ParsedTask(task).title)
+        return verb in _VERB_TEMPLATES and bool(rest)
+
+    def _split_verb(self, task: str) -> Tuple[str, str]:
+        match = _LEADING_WORD_RE.match(task)
+        if not match:
+            return "", task
+        return match.group(1).lower(), match.group(2).strip()
+
+    def _classify(self, record: ParsedTask) -> Tuple[str, int]:
+        urgency = record.urgency
+        impact = 1 if _IMPACT_RE.search(record.text) else 0
+        score = urgency * 2 + impact
+        if urgency >= 2 or (urgency == 1 and impact):
+            return "must", score
+        if _OPTIONAL_RE.search(record.text):
+            return "optional", score
+        return "should", score
+
+
+class RoutingPolicy:
+    """
+    Decide whether the local engine is good enough for a task list.
+
+    Modes:
+        "llm": always use the model
+        "local": always use the local engine
+        "auto": use the local engine for short lists of short tasks whose
+                verbs all have templates, and escalate everything else
+    """
+
+    MODES = ("auto", "llm", "local")
+
+    def __init__(self, mode: str = "auto", max_tasks: int = 5, max_words: int = 6,
+                 engine: Optional[HeuristicPrioritizer] = None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown prioritizer mode: {mode}. Expected one of {', '.join(self.MODES)}")
+        self.mode = mode
+        self.max_tasks = max_tasks
+        self.max_words = max_words
+        self.engine = engine or HeuristicPrioritizer()
+
+    @classmethod
+    def from_env(cls, engine: Optional[HeuristicPrioritizer] = None) -> "RoutingPolicy":
+        """Build the policy from PRIORITIZER_MODE, LOCAL_MAX_TASKS and LOCAL_MAX_WORDS."""
+        return cls(
+            mode=os.getenv("PRIORITIZER_MODE", "auto").lower(),
+            max_tasks=int(os.getenv("LOCAL_MAX_TASKS", "5")),
+            max_words=int(os.getenv("LOCAL_MAX_WORDS", "6")),
+            engine=engine,
+        )
+
+    def use_local(self, tasks: List[str]) -> bool:
+        """Whether tasks should be answered by the local engine."""
+        if self.mode != "auto":
+            return self.mode == "local"
+        if len(tasks) > self.max_tasks:
+            return False
+        return all(
+            len(task.split()) <= self.max_words and self.engine.recognizes(task)
+            for task in tasks
+        )
@@ -0,0 +1,349 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+from app.services.metrics import REGISTRY
+
+T = TypeVar("T")
+
+# End-to-end budget for one analysis request, model calls and retries included
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("ANALYSIS_DEADLINE_SECONDS", "30"))
+
+LLM_RETRIES = REGISTRY.counter("llm_retries_total", "LLM calls retried after a retryable error")
+DEADLINES_EXCEEDED = REGISTRY.counter(
+    "llm_deadline_exceeded_total",
+    "Analyses abandoned because the request deadline ran out"
+)
+HEDGES_SENT = REGISTRY.counter(
+    "llm_hedges_sent_total",
+    "Second LLM calls fired because the first one exceeded the observed p90"
+)
+HEDGE_WINS = REGISTRY.counter("llm_hedge_wins_total", "Hedged LLM calls that returned before the original")
+CIRCUIT_OPENED = REGISTRY.counter("llm_circuit_opened_total", "Times the LLM circuit breaker tripped open")
+
+_current_deadline: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar(
+    "analysis_deadline", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time before the model answered."""
+
+
+class Deadline:
+    """Absolute point in time by which a request must finish."""
+
+    __slots__ = ("expires_at", "_clock")
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)."""
+        return max(0.0, self.expires_at - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+@contextmanager
+def deadline_scope(seconds: float = DEFAULT_DEADLINE_SECONDS) -> Iterator[Deadline]:
+    """
+    Set the deadline for everything called inside the block, including tasks it spawns.
+
+    A scope nested in another never extends the outer deadline.
+    """
+    deadline = Deadline(seconds)
+    outer = _current_deadline.get()
+    if outer is not None and outer.expires_at < deadline.expires_at:
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline of the request being handled, if one was set."""
+    return _current_deadline.get()
+
+
+class RetryPolicy:
+    """
+    Retry retryable errors with full-jitter exponential backoff.
+
+    Connection errors, timeouts, 408/409/429 and 5xx responses are retried;
+    anything else (bad request, auth) fails immediately.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.25, max_delay: float = 2.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """Build the policy from LLM_MAX_ATTEMPTS, LLM_RETRY_BASE_DELAY and LLM_RETRY_MAX_DELAY."""
+        return cls(
+            max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.25")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "2.0")),
+        )
+
+    def is_retryable(self, error: BaseException) -> bool:
+        # Deferred like AIService's own import; only reached once a call has failed
+        import openai
+        if isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in (408, 409, 429) or error.status_code >= 500
+        return False
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number attempt (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+async def retry_async(fn: Callable[[], Awaitable[T]], policy: RetryPolicy, deadline: Deadline) -> T:
+    """
+    Await fn() until it succeeds, retrying only while the deadline leaves room.
+
+    Every attempt is cut off when the deadline expires.
+
+    Raises:
+        DeadlineExceeded: If the deadline runs out
+        Exception: The last error if it is not retryable or attempts are used up
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            DEADLINES_EXCEEDED.inc()
+            raise DeadlineExceeded("Analysis did not finish before the request deadline")
+        try:
+            return await asyncio.wait_for(fn(), timeout=remaining)
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError) and deadline.expired:
+                DEADLINES_EXCEEDED.inc()
+                raise DeadlineExceeded("Analysis did not finish before the request deadline") from e
+            delay = policy.backoff(attempt)
+            if not policy.is_retryable(e) or attempt >= policy.max_attempts or delay >= deadline.remaining():
+                raise
+            LLM_RETRIES.inc()
+        await asyncio.sleep(delay)
+
+
+async def iterate_within(items: AsyncIterable[T], deadline: Deadline) -> AsyncIterator[T]:
+    """
+    Yield from items, giving up when the next one has not arrived by the deadline.
+
+    Raises:
+        DeadlineExceeded: If the deadline runs out while waiting for an item
+    """
+    iterator = items.__aiter__()
+    while True:
+        try:
+            item = await asyncio.wait_for(iterator.__anext__(), timeout=deadline.remaining())
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError as e:
+            DEADLINES_EXCEEDED.inc()
+            raise DeadlineExceeded("Analysis did not finish before the request deadline") from e
+        yield item
+
+
+def retry_sync(fn: Callable[[float], T], policy: RetryPolicy, deadline: Deadline) -> T:
+    """
+    Blocking counterpart of retry_async.
+
+    fn receives the seconds left and is expected to use them as its timeout.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            DEADLINES_EXCEEDED.inc()
+            raise DeadlineExceeded("Analysis did not finish before the request deadline")
+        try:
+            return fn(remaining)
+        except Exception as e:
+            delay = policy.backoff(attempt)
+            if not policy.is_retryable(e) or attempt >= policy.max_attempts or delay >= deadline.remaining():
+                raise
+            LLM_RETRIES.inc()
+            time.sleep(delay)
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies for percentile estimates."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Latency at the given fraction (e.g. 0.9), or None until enough samples exist."""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def hedge(fn: Callable[[], Awaitable[T]], delay: Optional[float]) -> T:
+    """
+    Await fn(), firing a second identical call if the first is still running after delay.
+
+    Whichever call succeeds first wins and the other is cancelled. An error
+    is raised only when both calls fail. With delay None no hedge is sent.
+    """
+    if delay is None:
+        return await fn()
+    calls = [asyncio.ensure_future(fn())]
+    try:
+        done, _ = await asyncio.wait(calls, timeout=delay)
+        if done:
+            return calls[0].result()
+        HEDGES_SENT.inc()
+        calls.append(asyncio.ensure_future(fn()))
+        pending = set(calls)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for call in done:
+                if call.exception() is None:
+                    if call is calls[1]:
+                        HEDGE_WINS.inc()
+                    return call.result()
+                error = call.exception()
+        raise error
+    finally:
+        for call in calls:
+            if not call.done():
+                call.cancel()
+
+
+class CircuitBreaker:
+    """
+    Stop calling a backend that is failing or too slow.
+
+    The outcomes of the last window calls are kept; a call counts as bad when
+    it fails or takes longer than slow_call_seconds. Once at least min_calls
+    are recorded and the bad fraction reaches failure_rate, the breaker opens
+    and allow() refuses calls for open_seconds. It then goes half-open and
+    lets a single probe through: success closes it, failure reopens it. A
+    probe that never reports back is replaced after another open_seconds.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        min_calls: int = 10,
+        window: int = 20,
+        slow_call_seconds: float = 20.0,
+        open_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._outcomes: deque = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreaker":
+        """Build the breaker from the CIRCUIT_* environment variables."""
+        return cls(
+            failure_rate=float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5")),
+            min_calls=int(os.getenv("CIRCUIT_MIN_CALLS", "10")),
+            window=int(os.getenv("CIRCUIT_WINDOW", "20")),
+            slow_call_seconds=float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "20")),
+            open_seconds=float(os.getenv("CIRCUIT_OPEN_SECONDS", "30")),
+        )
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may be made now (in half-open state, only one probe at a time)."""
+        with self._lock:
+            self._refresh()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN:
+                now = self._clock()
+                if self._probe_started is None or now - self._probe_started >= self.open_seconds:
+                    self._probe_started = now
+                    return True
+            return False
+
+    def record_success(self, seconds: float = 0.0) -> None:
+        """Record a completed call and how long it took."""
+        self._record(seconds <= self.slow_call_seconds)
+
+    def record_failure(self) -> None:
+        """Record a failed call."""
+        self._record(False)
+
+    def _record(self, ok: bool) -> None:
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probe_started = None
+                if ok:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._trip()
+                return
+            if self._state == self.OPEN:
+                # A call started before the breaker opened; its outcome is stale
+                return
+            self._outcomes.append(ok)
+            bad = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and bad >= self.failure_rate * len(self._outcomes):
+                self._trip()
+
+    def _trip(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        CIRCUIT_OPENED.inc()
+
+    def _refresh(self) -> None:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_started = None
+
+    def stats(self) -> Dict[str, object]:
+        """Current state and the outcomes in the window."""
+        with self._lock:
+            self._refresh()
+            return {
+                "state": self._state,
+                "calls": len(self._outcomes),
+                "failures": self._outcomes.count(False),
+            }
@@ -0,0 +1,51 @@
+import json
+from typing import Any, Dict
+from pydantic import TypeAdapter
+from app.models.schemas import TaskAnalysisResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Built once: creating a TypeAdapter compiles the validator and serializer
+ANALYSIS_ADAPTER = TypeAdapter(TaskAnalysisResponse)
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    """
+    Decode JSON text, with orjson when it is installed.
+
+    Raises:
+        json.JSONDecodeError: If data is not valid JSON (orjson's error subclasses it)
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def validate_analysis(data: Dict) -> TaskAnalysisResponse:
+    """Validate a whole analysis tree of plain dicts in a single pass."""
+    return ANALYSIS_ADAPTER.validate_python(data)
+
+
+def parse_analysis(data: bytes) -> TaskAnalysisResponse:
+    """Decode and validate an analysis rendered by render_analysis."""
+    return ANALYSIS_ADAPTER.validate_json(data)
+
+
+def render_analysis(result: TaskAnalysisResponse) -> bytes:
+    """
+    Response body for an analysis.
+
+    The result is already validated, so it is serialized directly instead
+    of going through response_model validation a second time.
+    """
+    return ANALYSIS_ADAPTER.dump_json(result)
@@ -0,0 +1,98 @@
+from typing import List, Optional
+from app.models.schemas import TaskAnalysisResponse, NextAction
+
+PRIORITY_ORDER = ("must", "should", "optional")
+
+
+def split_into_shards(tasks: List[str], shard_size: int) -> List[List[str]]:
+    """
+    Split tasks into contiguous, evenly sized shards of at most shard_size tasks.
+
+    Args:
+        tasks: Parsed task list
+        shard_size: Maximum number of tasks per shard
+
+    Returns:
+        List of shards, preserving the original task order
+    """
+    if shard_size <= 0 or len(tasks) <= shard_size:
+        return [tasks]
+    shard_count = -(-len(tasks) // shard_size)
+    base, extra = divmod(len(tasks), shard_count)
+    shards = []
+    start = 0
+    for i in range(shard_count):
+        end = start + base + (1 if i < extra else 0)
+        shards.append(tasks[start:end])
+        start = end
+    return shards
+
+
+def _interleave(lists: List[List[str]]) -> List[str]:
+    """Round-robin merge, so every shard's top-ranked tasks come first."""
+    merged = []
+    for rank in range(max((len(items) for items in lists), default=0)):
+        for items in lists:
+            if rank < len(items):
+                merged.append(items[rank])
+    return merged
+
+
+def merge_shard_results(results: List[TaskAnalysisResponse]) -> TaskAnalysisResponse:
+    """
+    Merge per-shard analyses into one response.
+
+    Priority buckets are interleaved across shards, breakdowns are unioned and
+    a single next action is chosen from the highest non-empty bucket, preferring
+    the shortest first step.
+
+    Args:
+        results: One TaskAnalysisResponse per shard, in shard order
+
+    Returns:
+        Combined TaskAnalysisResponse
+    """
+    if len(results) == 1:
+        return results[0]
+
+    priorities = {
+        bucket: _interleave([result.priorities.get(bucket, []) for result in results])
+        for bucket in PRIORITY_ORDER
+    }
+    breakdown = {}
+    for result in results:
+        breakdown.update(result.breakdown)
+
+    return TaskAnalysisResponse(
+        priorities=priorities,
+        breakdown=breakdown,
+        next_action=_pick_next_action(results, priorities, breakdown),
+        degraded=any(result.degraded for result in results)
+    )
+
+
+def _pick_next_action(results, priorities, breakdown) -> NextAction:
+    bucket_of = {
+        task: rank
+        for rank, bucket in enumerate(PRIORITY_ORDER)
+        for task in priorities[bucket]
+    }
+    best: Optional[NextAction] = None
+    best_rank = None
+    for result in results:
+        action = result.next_action
+        if action.task not in bucket_of or not action.step:
+            continue
+        rank = (bucket_of[action.task], action.minutes)
+        if best_rank is None or rank < best_rank:
+            best, best_rank = action, rank
+    if best is not None:
+        return best
+
+    # No shard produced a usable next action: fall back to the first step of the top task
+    for bucket in PRIORITY_ORDER:
+        for task in priorities[bucket]:
+            if task in breakdown:
+                first_step = breakdown[task].steps[0]
+                return NextAction(task=task, step=first_step.step, minutes=first_step.minutes)
+    return results[0].next_action
@@ -0,0 +1,213 @@
+import logging
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Generic, List, Optional, Sequence, Tuple, TypeVar
+from app.services.dedup import canonical_task, same_specifics, task_specifics, task_words
+from app.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+SIMILAR_HITS = REGISTRY.counter(
+    "similarity_cache_hits_total",
+    "Breakdowns reused from a differently worded task"
+)
+
+# Shorthand people use in task lists, expanded so it matches the spelled-out form
+_ABBREVIATIONS = {
+    "prep": "prepare", "mtg": "meeting", "appt": "appointment", "doc": "document",
+    "docs": "document", "pres": "presentation", "msg": "message", "reqs": "requirement",
+    "req": "requirement", "qtr": "quarterly", "quarter": "quarterly", "mgr": "manager",
+    "info": "information", "approx": "approximate", "rpt": "report", "eod": "end day",
+}
+_QUARTER_RE = re.compile(r"^q[1-4]$")
+
+
+def task_features(task: str) -> List[str]:
+    """
+    Hashed-vector features of a task: its canonical words and their character trigrams.
+
+    Abbreviations are expanded and quarter names ("Q3") also count as "quarterly".
+    """
+    words = []
+    for word in canonical_task(task).split():
+        if _QUARTER_RE.match(word):
+            words.extend(("quarterly", word))
+        else:
+            words.extend(_ABBREVIATIONS.get(word, word).split())
+    features = [f"w:{word}" for word in words]
+    for word in words:
+        padded = f" {word} "
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+class SimilarityIndex(Generic[V]):
+    """
+    Find the stored task most similar to a new one, fully offline.
+
+    Each task becomes a signed hashed n-gram vector (see task_features),
+    L2-normalized, in a float32 NumPy matrix; a batch of queries is one
+    matrix product, so lookups stay in the low milliseconds at hundreds of
+    thousands of entries. A match needs cosine similarity of at least
+    threshold, and when both tasks carry specifics (numbers, short labels,
+    names; see dedup.task_specifics) each must mention the other's:
+    "invoice 12" / "invoice 13" and "client A" / "client B" never match,
+    while "Prepare Q3 report" still matches "prep the quarterly report".
+
+    Inserts are incremental: the matrix grows by doubling up to capacity,
+    after which the least recently used entry is overwritten. The matrix
+    product runs outside the lock, so inserts are never held up by a search;
+    the few candidates it finds are scored again under the lock before use.
+    """
+
+    def __init__(self, capacity: int = 50_000, threshold: float = 0.85, dimensions: int = 256):
+        import numpy as np  # Only needed once the cache is enabled
+
+        if dimensions & (dimensions - 1):
+            raise ValueError("dimensions must be a power of two")
+        self._np = np
+        self.capacity = capacity
+        self.threshold = threshold
+        self.dimensions = dimensions
+        self._vectors = np.zeros((min(capacity, 1024), dimensions), dtype=np.float32)
+        self._keys: List[str] = []
+        self._specifics: List[Tuple[FrozenSet[str], FrozenSet[str]]] = []
+        self._values: List[V] = []
+        # Row of every stored key, least recently used first
+        self._rows: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["SimilarityIndex"]:
+        """
+        Index sized by SIMILARITY_CACHE_SIZE with SIMILARITY_THRESHOLD.
+
+        Returns None when the size is 0 or NumPy is not installed.
+        """
+        capacity = int(os.getenv("SIMILARITY_CACHE_SIZE", "50000"))
+        if capacity <= 0:
+            return None
+        try:
+            return cls(capacity=capacity, threshold=float(os.getenv("SIMILARITY_THRESHOLD", "0.85")))
+        except ImportError:
+            logger.warning("NumPy is not installed; the breakdown similarity cache is disabled")
+            return None
+
+    def encode(self, tasks: Sequence[str]):
+        """Unit-length feature vectors of the tasks, one row per task."""
+        np = self._np
+        matrix = np.zeros((len(tasks), self.dimensions), dtype=np.float32)
+        mask = self.dimensions - 1
+        for row, task in enumerate(tasks):
+            vector = matrix[row]
+            for feature in task_features(task):
+                h = zlib.crc32(feature.encode("utf-8"))
+                # The sign bit keeps colliding features from always adding up
+                vector[h & mask] += 1.0 if h & 0x80000000 else -1.0
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector /= norm
+        return matrix
+
+    def add(self, task: str, value: V) -> None:
+        """Store value under task, replacing the least recently used entry when full."""
+        if self.capacity <= 0:
+            return
+        vector = self.encode([task])[0]
+        key = canonical_task(task)
+        specifics = (task_specifics(task), task_words(task))
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                row = self._free_row()
+                self._rows[key] = row
+            else:
+                self._rows.move_to_end(key)
+            self._vectors[row] = vector
+            self._keys[row] = key
+            self._specifics[row] = specifics
+            self._values[row] = value
+
+    def _free_row(self) -> int:
+        """Index of the row for a new entry: appended, grown into, or evicted."""
+        size = len(self._keys)
+        if size < self.capacity:
+            if size == len(self._vectors):
+                self._grow(min(self.capacity, size * 2))
+            self._keys.append("")
+            self._specifics.append((frozenset(), frozenset()))
+            self._values.append(None)
+            return size
+        _, row = self._rows.popitem(last=False)
+        self.evictions += 1
+        return row
+
+    def _grow(self, rows: int) -> None:
+        # A new array, so searches still reading the old one are unaffected
+        vectors = self._np.zeros((rows, self.dimensions), dtype=self._np.float32)
+        vectors[:len(self._vectors)] = self._vectors
+        self._vectors = vectors
+
+    def lookup_many(self, tasks: Sequence[str]) -> List[Optional[Tuple[str, V, float]]]:
+        """
+        Best match for each task in one batched search.
+
+        Returns:
+            Per task, (stored task key, value, similarity) or None
+        """
+        if not tasks:
+            return []
+        np = self._np
+        queries = self.encode(tasks)
+        results: List[Optional[Tuple[str, V, float]]] = [None] * len(tasks)
+        with self._lock:
+            vectors = self._vectors[:len(self._keys)]
+        if len(vectors):
+            # Rows overwritten meanwhile may score stale here; candidates are checked again below
+            scores = vectors @ queries.T
+            # Only the few entries above the threshold are looked at individually
+            above = scores >= self.threshold
+            with self._lock:
+                for column in np.flatnonzero(above.any(axis=0)).tolist():
+                    rows = np.flatnonzero(above[:, column])
+                    specifics = task_specifics(tasks[column])
+                    words = task_words(tasks[column])
+                    # Best first; usually the first candidate is taken
+                    for row in rows[np.argsort(-scores[rows, column], kind="stable")].tolist():
+                        score = float(self._vectors[row] @ queries[column])
+                        if score < self.threshold:
+                            continue
+                        stored_specifics, stored_words = self._specifics[row]
+                        if stored_specifics and specifics and not same_specifics(
+                            stored_specifics, stored_words, specifics, words
+                        ):
+                            continue
+                        self._rows.move_to_end(self._keys[row])
+                        results[column] = (self._keys[row], self._values[row], score)
+                        break
+        found = sum(1 for result in results if result is not None)
+        self.hits += found
+        self.misses += len(tasks) - found
+        SIMILAR_HITS.inc(found)
+        return results
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._keys),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,193 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Mapping, Optional
+from app.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+STORE_HITS = REGISTRY.counter("store_hits_total", "Persistent store lookups that found a live entry")
+STORE_MISSES = REGISTRY.counter("store_misses_total", "Persistent store lookups that found nothing usable")
+STORE_ERRORS = REGISTRY.counter("store_errors_total", "Persistent store operations that failed and were skipped")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+_EXPIRY_INDEX = "CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)"
+
+
+class PersistentStore:
+    """
+    Key-value store in a local SQLite file, shared by every worker process on a host.
+
+    The database runs in WAL mode, so readers never block each other or the
+    writer, and entries survive restarts. Each thread of each process opens
+    its own connection on first use, so a store built at import time holds
+    no connection for forked workers to inherit. Lookups are a primary-key
+    read, well under a millisecond, but still blocking I/O: async code calls
+    the store through asyncio.to_thread.
+
+    Entries expire after their TTL (wall-clock time, so expiry holds across
+    processes and restarts). Every prune_every writes, expired entries are
+    deleted and, if the store is still above max_entries, the entries closest
+    to expiry go first. A failing database never fails a request: errors are
+    logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 100_000,
+        ttl_seconds: float = 86400.0,
+        prune_every: int = 256,
+        busy_timeout: float = 0.1,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.prune_every = max(1, prune_every)
+        self.busy_timeout = busy_timeout
+        self._clock = clock
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["PersistentStore"]:
+        """Store at ANALYSIS_STORE_PATH (sized by ANALYSIS_STORE_MAX_ENTRIES), or None when unset."""
+        path = os.getenv("ANALYSIS_STORE_PATH")
+        if not path:
+            return None
+        return cls(path, max_entries=int(os.getenv("ANALYSIS_STORE_MAX_ENTRIES", "100000")))
+
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use and again in a forked child."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        # Autocommit: every statement is its own short transaction
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        # WAL with synchronous=NORMAL stays consistent and only risks the last writes on power loss
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(_SCHEMA)
+        connection.execute(_EXPIRY_INDEX)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the stored value for key, or None if it is missing, expired or unreadable."""
+        try:
+            row = self._connect().execute(
+                "SELECT value FROM entries WHERE key = ? AND expires_at > ?",
+                (key, self._clock())
+            ).fetchone()
+        except sqlite3.Error:
+            self._record_error("read")
+            return None
+        if row is None:
+            self.misses += 1
+            STORE_MISSES.inc()
+            return None
+        self.hits += 1
+        STORE_HITS.inc()
+        return row[0]
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None) -> None:
+        """Store value under key for ttl_seconds (the store default if not given)."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        try:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, self._clock() + ttl)
+            )
+            self._count_writes(connection, 1)
+        except sqlite3.Error:
+            self._record_error("write")
+
+    def set_many(self, items: Mapping[str, bytes], ttl_seconds: Optional[float] = None) -> None:
+        """Store several values in one transaction, each for ttl_seconds (the store default if not given)."""
+        if not items:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = self._clock() + ttl
+        try:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                    [(key, value, expires_at) for key, value in items.items()]
+                )
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                raise
+            self._count_writes(connection, len(items))
+        except sqlite3.Error:
+            self._record_error("write")
+
+    def _count_writes(self, connection: sqlite3.Connection, count: int) -> None:
+        """Prune once every prune_every written entries."""
+        with self._lock:
+            before = self._writes
+            self._writes += count
+            prune = before // self.prune_every != self._writes // self.prune_every
+        if prune:
+            self._prune(connection)
+
+    def _prune(self, connection: sqlite3.Connection) -> None:
+        """Delete expired entries, then the soonest-expiring ones above max_entries."""
+        connection.execute("DELETE FROM entries WHERE expires_at <= ?", (self._clock(),))
+        (size,) = connection.execute("SELECT COUNT(*) FROM entries").fetchone()
+        if size > self.max_entries:
+            connection.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY expires_at LIMIT ?)",
+                (size - self.max_entries,)
+            )
+
+    def _record_error(self, operation: str) -> None:
+        self.errors += 1
+        STORE_ERRORS.inc()
+        logger.warning("Persistent store %s failed; continuing without it", operation, exc_info=True)
+
+    def clear(self) -> None:
+        """Delete every entry."""
+        self._connect().execute("DELETE FROM entries")
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return this process's hit/miss/error counters and the shared store's size."""
+        try:
+            size = len(self)
+        except sqlite3.Error:
+            size = None
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "size": size,
+            "max_entries": self.max_entries,
+            "path": self.path,
+        }
@@ -0,0 +1,85 @@
+import os
+import re
+
+# Words, numbers and single punctuation marks; most English words are a single token
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+# Output budget per task for the analysis response format
+BREAKDOWN_TOKENS_PER_TASK = 240  # "steps" list with up to 8 steps of ~25 tokens each
+PRIORITY_TOKENS_PER_TASK = 4  # list punctuation around the name in "priorities"
+RESPONSE_OVERHEAD_TOKENS = 60  # braces, keys and next_action
+
+MIN_COMPLETION_TOKENS = 512
+# Enough for a full shard (SHARD_SIZE=20) of tasks needing breakdowns
+MAX_COMPLETION_TOKENS = int(os.getenv("MAX_COMPLETION_TOKENS", "8192"))
+# Name length assumed when sizing how many tasks fit a budget before seeing them
+TYPICAL_TASK_NAME_TOKENS = 8
+
+# Most output tokens each model family can produce in one completion; the
+# longest matching prefix wins, so dated snapshots inherit their family's limit
+MODEL_OUTPUT_LIMITS = {
+    "gpt-3.5-turbo": 4096,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 4096,
+    "gpt-4o": 16384,
+    "gpt-4o-mini": 16384,
+    "gpt-4.1": 32768,
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of BPE tokens in text without a tokenizer dependency.
+
+    A rough count for English text (about one token per short word), good
+    enough for sizing budgets and local accounting.
+    """
+    count = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece.isalpha():
+            count += 1 + len(piece) // 8
+        elif piece.isdigit():
+            count += (len(piece) + 2) // 3
+        else:
+            count += 1
+    return count
+
+
+def completion_cap(model: str) -> int:
+    """MAX_COMPLETION_TOKENS, lowered to what model can produce in one completion if that is less."""
+    matches = [prefix for prefix in MODEL_OUTPUT_LIMITS if model.startswith(prefix)]
+    if not matches:
+        return MAX_COMPLETION_TOKENS
+    return min(MAX_COMPLETION_TOKENS, MODEL_OUTPUT_LIMITS[max(matches, key=len)])
+
+
+def tasks_within(cap: int) -> int:
+    """How many tasks of typical length, all needing breakdowns, fit a completion budget of cap tokens."""
+    per_task = BREAKDOWN_TOKENS_PER_TASK + PRIORITY_TOKENS_PER_TASK + 2 * TYPICAL_TASK_NAME_TOKENS
+    return max(1, (cap - RESPONSE_OVERHEAD_TOKENS) // per_task)
+
+
+def max_completion_tokens(tasks, known_count: int = 0, cap: int = MAX_COMPLETION_TOKENS) -> int:
+    """
+    Size max_tokens for an analysis from the tasks that need an answer.
+
+    Every task name is echoed in "priorities"; tasks without a cached
+    breakdown are echoed again as a "breakdown" key along with their steps.
+
+    Args:
+        tasks: Task strings sent to the model
+        known_count: How many of them already have a cached breakdown
+        cap: Upper bound, completion_cap() of the model in use
+
+    Returns:
+        Completion token budget clamped to [MIN_COMPLETION_TOKENS, cap]
+    """
+    name_tokens = sum(estimate_tokens(task) for task in tasks)
+    new_count = max(0, len(tasks) - known_count)
+    budget = (
+        RESPONSE_OVERHEAD_TOKENS
+        + name_tokens * 2
+        + PRIORITY_TOKENS_PER_TASK * len(tasks)
+        + BREAKDOWN_TOKENS_PER_TASK * new_count
+    )
+    return max(MIN_COMPLETION_TOKENS, min(cap, budget))
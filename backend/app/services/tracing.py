@@ -0,0 +1,293 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional
+from app.services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+TRACES_DROPPED = REGISTRY.counter("traces_dropped_total", "Finished traces dropped because the export queue was full")
+
+SERVICE_NAME = "todo-prioritizer-api"
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("span", default=None)
+_NOOP = nullcontext()
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+
+class Trace:
+    """The spans recorded while handling one request."""
+
+    def __init__(self, name: str):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self.root = Span(name, None, {})
+
+    def finish(self) -> None:
+        if self.root.end_ns is None:
+            self.root.end_ns = time.time_ns()
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing header value: one entry per span name with its total duration.
+
+        Concurrent spans of the same name (e.g. parallel shards) are summed and
+        the number of calls is given in desc.
+        """
+        totals: Dict[str, List[float]] = {}
+        for span in self.spans:
+            if span.end_ns is None:
+                continue
+            entry = totals.setdefault(span.name, [0.0, 0])
+            entry[0] += span.duration_ms
+            entry[1] += 1
+        parts = []
+        for name, (duration, count) in totals.items():
+            desc = f';desc="{count} calls"' if count > 1 else ""
+            parts.append(f"{name};dur={duration:.1f}{desc}")
+        parts.append(f"total;dur={self.root.duration_ms:.1f}")
+        return ", ".join(parts)
+
+    def to_otlp(self) -> Dict:
+        """The trace as an OTLP/HTTP JSON export request."""
+        return _otlp_request(self.otlp_spans())
+
+    def otlp_spans(self) -> List[Dict]:
+        """The root span and every recorded span in OTLP JSON form."""
+        def encode(span: Span, parent_id: Optional[str]) -> Dict:
+            return {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": parent_id or "",
+                "name": span.name,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()
+                ],
+            }
+
+        return [encode(self.root, None)] + [
+            encode(span, span.parent_id or self.root.span_id) for span in self.spans
+        ]
+
+
+def _otlp_request(spans: List[Dict]) -> Dict:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+    }]}
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class _SpanContext:
+    __slots__ = ("trace", "span", "token")
+
+    def __init__(self, trace: Trace, name: str, attributes: Dict):
+        parent = _current_span.get()
+        self.trace = trace
+        self.span = Span(name, parent.span_id if parent else None, attributes)
+
+    def __enter__(self) -> Span:
+        self.trace.spans.append(self.span)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.span.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.span.attributes["error"] = exc_type.__name__
+        _current_span.reset(self.token)
+
+
+def span(name: str, **attributes):
+    """
+    Time the block as a span of the current trace.
+
+    Outside a trace this is a shared no-op context manager, so instrumented
+    code costs one context-variable lookup when tracing is not in use.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP
+    return _SpanContext(trace, name, attributes)
+
+
+@contextmanager
+def start_trace(name: str) -> Iterator[Trace]:
+    """Record the spans of everything called inside the block, including tasks it spawns."""
+    trace = Trace(name)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+class JsonlFileExporter:
+    """Append each trace as one OTLP JSON line to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, traces: List[Trace]) -> None:
+        lines = "".join(json.dumps(trace.to_otlp(), separators=(",", ":")) + "\n" for trace in traces)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class OTLPHttpExporter:
+    """POST traces to an OTLP/HTTP JSON endpoint (e.g. http://collector:4318/v1/traces), one request per batch."""
+
+    def __init__(self, endpoint: str, timeout: float = 2.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, traces: List[Trace]) -> None:
+        import httpx
+        spans = [encoded for trace in traces for encoded in trace.otlp_spans()]
+        httpx.post(self.endpoint, json=_otlp_request(spans), timeout=self.timeout)
+
+
+_CLOSE = object()
+
+
+class BatchExporter:
+    """
+    Export finished traces in batches from one dedicated thread, like OpenTelemetry's BatchSpanProcessor.
+
+    submit() only puts the trace on a bounded queue, so a request never waits
+    for the exporter and a slow or unreachable collector never occupies the
+    default thread pool that the store and the similarity index run on. The
+    thread sends what has queued up every delay_seconds, or as soon as
+    max_batch traces are waiting. When the queue is full, new traces are
+    dropped and counted in traces_dropped_total.
+
+    The thread starts on the first submit(), so a pre-forked worker starts
+    its own rather than inheriting a dead copy of the master's.
+    """
+
+    def __init__(self, exporter, max_queue: int = 2048, max_batch: int = 512, delay_seconds: float = 1.0):
+        self.exporter = exporter
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.delay_seconds = delay_seconds
+        self.dropped = 0
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def submit(self, trace: Trace) -> None:
+        """Queue a finished trace for export, or drop it if the queue is full."""
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+            TRACES_DROPPED.inc()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Export what is queued and stop the thread, waiting at most timeout seconds."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        try:
+            self._queue.put(_CLOSE, timeout=timeout)
+        except queue.Full:
+            logger.warning("Trace export queue still full at shutdown; %d traces not exported", self._queue.qsize())
+            return
+        self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.max_queue)
+            self._thread = threading.Thread(target=self._run, args=(self._queue,), name="trace-exporter", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self, pending: queue.Queue) -> None:
+        closing = False
+        while not closing:
+            batch = []
+            item = pending.get()
+            deadline = time.monotonic() + self.delay_seconds
+            while True:
+                if item is _CLOSE:
+                    closing = True
+                    break
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.max_batch or remaining <= 0:
+                    break
+                try:
+                    item = pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.exporter.export(batch)
+                except Exception:
+                    logger.warning("Export of %d traces failed", len(batch), exc_info=True)
+
+
+def exporter_from_env() -> Optional[BatchExporter]:
+    """
+    Batch exporter for TRACE_EXPORT_PATH or TRACE_OTLP_ENDPOINT, or None.
+
+    TRACE_EXPORT_QUEUE (default 2048) bounds the traces waiting for export.
+    """
+    endpoint = os.getenv("TRACE_OTLP_ENDPOINT")
+    path = os.getenv("TRACE_EXPORT_PATH")
+    if endpoint:
+        exporter = OTLPHttpExporter(endpoint)
+    elif path:
+        exporter = JsonlFileExporter(path)
+    else:
+        return None
+    return BatchExporter(exporter, max_queue=int(os.getenv("TRACE_EXPORT_QUEUE", "2048")))
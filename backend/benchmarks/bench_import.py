@@ -0,0 +1,65 @@
+"""
+Cold-start cost: how long a fresh interpreter takes to import the app.
+
+Reports the median time to import app.main, and to run app.serve.preload()
+(what the pre-fork master pays once for all workers), followed by the
+slowest imports as reported by python -X importtime.
+
+Run from backend/:
+
+    python -m benchmarks.bench_import
+"""
+import statistics
+import subprocess
+import sys
+from typing import List, Tuple
+
+RUNS = 5
+TOP = 15
+
+TIMED = """
+import time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+
+def timed_import(statement: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", TIMED.format(statement=statement)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int = TOP) -> List[Tuple[int, str]]:
+    """(cumulative microseconds, module) of the slowest imports, outermost first."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> None:
+    for label, statement in (
+        ("import app.main", "import app.main"),
+        ("app.serve.preload()", "import app.serve; app.serve.preload()"),
+    ):
+        samples = [timed_import(statement) for _ in range(RUNS)]
+        print(f"{label:<22} median {statistics.median(samples) * 1000:7.0f} ms "
+              f"(min {min(samples) * 1000:.0f}, max {max(samples) * 1000:.0f})")
+    print("\nslowest imports under app.main (cumulative):")
+    for cumulative, name in slowest_imports("app.main"):
+        print(f"{cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
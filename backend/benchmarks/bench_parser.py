@@ -0,0 +1,107 @@
+"""
+Throughput benchmark for parse_tasks and the streaming iter_tasks parser.
+
+Run from backend/:
+
+    python -m benchmarks.bench_parser
+"""
+import io
+import re
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List
+
+from app.services.parser import iter_tasks, parse_tasks
+
+
+def legacy_parse_tasks(input_text: str) -> List[str]:
+    """parse_tasks as it was before the precompiled rewrite, kept as the baseline."""
+    if not input_text or not input_text.strip():
+        return []
+    lines = input_text.strip().split('\n')
+    tasks = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        line = re.sub(r'^[\s]*[-*•]\s+', '', line)
+        line = re.sub(r'^[\s]*\d+[.)]\s+', '', line)
+        line = re.sub(r'^[\s]*\([a-zA-Z0-9]+\)\s+', '', line)
+        line = line.strip()
+        if line:
+            tasks.append(line)
+    if len(tasks) == 1 and ',' in tasks[0]:
+        comma_tasks = [t.strip() for t in tasks[0].split(',') if t.strip()]
+        if len(comma_tasks) > 1:
+            tasks = comma_tasks
+    seen = set()
+    unique_tasks = []
+    for task in tasks:
+        task_lower = task.lower()
+        if task_lower not in seen:
+            seen.add(task_lower)
+            unique_tasks.append(task)
+    return unique_tasks
+
+
+def make_input(lines: int, distinct: int = 0) -> str:
+    styles = ["- Email client {i} about the invoice", "{i}. Call dentist for appointment {i}",
+              "* (a) Write report section {i} by Friday", "Buy groceries batch {i}"]
+    return "\n".join(styles[i % len(styles)].format(i=i % distinct if distinct else i)
+                     for i in range(lines))
+
+
+def throughput(fn: Callable[[str], object], text: str, min_seconds: float = 0.5) -> float:
+    """Megabytes of input parsed per second."""
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        fn(text)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return len(text.encode()) * runs / elapsed / 1e6
+
+
+def peak_memory(fn: Callable[[], object]) -> int:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    for lines in (20, 1_000, 50_000):
+        text = make_input(lines)
+        assert parse_tasks(text) == legacy_parse_tasks(text) == list(iter_tasks(text))
+        legacy = throughput(legacy_parse_tasks, text)
+        current = throughput(parse_tasks, text)
+        streaming = throughput(lambda t: sum(1 for _ in iter_tasks(io.StringIO(t))), text)
+        print(f"{lines:>6} lines ({len(text) / 1e6:.2f} MB): legacy {legacy:6.1f} MB/s | "
+              f"parse_tasks {current:6.1f} MB/s ({current / legacy:.2f}x) | iter_tasks {streaming:6.1f} MB/s")
+
+    # Memory: streaming keeps one chunk plus the dedup set, so a repetitive
+    # bulk import stays small however long it is
+    text = make_input(200_000, distinct=1_000)
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+
+        def read_whole():
+            with open(f.name, encoding="utf-8") as source:
+                return len(parse_tasks(source.read()))
+
+        def read_streamed():
+            with open(f.name, encoding="utf-8") as source:
+                return sum(1 for _ in iter_tasks(source))
+
+        whole = peak_memory(read_whole)
+        streamed = peak_memory(read_streamed)
+    print(f"peak memory for {len(text) / 1e6:.1f} MB: parse_tasks {whole / 1e6:.1f} MB, "
+          f"iter_tasks {streamed / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
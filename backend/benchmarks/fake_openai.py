@@ -0,0 +1,192 @@
+"""
+Local stand-in for the OpenAI chat completions API, for load tests.
+
+It answers POST /v1/chat/completions with a valid task analysis for the
+tasks listed in the prompt, after a configurable time-to-first-token and at
+a configurable token rate, and can inject errors. Streaming requests get
+real SSE chunks, including the final usage chunk.
+
+Run from backend/:
+
+    python -m benchmarks.fake_openai --port 9100 --latency lognormal:0.8,0.5 \\
+        --tokens-per-second 300 --error-rate 0.02
+
+then point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:9100/v1.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_TASK_LINE_RE = re.compile(r"^\d+\.\s+(.*?)(?:\s+\[[^\]]*\])?$")
+_TOKEN_RE = re.compile(r"\s*\S{1,4}")
+
+
+@dataclass
+class FakeConfig:
+    latency: str = "fixed:0.5"
+    tokens_per_second: float = 200.0
+    error_rate: float = 0.0
+    error_status: int = 500
+
+    def time_to_first_token(self) -> float:
+        """Sample a delay from "fixed:S", "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA"."""
+        kind, _, params = self.latency.partition(":")
+        values = [float(v) for v in params.split(",") if v]
+        if kind == "fixed":
+            return values[0]
+        if kind == "uniform":
+            return random.uniform(values[0], values[1])
+        if kind == "lognormal":
+            median, sigma = values
+            return median * random.lognormvariate(0, sigma)
+        raise ValueError(f"Unknown latency distribution: {self.latency}")
+
+
+def tasks_from_messages(messages: List[Dict]) -> List[str]:
+    """Task names from the "TASKS:" block of the last user message."""
+    prompt = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    tasks = []
+    in_tasks = False
+    for line in prompt.splitlines():
+        if line.startswith("TASKS:"):
+            in_tasks = True
+            continue
+        if in_tasks:
+            match = _TASK_LINE_RE.match(line.strip())
+            if not match:
+                break
+            tasks.append(match.group(1))
+    return tasks
+
+
+def analysis_content(tasks: List[str]) -> str:
+    """A valid analysis JSON, next_action first, in the shape the prompt asks for."""
+    buckets = {"must": [], "should": [], "optional": []}
+    for i, task in enumerate(tasks):
+        buckets[("must", "should", "optional")[i % 3]].append(task)
+    breakdown = {
+        task: {"steps": [
+            {"step": f"Open what you need for {task}", "minutes": 2},
+            {"step": f"Do the main part of {task}", "minutes": 15},
+            {"step": f"Review and finish {task}", "minutes": 5},
+        ]}
+        for task in tasks
+    }
+    first = tasks[0] if tasks else ""
+    return json.dumps({
+        "next_action": {"task": first, "step": f"Open what you need for {first}", "minutes": 2},
+        "priorities": buckets,
+        "breakdown": breakdown,
+    })
+
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.get("/v1/models")
+    async def models():
+        # Called by the backend's startup warm-up to open its connection
+        return {"object": "list", "data": [{"id": "fake-model", "object": "model", "created": 0, "owned_by": "fake"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if random.random() < config.error_rate:
+            await asyncio.sleep(config.time_to_first_token() / 4)
+            return JSONResponse(
+                status_code=config.error_status,
+                content={"error": {"message": "Injected failure", "type": "server_error", "code": None}},
+            )
+
+        content = analysis_content(tasks_from_messages(body.get("messages", [])))
+        tokens = _TOKEN_RE.findall(content)
+        prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = body.get("model", "fake-model")
+        ttft = config.time_to_first_token()
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + len(tokens) / config.tokens_per_second)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta: Dict, finish_reason=None, chunk_usage=None, choices=True) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if choices else [],
+            }
+            if chunk_usage is not None:
+                payload["usage"] = chunk_usage
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            await asyncio.sleep(ttft)
+            yield chunk({"role": "assistant", "content": ""})
+            # Tokens go out in small batches so the sleep granularity stays realistic
+            batch = max(1, int(config.tokens_per_second / 50))
+            for start in range(0, len(tokens), batch):
+                yield chunk({"content": "".join(tokens[start:start + batch])})
+                await asyncio.sleep(batch / config.tokens_per_second)
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                yield chunk({}, chunk_usage=usage, choices=False)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="fixed:0.5",
+                        help='time to first token: "fixed:S", "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA"')
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="status code of injected failures")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = FakeConfig(args.latency, args.tokens_per_second, args.error_rate, args.error_status)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
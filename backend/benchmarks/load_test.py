@@ -0,0 +1,214 @@
+"""
+Load test: how many concurrent analyses one backend instance sustains.
+
+Starts the fake OpenAI server and a backend pointed at it, then drives
+/api/analyze at each concurrency level with unique task lists (so no cache
+or near-duplicate collapsing helps) and reports throughput, latency
+percentiles, errors and event-loop lag. Loop lag is measured by probing
+/health every 50 ms during each level: that route does no work, so its
+latency is the time the request waited for the backend's event loop.
+
+Run from backend/:
+
+    python -m benchmarks.load_test --concurrency 1,8,32,64 --duration 10 \\
+        --latency lognormal:0.8,0.5 --tokens-per-second 300
+
+Pass --target URL to load an already running backend instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+PROBE_INTERVAL = 0.05
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def make_tasks(request_number: int, tasks_per_request: int) -> str:
+    """A task list no earlier request has sent."""
+    verbs = ["Write report", "Call client", "Pay invoice", "Review pull request", "Book flight", "Plan sprint"]
+    return "\n".join(
+        f"{verbs[i % len(verbs)]} {request_number}-{i}" for i in range(tasks_per_request)
+    )
+
+
+def start_process(args: List[str], env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args],
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+
+
+def wait_until_healthy(url: str, process: subprocess.Popen, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited early:\n{process.stderr.read().decode(errors='replace')}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not become healthy within {timeout:.0f}s")
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    concurrency: int,
+    duration: float,
+    tasks_per_request: int,
+    counter: List[int],
+) -> Dict[str, float]:
+    """Keep concurrency requests in flight for duration seconds."""
+    latencies: List[float] = []
+    probes: List[float] = []
+    errors: Dict[str, int] = {}
+    degraded = 0
+    stop_at = time.monotonic() + duration
+
+    async def worker():
+        nonlocal degraded
+        while time.monotonic() < stop_at:
+            counter[0] += 1
+            body = {"tasks": make_tasks(counter[0], tasks_per_request)}
+            start = time.perf_counter()
+            try:
+                response = await client.post("/api/analyze", json=body)
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            if response.status_code != 200:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.json().get("degraded"):
+                degraded += 1
+
+    async def prober():
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                await client.get("/health")
+                probes.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(PROBE_INTERVAL)
+
+    started = time.perf_counter()
+    await asyncio.gather(prober(), *(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p90_ms": percentile(latencies, 0.90) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": sum(errors.values()),
+        "error_breakdown": errors,
+        "degraded": degraded,
+        "loop_lag_p50_ms": percentile(probes, 0.50) * 1000,
+        "loop_lag_p99_ms": percentile(probes, 0.99) * 1000,
+    }
+
+
+async def run(target: str, levels: List[int], duration: float, tasks_per_request: int) -> List[Dict]:
+    limits = httpx.Limits(max_connections=max(levels) + 8, max_keepalive_connections=max(levels) + 8)
+    results = []
+    counter = [0]
+    async with httpx.AsyncClient(base_url=target, limits=limits, timeout=120.0) as client:
+        for concurrency in levels:
+            result = await run_level(client, concurrency, duration, tasks_per_request, counter)
+            results.append(result)
+            print(
+                f"{concurrency:>6} {result['requests']:>8} {result['throughput_rps']:>9.1f} "
+                f"{result['p50_ms']:>8.0f} {result['p90_ms']:>8.0f} {result['p99_ms']:>8.0f} "
+                f"{result['errors']:>7} {result['degraded']:>8} "
+                f"{result['loop_lag_p50_ms']:>7.1f} {result['loop_lag_p99_ms']:>7.1f}",
+                flush=True,
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--tasks", type=int, default=8, help="tasks per request")
+    parser.add_argument("--target", help="URL of a running backend; otherwise one is started")
+    parser.add_argument("--backend-port", type=int, default=8100)
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--latency", default="lognormal:0.8,0.5", help="fake model time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=300.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--max-in-flight", type=int, default=256, help="ADMISSION_MAX_IN_FLIGHT of the backend")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    processes: List[subprocess.Popen] = []
+    try:
+        target = args.target
+        if target is None:
+            fake_url = f"http://127.0.0.1:{args.fake_port}"
+            fake = start_process([
+                "-m", "benchmarks.fake_openai", "--port", str(args.fake_port),
+                "--latency", args.latency, "--tokens-per-second", str(args.tokens_per_second),
+                "--error-rate", str(args.error_rate), "--error-status", str(args.error_status),
+            ])
+            processes.append(fake)
+            wait_until_healthy(fake_url, fake)
+
+            target = f"http://127.0.0.1:{args.backend_port}"
+            backend = start_process(
+                ["-m", "uvicorn", "app.main:app", "--port", str(args.backend_port), "--log-level", "warning"],
+                env={
+                    "OPENAI_API_KEY": "fake",
+                    "OPENAI_BASE_URL": f"{fake_url}/v1",
+                    "PRIORITIZER_MODE": "llm",
+                    "ANALYSIS_CACHE_SIZE": "0",
+                    "BREAKDOWN_CACHE_SIZE": "0",
+                    "CLIENT_RATE_PER_SECOND": "1000000",
+                    "CLIENT_BURST": "1000000",
+                    "ADMISSION_MAX_IN_FLIGHT": str(args.max_in_flight),
+                    "ADMISSION_MAX_QUEUE": str(max(levels)),
+                },
+            )
+            processes.append(backend)
+            wait_until_healthy(target, backend)
+
+        print(f"Load test against {target}: {args.tasks} tasks/request, {args.duration:.0f}s per level")
+        print(f"{'conc':>6} {'requests':>8} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+              f"{'errors':>7} {'degraded':>8} {'lag p50':>7} {'lag p99':>7}")
+        results = asyncio.run(run(target, levels, args.duration, args.tasks))
+        if args.json_path:
+            with open(args.json_path, "w", encoding="utf-8") as f:
+                json.dump({"config": vars(args), "results": results}, f, indent=2)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
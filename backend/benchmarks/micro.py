@@ -0,0 +1,288 @@
+"""
+Micro-benchmarks for the CPU-bound hot paths of one analysis, with a regression gate.
+
+Covers parse_tasks, parse_task_records, AIService._create_analysis_prompt, AIService._parse_ai_response
+and the route's response serialization (next to the response_model path it
+replaced) at 1 to 500 tasks, plus long lines and comma-only input.
+
+Timings depend on the machine, so every result is stored relative to a
+fixed pure-Python calibration workload; a baseline recorded on a laptop can
+then gate a CI runner, within reason. Each repeat times the calibration
+workload right before the case, so a machine that speeds up or slows down
+during the run shifts both alike. A case is judged by the median of its
+repeats, and its threshold widens with the spread measured for it here and
+in the baseline. Cases over the threshold are measured again before --check
+fails, so one noisy burst does not fail the gate.
+
+Run from backend/:
+
+    python -m benchmarks.micro                  # compare against the baseline
+    python -m benchmarks.micro --check          # exit 1 if a case regressed
+    python -m benchmarks.micro --update         # record a new baseline
+    python -m benchmarks.micro -k serialize     # only cases whose name contains "serialize"
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_THRESHOLD = 0.4
+# A case may also slow down by this many times its interquartile spread (this run's plus the baseline's)
+NOISE_FACTOR = 2.0
+# ...but never more than this, or a single noisy baseline run would switch a case's gate off
+MAX_THRESHOLD = 0.75
+TASK_COUNTS = (1, 10, 50, 500)
+# Entries in the similarity index searched by the similarity_lookup case
+SIMILARITY_ENTRIES = 20_000
+MIN_RUN_SECONDS = 0.025
+REPEATS = 11
+
+Case = Tuple[str, Callable[[], object]]
+
+
+class Measurement(NamedTuple):
+    seconds: float  # median seconds per call
+    relative: float  # median of each repeat's time over the calibration time measured just before it
+    spread: float  # interquartile range of the relative times, as a fraction of their median
+
+
+def time_batch(fn: Callable[[], object], number: int) -> float:
+    """
+    Seconds per call over number back-to-back calls.
+
+    The garbage collector is off while timing, as in timeit: a collection
+    walks every object alive, including the 20000-entry similarity index,
+    and would land on whichever case happens to be running.
+    """
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        return (time.perf_counter() - start) / number
+    finally:
+        gc.enable()
+
+
+def calls_per_batch(fn: Callable[[], object]) -> int:
+    """Calls needed for one timed batch to last at least MIN_RUN_SECONDS."""
+    number = 1
+    while time_batch(fn, number) * number < MIN_RUN_SECONDS:
+        number *= 2
+    return number
+
+
+def measure(fn: Callable[[], object], calibration_calls: int) -> Measurement:
+    """Time REPEATS batches of fn, each right after a batch of the calibration workload."""
+    number = calls_per_batch(fn)
+    seconds, relative = [], []
+    for _ in range(REPEATS):
+        unit = time_batch(calibration_workload, calibration_calls)
+        took = time_batch(fn, number)
+        seconds.append(took)
+        relative.append(took / unit)
+    q1, median, q3 = statistics.quantiles(relative, n=4)
+    return Measurement(statistics.median(seconds), median, (q3 - q1) / median)
+
+
+def calibration_workload() -> None:
+    """Fixed mix of the operations the hot paths are made of: string handling, dicts, sorting."""
+    words = [f"task {i} due friday" for i in range(200)]
+    index = {}
+    for word in words:
+        index[word.lower()] = word.split()
+    sorted(index, key=len)
+    json.dumps(index)
+
+
+def response_model_body(app, response) -> bytes:
+    """
+    Response body bytes as FastAPI builds them from /api/analyze's response_model.
+
+    The route now renders its own body; this is the path it replaced, kept
+    as the reference for the serialize cases.
+
+    serialize_response never suspends for an async route, so the coroutine
+    is driven by hand instead of through an event loop.
+    """
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+
+    route = next(r for r in app.routes if getattr(r, "path", None) == "/api/analyze")
+    coroutine = serialize_response(field=route.secure_cloned_response_field, response_content=response)
+    try:
+        coroutine.send(None)
+    except StopIteration as done:
+        return JSONResponse(done.value).body
+    raise RuntimeError("serialize_response suspended")
+
+
+def task_names(count: int, length: int = 0) -> List[str]:
+    verbs = ["Write report", "Call client", "Pay invoice", "Review pull request", "Book flight", "Plan sprint"]
+    names = [f"{verbs[i % len(verbs)]} {i} by Friday" for i in range(count)]
+    if length:
+        names = [(name + " " + "with all the details we discussed " * 20)[:length] for name in names]
+    return names
+
+
+def build_cases() -> List[Case]:
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    from app.main import app
+    from app.services.ai_service import AIService
+    from app.services.parser import extract_task_details, parse_task_records, parse_tasks
+    from app.services.serialization import render_analysis
+    from app.services.similarity import SimilarityIndex
+    from benchmarks.fake_openai import analysis_content
+
+    service = AIService()
+    cases: List[Case] = []
+
+    for count in TASK_COUNTS:
+        text = "\n".join(f"- {name}" for name in task_names(count))
+        cases.append((f"parse_tasks[{count}]", lambda text=text: parse_tasks(text)))
+    long_text = "\n".join(task_names(50, length=400))
+    cases.append(("parse_tasks[50 long lines]", lambda: parse_tasks(long_text)))
+    comma_text = ", ".join(task_names(50))
+    cases.append(("parse_tasks[50 comma-only]", lambda: parse_tasks(comma_text)))
+
+    def parse_records_cold(text: str) -> None:
+        # The routes parse with parse_task_records; measured without the memoized
+        # extraction, as for a list never seen before
+        extract_task_details.cache_clear()
+        parse_task_records(text)
+
+    for count in TASK_COUNTS:
+        text = "\n".join(f"- {name}" for name in task_names(count))
+        cases.append((f"parse_task_records[{count}]", lambda text=text: parse_records_cold(text)))
+
+    for count in TASK_COUNTS:
+        tasks = task_names(count)
+        cases.append((f"create_prompt[{count}]", lambda tasks=tasks: service._create_analysis_prompt(tasks)))
+
+    for count in TASK_COUNTS:
+        tasks = task_names(count)
+        result = json.loads(analysis_content(tasks))
+        cases.append((
+            f"parse_response[{count}]",
+            lambda result=result, tasks=tasks: service._parse_ai_response(result, tasks),
+        ))
+
+    for count in TASK_COUNTS:
+        tasks = task_names(count)
+        response = service._parse_ai_response(json.loads(analysis_content(tasks)), tasks)
+        cases.append((f"serialize[{count}]", lambda response=response: render_analysis(response)))
+        cases.append((
+            f"serialize_response_model[{count}]",
+            lambda response=response: response_model_body(app, response),
+        ))
+
+    index = SimilarityIndex(capacity=SIMILARITY_ENTRIES)
+    for name in task_names(SIMILARITY_ENTRIES):
+        index.add(name, None)
+    queries = [name.replace("by Friday", "before Friday") for name in task_names(10)]
+    cases.append((f"similarity_lookup[10 of {SIMILARITY_ENTRIES}]", lambda: index.lookup_many(queries)))
+
+    return cases
+
+
+def run(cases: List[Case]) -> Tuple[float, Dict[str, Measurement]]:
+    """Median calibration time, in seconds per call, and the measurement of every case."""
+    calibration_calls = calls_per_batch(calibration_workload)
+    calibration = statistics.median(
+        time_batch(calibration_workload, calibration_calls) for _ in range(REPEATS)
+    )
+    return calibration, {name: measure(fn, calibration_calls) for name, fn in cases}
+
+
+def load_baseline(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(
+    results: Dict[str, Measurement],
+    baseline: Dict,
+    threshold: float,
+) -> List[str]:
+    """Print one line per case and return the names of the cases that regressed."""
+    base_calibration = baseline.get("calibration_seconds")
+    base_results = baseline.get("results", {})
+    base_spread = baseline.get("spread", {})
+    regressions = []
+    print(f"{'case':<32} {'time':>11} {'baseline':>11} {'change':>8} {'allowed':>8}")
+    for name, measured in results.items():
+        line = f"{name:<32} {measured.seconds * 1e6:>9.1f}us"
+        if name in base_results and base_calibration:
+            base_relative = base_results[name] / base_calibration
+            change = measured.relative / base_relative - 1
+            # The baseline at the speed this case's repeats saw, for display
+            expected = base_relative * measured.seconds / measured.relative
+            noise = NOISE_FACTOR * (measured.spread + base_spread.get(name, 0.0))
+            allowed = max(threshold, min(MAX_THRESHOLD, noise))
+            flag = ""
+            if change > allowed:
+                regressions.append(name)
+                flag = "  REGRESSED"
+            line += f" {expected * 1e6:>9.1f}us {change:>+7.0%} {allowed:>+7.0%}{flag}"
+        print(line)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="keyword", default="", help="only run cases whose name contains this")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown always allowed before --check fails (0.4 = 40%%), widened for noisy cases")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any case regressed")
+    parser.add_argument("--update", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    cases = [(name, fn) for name, fn in build_cases() if args.keyword in name]
+    calibration, results = run(cases)
+    baseline = load_baseline(args.baseline)
+    print(f"calibration {calibration * 1e6:.1f}us (baseline "
+          f"{baseline.get('calibration_seconds', 0) * 1e6:.1f}us)")
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.update:
+        # Cases not run this time keep their previous baseline, rescaled to this run's calibration
+        merged = {}
+        spread = dict(baseline.get("spread", {}))
+        base_calibration = baseline.get("calibration_seconds")
+        for name, seconds in baseline.get("results", {}).items():
+            if base_calibration:
+                merged[name] = seconds * calibration / base_calibration
+        for name, measured in results.items():
+            merged[name] = measured.relative * calibration
+            spread[name] = measured.spread
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "calibration_seconds": calibration,
+                "results": merged,
+                "spread": spread,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return
+
+    if args.check and regressions:
+        print(f"measuring {len(regressions)} case(s) again")
+        _, results = run([(name, fn) for name, fn in cases if name in regressions])
+        regressions = compare(results, baseline, args.threshold)
+    if args.check and regressions:
+        print(f"{len(regressions)} case(s) regressed by more than allowed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,21 @@ from app.main import app
 os.environ["OPENAI_API_KEY"] = "test-key"
 os.environ["FRONTEND_URL"] = "http://localhost:3000"
 
+class FakeClock:
+    """Clock callable that only moves when a test advances now."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        # Far from zero, like a real time.time() or time.monotonic() reading
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock():
+    """A FakeClock to pass as the clock of caches, stores, queues, limiters and breakers."""
+    return FakeClock()
+
 @pytest.fixture
 def client():
     """Create a test client for the FastAPI app."""
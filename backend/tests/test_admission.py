@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from app.services.admission import AdmissionController, AdmissionRejected, TokenBucket
+
+
+class TestTokenBucket:
+    """Test suite for the token bucket."""
+
+    def test_burst_then_refill(self):
+        """Test that a full bucket allows a burst and then refills at the rate."""
+        bucket = TokenBucket(rate=2.0, capacity=3, now=0.0)
+        assert [bucket.take(0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert bucket.take(0.0) == pytest.approx(0.5)
+        assert bucket.take(0.5) == 0.0
+
+    def test_oversized_request_is_paid_in_full(self):
+        """Test that an oversized request needs only a full bucket but leaves it in debt for its whole cost."""
+        bucket = TokenBucket(rate=1.0, capacity=5, now=0.0)
+        assert bucket.take(0.0, cost=50) == 0.0
+        assert bucket.take(0.0) == pytest.approx(46.0)
+        assert bucket.take(45.0, cost=50) == pytest.approx(5.0)
+        assert bucket.take(46.0) == 0.0
+
+
+class TestAdmissionController:
+    """Test suite for admission control."""
+
+    def test_client_rate_limit(self, clock):
+        """Test that clients are limited independently with a Retry-After estimate."""
+        controller = AdmissionController(client_rate=0.5, client_burst=2, clock=clock)
+        controller.check_client("a")
+        controller.check_client("a")
+        with pytest.raises(AdmissionRejected) as exc_info:
+            controller.check_client("a")
+        assert exc_info.value.status_code == 429
+        assert exc_info.value.retry_after_header == "2"
+        controller.check_client("b")
+        clock.now += 2.0
+        controller.check_client("a")
+
+    def test_client_table_is_bounded(self):
+        """Test that the least recently seen clients are forgotten."""
+        controller = AdmissionController(max_clients=2)
+        for client in ("a", "b", "c"):
+            controller.check_client(client)
+        assert controller.stats()["clients"] == 2
+
+    async def test_queue_full_is_rejected(self):
+        """Test that requests beyond the in-flight limit and queue are shed with 503."""
+        controller = AdmissionController(max_in_flight=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.slot():
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        waiter = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        assert controller.stats()["in_flight"] == 1
+        assert controller.stats()["waiting"] == 1
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire()
+        assert exc_info.value.status_code == 503
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        assert controller.stats()["in_flight"] == 0
+
+    async def test_queue_timeout(self):
+        """Test that a waiter gives up with 503 after the queue timeout."""
+        controller = AdmissionController(max_in_flight=1, queue_timeout=0.01)
+        await controller.acquire()
+        with pytest.raises(AdmissionRejected, match="Timed out"):
+            await controller.acquire()
+        assert controller.stats()["waiting"] == 0
+        controller.release()
+
+    async def test_background_work_waits_for_its_share(self):
+        """Test that background work is never shed but holds at most its share of the slots."""
+        controller = AdmissionController(max_in_flight=2, max_queue=0, queue_timeout=0.01)
+        await controller.acquire(background=True)
+        waiter = asyncio.ensure_future(controller.acquire(background=True))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        # The other slot is still free for a request
+        await controller.acquire()
+        assert controller.stats()["background_in_flight"] == 1
+
+        controller.release(background=True)
+        await waiter
+        assert controller.stats()["background_in_flight"] == 1
+        controller.release(background=True)
+        controller.release()
+        assert controller.stats()["in_flight"] == 0
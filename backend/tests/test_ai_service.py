@@ -1,8 +1,24 @@
+import asyncio
+import httpx
+import threading
+import openai
 import pytest
 import json
-from unittest.mock import Mock, patch, MagicMock
-from app.services.ai_service import AIService
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
+from app.services.ai_service import (
+    AIService,
+    CACHED_PROMPT_TOKENS,
+    FALLBACK_BREAKDOWNS,
+    PROMPT_TOKENS,
+    SALVAGED_RESPONSES,
+    SALVAGE_RECOVERED_BREAKDOWNS,
+    SYSTEM_PROMPT,
+)
 from app.models.schemas import TaskAnalysisResponse
+from app.services.admission import AdmissionController, admission_scope
+from app.services.prioritizer import RoutingPolicy
+from app.services.resilience import CircuitBreaker, DeadlineExceeded, RetryPolicy, deadline_scope
+from app.services.store import PersistentStore
 
 
 class TestAIService:
@@ -11,9 +27,10 @@ class TestAIService:
     @pytest.fixture
     def ai_service(self):
         """Create AI service instance with mocked OpenAI client."""
-        with patch.dict("os.environ", {"OPENAI_API_KEY": "test-key"}):
+        with patch.dict("os.environ", {"OPENAI_API_KEY": "test-key", "PRIORITIZER_MODE": "llm"}):
             service = AIService()
             service.client = Mock()
+            service.async_client = Mock()
             return service
     
     def test_init_missing_api_key(self):
@@ -70,6 +87,592 @@ class TestAIService:
         assert result.next_action.step == "Open document"
         assert result.next_action.minutes == 2
     
+    @pytest.mark.asyncio
+    async def test_analyze_tasks_async_empty_list(self, ai_service):
+        """Test that the async path rejects an empty task list."""
+        with pytest.raises(ValueError, match="cannot be empty"):
+            await ai_service.analyze_tasks_async([])
+    
+    @pytest.mark.asyncio
+    async def test_analyze_tasks_async_success(self, ai_service):
+        """Test that the async path awaits AsyncOpenAI and builds the response."""
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = json.dumps({
+            "priorities": {"must": ["Task 1"], "should": [], "optional": []},
+            "breakdown": {
+                "Task 1": {
+                    "steps": [
+                        {"step": "Open document", "minutes": 2},
+                        {"step": "Write content", "minutes": 10}
+                    ]
+                }
+            },
+            "next_action": {"task": "Task 1", "step": "Open document", "minutes": 2}
+        })
+        ai_service.async_client.chat.completions.create = AsyncMock(return_value=mock_response)
+        
+        result = await ai_service.analyze_tasks_async(["Task 1"])
+        
+        assert isinstance(result, TaskAnalysisResponse)
+        assert result.next_action.step == "Open document"
+        ai_service.async_client.chat.completions.create.assert_awaited_once()
+        ai_service.client.chat.completions.create.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_analyze_tasks_async_retries_connection_errors(self, ai_service):
+        """Test that a transient connection error is retried within the deadline."""
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = json.dumps({
+            "priorities": {"must": ["Task 1"], "should": [], "optional": []},
+            "breakdown": {"Task 1": {"steps": [{"step": "Open document", "minutes": 2}]}},
+            "next_action": {"task": "Task 1", "step": "Open document", "minutes": 2}
+        })
+        error = openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com"))
+        ai_service.async_client.chat.completions.create = AsyncMock(side_effect=[error, mock_response])
+        ai_service.retry_policy = RetryPolicy(base_delay=0.001)
+        
+        result = await ai_service.analyze_tasks_async(["Task 1"])
+        
+        assert result.next_action.task == "Task 1"
+        assert ai_service.async_client.chat.completions.create.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_analyze_tasks_async_coalesces_identical_requests(self, ai_service):
+        """Test that identical concurrent requests share one OpenAI call."""
+        release = asyncio.Event()
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = json.dumps({
+            "priorities": {"must": ["Task 1"], "should": [], "optional": []},
+            "breakdown": {},
+            "next_action": {}
+        })
+        
+        async def slow_create(**kwargs):
+            await release.wait()
+            return mock_response
+        
+        ai_service.async_client.chat.completions.create = AsyncMock(side_effect=slow_create)
+        
+        waiters = [asyncio.ensure_future(ai_service.analyze_tasks_async(["Task 1"])) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        
+        assert results[0] is results[1] is results[2]
+        assert ai_service.async_client.chat.completions.create.await_count == 1
+        assert ai_service.inflight.stats()["coalesced"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_stream_analysis_emits_next_action_first(self, ai_service):
+        """Test that streamed parts are emitted in order as soon as they close."""
+        content = json.dumps({
+            "next_action": {"task": "Task 1", "step": "Open document", "minutes": 1},
+            "priorities": {"must": ["Task 1"], "should": ["Task 2"], "optional": []},
+            "breakdown": {
+                "Task 1": {"steps": [{"step": "Open document", "minutes": 2}]}
+            }
+        })
+        
+        async def fake_stream():
+            for i in range(0, len(content), 7):
+                chunk = Mock()
+                chunk.choices = [Mock()]
+                chunk.choices[0].delta.content = content[i:i + 7]
+                yield chunk
+        
+        ai_service.async_client.chat.completions.create = AsyncMock(return_value=fake_stream())
+        
+        events = [event async for event in ai_service.stream_analysis(["Task 1", "Task 2"])]
+        
+        names = [name for name, _ in events]
+        assert names == ["next_action", "priorities", "breakdown", "breakdown", "complete"]
+        assert events[0][1] == {"task": "Task 1", "step": "Open document", "minutes": 2}
+        assert events[2][1]["task"] == "Task 1"
+        # Task 2 was never broken down by the model, so its default arrives before complete
+        assert events[3][1]["task"] == "Task 2"
+        assert set(events[4][1]["breakdown"]) == {"Task 1", "Task 2"}
+        assert ai_service.async_client.chat.completions.create.call_args.kwargs["stream"] is True
+        
+        # A resubmission is replayed from the result cache
+        replay = [name async for name, _ in ai_service.stream_analysis(["Task 1", "Task 2"])]
+        assert replay == names
+        assert ai_service.async_client.chat.completions.create.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_streamed_default_breakdown_counted_once(self, ai_service):
+        """Test that a streamed breakdown without steps counts once as a fallback."""
+        content = json.dumps({
+            "next_action": {"task": "Task 1", "step": "Start working on Task 1", "minutes": 5},
+            "priorities": {"must": ["Task 1"], "should": [], "optional": []},
+            "breakdown": {"Task 1": {"steps": []}}
+        })
+        
+        async def fake_stream():
+            chunk = Mock()
+            chunk.choices = [Mock()]
+            chunk.choices[0].delta.content = content
+            yield chunk
+        
+        ai_service.async_client.chat.completions.create = AsyncMock(return_value=fake_stream())
+        fallbacks_before = FALLBACK_BREAKDOWNS.value
+        
+        events = [event async for event in ai_service.stream_analysis(["Task 1"])]
+        
+        assert events[2] == ("breakdown", {"task": "Task 1", "steps": [
+            {"step": "Start working on Task 1", "minutes": 5},
+            {"step": "Complete Task 1", "minutes": 15}
+        ]})
+        assert FALLBACK_BREAKDOWNS.value == fallbacks_before + 1
+    
+    @pytest.mark.asyncio
+    async def test_stalled_stream_stops_at_deadline(self, ai_service):
+        """Test that a stream that stops sending is abandoned when the deadline runs out."""
+        async def stalled_stream():
+            chunk = Mock()
+            chunk.choices = [Mock()]
+            chunk.choices[0].delta.content = '{"next_action": '
+            yield chunk
+            await asyncio.sleep(10)
+        
+        ai_service.async_client.chat.completions.create = AsyncMock(return_value=stalled_stream())
+        
+        with deadline_scope(0.05):
+            with pytest.raises(DeadlineExceeded):
+                async for _ in ai_service.stream_analysis(["Task 1", "Task 2"]):
+                    pass
+    
+    @pytest.mark.asyncio
+    async def test_analyze_tasks_async_shards_large_lists(self, ai_service):
+        """Test that lists above the shard size are analyzed concurrently and merged."""
+        ai_service.shard_size = 2
+        
+        async def create(**kwargs):
+            prompt = kwargs["messages"][1]["content"]
+            tasks = [t for t in ["Task 1", "Task 2", "Task 3", "Task 4"] if f". {t}\n" in prompt]
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.content = json.dumps({
+                "next_action": {"task": tasks[0], "step": f"Open {tasks[0]}", "minutes": 3},
+                "priorities": {"must": [tasks[0]], "should": tasks[1:], "optional": []},
+                "breakdown": {t: {"steps": [{"step": f"Open {t}", "minutes": 3}]} for t in tasks}
+            })
+            return response
+        
+        ai_service.async_client.chat.completions.create = AsyncMock(side_effect=create)
+        
+        result = await ai_service.analyze_tasks_async(["Task 1", "Task 2", "Task 3", "Task 4"])
+        
+        assert ai_service.async_client.chat.completions.create.await_count == 2
+        assert result.priorities["must"] == ["Task 1", "Task 3"]
+        assert result.priorities["should"] == ["Task 2", "Task 4"]
+        assert set(result.breakdown) == {"Task 1", "Task 2", "Task 3", "Task 4"}
+        assert result.next_action.task == "Task 1"
+    
+    @pytest.mark.asyncio
+    async def test_each_shard_takes_an_admission_slot(self, ai_service):
+        """Test that shard completions count against the in-flight limit one by one."""
+        ai_service.shard_size = 2
+        running = 0
+        peak = 0
+        
+        async def create(**kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.content = json.dumps({"priorities": {}, "breakdown": {}})
+            return response
+        
+        ai_service.async_client.chat.completions.create = AsyncMock(side_effect=create)
+        admission = AdmissionController(max_in_flight=1)
+        
+        with admission_scope(admission):
+            await ai_service.analyze_tasks_async(["Task 1", "Task 2", "Task 3", "Task 4"])
+        
+        assert ai_service.async_client.chat.completions.create.await_count == 2
+        assert peak == 1
+        assert admission.stats()["in_flight"] == 0
+    
+    def test_simple_lists_routed_locally(self, ai_service):
+        """Test that the auto routing policy answers simple lists without OpenAI."""
+        ai_service.routing = RoutingPolicy(mode="auto", engine=ai_service.local_engine)
+        
+        result = ai_service.analyze_tasks(["Buy milk", "Email Bob"])
+        
+        assert isinstance(result, TaskAnalysisResponse)
+        ai_service.client.chat.completions.create.assert_not_called()
+    
+    def test_open_circuit_serves_degraded_response(self, ai_service):
+        """Test that an open breaker answers locally at once and the answer is not cached."""
+        ai_service.breaker = CircuitBreaker(min_calls=1)
+        ai_service.breaker.record_failure()
+        
+        result = ai_service.analyze_tasks(["Write the quarterly report", "Call the insurance company"])
+        
+        assert result.degraded is True
+        assert set(result.breakdown) == {"Write the quarterly report", "Call the insurance company"}
+        ai_service.client.chat.completions.create.assert_not_called()
+        assert len(ai_service.result_cache) == 0
+    
+    @pytest.mark.asyncio
+    async def test_failures_trip_circuit(self, ai_service):
+        """Test that backend failures open the breaker for the following requests."""
+        ai_service.breaker = CircuitBreaker(min_calls=1)
+        ai_service.retry_policy = RetryPolicy(max_attempts=1)
+        ai_service.async_client.chat.completions.create = AsyncMock(side_effect=openai.APIConnectionError(
+            request=httpx.Request("POST", "https://api.openai.com")
+        ))
+        
+        with pytest.raises(openai.APIConnectionError):
+            await ai_service.analyze_tasks_async(["Task 1"])
+        result = await ai_service.analyze_tasks_async(["Task 2"])
+        
+        assert result.degraded is True
+        assert ai_service.async_client.chat.completions.create.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_client_errors_do_not_trip_circuit(self, ai_service):
+        """Test that a 400 from the backend is not counted as a backend failure."""
+        ai_service.breaker = CircuitBreaker(min_calls=1)
+        request = httpx.Request("POST", "https://api.openai.com")
+        ai_service.async_client.chat.completions.create = AsyncMock(side_effect=openai.BadRequestError(
+            "bad request", response=httpx.Response(400, request=request), body=None
+        ))
+    
+        with pytest.raises(openai.BadRequestError):
+            await ai_service.analyze_tasks_async(["Task 1"])
+    
+        assert ai_service.breaker.state == CircuitBreaker.CLOSED
+    
+    @pytest.mark.asyncio
+    async def test_spent_deadline_does_not_trip_circuit(self, ai_service):
+        """Test that a deadline used up before any call is not blamed on the backend."""
+        ai_service.breaker = CircuitBreaker(min_calls=1)
+    
+        with deadline_scope(0):
+            with pytest.raises(DeadlineExceeded):
+                await ai_service.analyze_tasks_async(["Task 1"])
+    
+        ai_service.async_client.chat.completions.create.assert_not_called()
+        assert ai_service.breaker.state == CircuitBreaker.CLOSED
+    
+    @pytest.mark.asyncio
+    async def test_call_outlasting_deadline_trips_circuit(self, ai_service):
+        """Test that a call still running when the deadline expires counts as a failure."""
+        ai_service.breaker = CircuitBreaker(min_calls=1)
+    
+        async def hang(**kwargs):
+            await asyncio.sleep(10)
+    
+        ai_service.async_client.chat.completions.create = hang
+    
+        with deadline_scope(0.05):
+            with pytest.raises(DeadlineExceeded):
+                await ai_service.analyze_tasks_async(["Task 1"])
+    
+        assert ai_service.breaker.state == CircuitBreaker.OPEN
+    
+    def test_near_duplicates_sent_once(self, ai_service):
+        """Test that reworded duplicates reach the model once and are mapped back."""
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = json.dumps({
+            "priorities": {"must": ["Email Bob re: invoice"], "should": ["Pay rent"], "optional": []},
+            "breakdown": {
+                "Email Bob re: invoice": {"steps": [{"step": "Open inbox", "minutes": 2}]},
+                "Pay rent": {"steps": [{"step": "Open bank app", "minutes": 3}]}
+            },
+            "next_action": {"task": "Email Bob re: invoice", "step": "Open inbox", "minutes": 2}
+        })
+        ai_service.client.chat.completions.create.return_value = mock_response
+        
+        result = ai_service.analyze_tasks(["Email Bob re: invoice", "Pay rent", "email bob about the invoice"])
+        
+        prompt = ai_service.client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+        assert "email bob about the invoice" not in prompt
+        assert result.priorities["must"] == ["Email Bob re: invoice", "email bob about the invoice"]
+        assert result.breakdown["email bob about the invoice"] == result.breakdown["Email Bob re: invoice"]
+    
+    def test_analyze_tasks_uses_result_cache(self, ai_service):
+        """Test that resubmitting the same task list is served from the cache."""
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = json.dumps({
+            "priorities": {"must": ["Task 1"], "should": [], "optional": []},
+            "breakdown": {},
+            "next_action": {}
+        })
+        ai_service.client.chat.completions.create.return_value = mock_response
+        
+        first = ai_service.analyze_tasks(["Task 1"])
+        second = ai_service.analyze_tasks(["Task 1"])
+        
+        assert second == first
+        assert ai_service.client.chat.completions.create.call_count == 1
+        stats = ai_service.result_cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+    
+    def test_analyze_tasks_reuses_cached_breakdowns(self, ai_service):
+        """Test that cached per-task breakdowns are merged and not requested again."""
+        first_response = Mock()
+        first_response.choices = [Mock()]
+        first_response.choices[0].message.content = json.dumps({
+            "priorities": {"must": ["Call dentist"], "should": [], "optional": []},
+            "breakdown": {
+                "Call dentist": {
+                    "steps": [
+                        {"step": "Find the phone number", "minutes": 3},
+                        {"step": "Make the call", "minutes": 10}
+                    ]
+                }
+            },
+            "next_action": {"task": "Call dentist", "step": "Find the phone number", "minutes": 3}
+        })
+        second_response = Mock()
+        second_response.choices = [Mock()]
+        second_response.choices[0].message.content = json.dumps({
+            "priorities": {"must": ["call dentist"], "should": ["Do taxes"], "optional": []},
+            "breakdown": {
+                "Do taxes": {
+                    "steps": [
+                        {"step": "Open the tax folder", "minutes": 2},
+                        {"step": "Fill in the form", "minutes": 20}
+                    ]
+                }
+            },
+            "next_action": {"task": "call dentist", "step": "Something else", "minutes": 5}
+        })
+        ai_service.client.chat.completions.create.side_effect = [first_response, second_response]
+        
+        ai_service.analyze_tasks(["Call dentist"])
+        result = ai_service.analyze_tasks(["call dentist", "Do taxes"])
+        
+        prompt = ai_service.client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+        assert "ALREADY BROKEN DOWN" in prompt
+        assert '- call dentist (first step: "Find the phone number", 3 min)' in prompt
+        assert result.breakdown["call dentist"].steps[1].step == "Make the call"
+        assert result.breakdown["Do taxes"].steps[0].step == "Open the tax folder"
+        # Next action follows the cached first step
+        assert result.next_action.step == "Find the phone number"
+        assert result.next_action.minutes == 3
+        assert ai_service.breakdown_cache.stats()["size"] == 2
+    
+    def test_similar_task_reuses_breakdown(self, ai_service):
+        """Test that a reworded task gets the earlier breakdown instead of a new one."""
+        first_response = Mock()
+        first_response.choices = [Mock()]
+        first_response.choices[0].message.content = json.dumps({
+            "priorities": {"must": ["Prepare Q3 report"], "should": [], "optional": []},
+            "breakdown": {"Prepare Q3 report": {"steps": [{"step": "Pull the Q3 numbers", "minutes": 15}]}},
+            "next_action": {"task": "Prepare Q3 report", "step": "Pull the Q3 numbers", "minutes": 15}
+        })
+        second_response = Mock()
+        second_response.choices = [Mock()]
+        second_response.choices[0].message.content = json.dumps({
+            "priorities": {"must": ["prep the quarterly report"], "should": [], "optional": []},
+            "breakdown": {},
+            "next_action": {"task": "prep the quarterly report", "step": "Pull the Q3 numbers", "minutes": 15}
+        })
+        ai_service.client.chat.completions.create.side_effect = [first_response, second_response]
+        
+        ai_service.analyze_tasks(["Prepare Q3 report"])
+        result = ai_service.analyze_tasks(["prep the quarterly report"])
+        
+        prompt = ai_service.client.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+        assert '- prep the quarterly report (first step: "Pull the Q3 numbers", 15 min)' in prompt
+        assert result.breakdown["prep the quarterly report"].steps[0].step == "Pull the Q3 numbers"
+        # Only the generated breakdown is cached under its own wording
+        assert ai_service.breakdown_cache.stats()["size"] == 1
+        assert ai_service.similar.stats()["hits"] == 1
+    
+    def test_persistent_store_is_shared_across_services(self, ai_service, tmp_path):
+        """Test that an analysis stored by one worker is served to another without a model call."""
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = json.dumps({
+            "priorities": {"must": ["Call dentist"], "should": [], "optional": []},
+            "breakdown": {"Call dentist": {"steps": [{"step": "Find the phone number", "minutes": 3}]}},
+            "next_action": {"task": "Call dentist", "step": "Find the phone number", "minutes": 3}
+        })
+        ai_service.client.chat.completions.create.return_value = mock_response
+        ai_service.store = PersistentStore(str(tmp_path / "store.db"))
+        first = ai_service.analyze_tasks(["Call dentist"])
+        
+        with patch.dict("os.environ", {"OPENAI_API_KEY": "test-key", "PRIORITIZER_MODE": "llm"}):
+            other = AIService()
+        other.client = Mock()
+        other.store = PersistentStore(str(tmp_path / "store.db"))
+        
+        assert other.analyze_tasks(["Call dentist"]) == first
+        other.client.chat.completions.create.assert_not_called()
+        # The breakdown is shared too, so a new list only asks for what is new
+        assert list(other._cached_breakdowns(["call dentist", "Do taxes"])) == ["call dentist"]
+    
+    @pytest.mark.asyncio
+    async def test_async_store_io_runs_off_the_event_loop(self, ai_service, tmp_path):
+        """Test that the async path reads and writes the store in a thread, breakdowns in one batch."""
+        threads = []
+        batches = []
+        
+        class RecordingStore(PersistentStore):
+            def get(self, key):
+                threads.append(threading.get_ident())
+                return super().get(key)
+            
+            def set(self, key, value, ttl_seconds=None):
+                threads.append(threading.get_ident())
+                super().set(key, value, ttl_seconds)
+            
+            def set_many(self, items, ttl_seconds=None):
+                threads.append(threading.get_ident())
+                batches.append(sorted(items))
+                super().set_many(items, ttl_seconds)
+        
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = json.dumps({
+            "priorities": {"must": ["Call dentist"], "should": ["Do taxes"], "optional": []},
+            "breakdown": {
+                "Call dentist": {"steps": [{"step": "Find the phone number", "minutes": 3}]},
+                "Do taxes": {"steps": [{"step": "Gather the receipts", "minutes": 10}]}
+            },
+            "next_action": {"task": "Call dentist", "step": "Find the phone number", "minutes": 3}
+        })
+        ai_service.async_client.chat.completions.create = AsyncMock(return_value=mock_response)
+        ai_service.store = RecordingStore(str(tmp_path / "store.db"))
+        
+        await ai_service.analyze_tasks_async(["Call dentist", "Do taxes"])
+        
+        assert threads and threading.get_ident() not in threads
+        assert len(batches) == 1
+        assert [key.rsplit(":", 1)[-1] for key in batches[0]] == ["call dentist", "do taxes"]
+    
+    def test_default_breakdowns_are_not_cached(self, ai_service):
+        """Test that fabricated fallback breakdowns never enter the cache."""
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = json.dumps({
+            "priorities": {"must": ["Task 1"], "should": [], "optional": []},
+            "breakdown": {},
+            "next_action": {}
+        })
+        ai_service.client.chat.completions.create.return_value = mock_response
+        
+        ai_service.analyze_tasks(["Task 1"])
+        
+        assert len(ai_service.breakdown_cache) == 0
+    
+    def test_analyze_tasks_salvages_truncated_response(self, ai_service):
+        """Test that a completion cut off by max_tokens is recovered instead of failing."""
+        full = json.dumps({
+            "next_action": {"task": "Task 1", "step": "Open document", "minutes": 2},
+            "priorities": {"must": ["Task 1"], "should": ["Task 2"], "optional": []},
+            "breakdown": {
+                "Task 1": {"steps": [{"step": "Open document", "minutes": 2}, {"step": "Write", "minutes": 10}]},
+                "Task 2": {"steps": [{"step": "Find contact", "minutes": 3}]}
+            }
+        })
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = full[:full.index('"Task 2": {"steps"') + 25]
+        ai_service.client.chat.completions.create.return_value = mock_response
+        salvaged_before = SALVAGED_RESPONSES.value
+        recovered_before = SALVAGE_RECOVERED_BREAKDOWNS.value
+        
+        result = ai_service.analyze_tasks(["Task 1", "Task 2"])
+        
+        assert result.breakdown["Task 1"].steps[1].step == "Write"
+        # Only the truncated breakdown falls back to the defaults
+        assert result.breakdown["Task 2"].steps[0].step == "Start working on Task 2"
+        assert result.priorities["should"] == ["Task 2"]
+        assert result.next_action.step == "Open document"
+        assert SALVAGED_RESPONSES.value == salvaged_before + 1
+        assert SALVAGE_RECOVERED_BREAKDOWNS.value == recovered_before + 1
+    
+    def test_analyze_tasks_unrecoverable_response(self, ai_service):
+        """Test that a completion with nothing to salvage still raises."""
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = "Sorry, I cannot help with that."
+        ai_service.client.chat.completions.create.return_value = mock_response
+        
+        with pytest.raises(json.JSONDecodeError):
+            ai_service.analyze_tasks(["Task 1"])
+    
+    def test_completion_params_static_prefix(self, ai_service):
+        """Test that only the user message varies between requests."""
+        first = ai_service._completion_params(["Write report"])
+        second = ai_service._completion_params(["Call client", "Buy milk"])
+        
+        assert first["messages"][0] == second["messages"][0] == {"role": "system", "content": SYSTEM_PROMPT}
+        assert first["messages"][1]["content"].startswith("TASKS:\n1. Write report\n")
+        assert "2. Buy milk" in second["messages"][1]["content"]
+        assert len(second["messages"][1]["content"]) < 200
+    
+    def test_prompt_is_presorted_and_annotated(self, ai_service):
+        """Test that urgent tasks are listed first with their extracted details."""
+        prompt = ai_service._create_analysis_prompt(["Buy milk", "Pay rent by Friday", "Fix bug asap"])
+        
+        assert prompt.startswith(
+            "TASKS:\n1. Fix bug asap [urgent]\n2. Pay rent by Friday [deadline: by Friday]\n3. Buy milk\n"
+        )
+    
+    def test_prompt_marks_sub_tasks(self, ai_service):
+        """Test that nested sub-items are listed with the task they belong to."""
+        prompt = ai_service._create_analysis_prompt(
+            ["Plan trip", "Book hotel", "Buy milk"], parents={"Book hotel": "Plan trip"}
+        )
+        
+        assert "2. Book hotel [part of: Plan trip]\n3. Buy milk\n" in prompt
+    
+    def test_nesting_is_part_of_the_cache_key(self, ai_service):
+        """Test that the same tasks nested differently are analyzed separately."""
+        tasks = ["Plan trip", "Book hotel"]
+        assert ai_service._cache_key(tasks) == ai_service._cache_key(tasks, {})
+        assert ai_service._cache_key(tasks) != ai_service._cache_key(tasks, {"Book hotel": "Plan trip"})
+    
+    def test_budget_follows_model_output_limit(self):
+        """Test that a model with a small output limit gets smaller completions, shards and streams."""
+        env = {"OPENAI_API_KEY": "test-key", "PRIORITIZER_MODE": "llm", "OPENAI_MODEL": "gpt-3.5-turbo"}
+        with patch.dict("os.environ", env):
+            service = AIService()
+        
+        assert service.max_completion_tokens == 4096
+        assert service.shard_size < 20
+        assert service.max_stream_tasks == service.shard_size
+        params = service._completion_params([f"Task {i}" for i in range(50)])
+        assert params["max_tokens"] == 4096
+    
+    def test_completion_params_sizes_max_tokens(self, ai_service):
+        """Test that max_tokens grows with the task count."""
+        small = ai_service._completion_params(["Task 1"])["max_tokens"]
+        large = ai_service._completion_params([f"Task {i}" for i in range(20)])["max_tokens"]
+        assert small < large
+    
+    def test_usage_is_recorded(self, ai_service):
+        """Test that reported prompt, cached and completion tokens are counted."""
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = json.dumps({"priorities": {"must": ["Task 1"]}})
+        mock_response.usage.prompt_tokens = 500
+        mock_response.usage.completion_tokens = 120
+        mock_response.usage.prompt_tokens_details.cached_tokens = 384
+        ai_service.client.chat.completions.create.return_value = mock_response
+        prompt_before = PROMPT_TOKENS.value
+        cached_before = CACHED_PROMPT_TOKENS.value
+        
+        ai_service.analyze_tasks(["Task 1"])
+        
+        assert PROMPT_TOKENS.value == prompt_before + 500
+        assert CACHED_PROMPT_TOKENS.value == cached_before + 384
+    
     def test_parse_ai_response_missing_tasks(self, ai_service):
         """Test parsing response with missing tasks."""
         result_dict = {
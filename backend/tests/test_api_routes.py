@@ -1,9 +1,17 @@
+import asyncio
+import os
 import pytest
 import json
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
 from httpx import AsyncClient, ASGITransport
+from app.api import routes
+from app import main
 from app.main import app
-from app.models.schemas import TaskAnalysisResponse, TaskBreakdown, TaskStep, NextAction
+from app.services.admission import AdmissionController, llm_slot
+from app.services.jobs import JobQueue
+from app.services.metrics import MetricsDirectory, MetricsRegistry
+from app.services.resilience import DeadlineExceeded
+from app.models.schemas import MAX_INPUT_CHARS, TaskAnalysisResponse, TaskBreakdown, TaskStep, NextAction
 
 
 @pytest.fixture
@@ -13,6 +21,14 @@ async def client():
         yield ac
 
 
+@pytest.fixture(autouse=True)
+def admission():
+    """Give every test fresh rate-limit buckets and in-flight slots."""
+    controller = AdmissionController()
+    with patch.object(routes, "admission", controller):
+        yield controller
+
+
 class TestAnalyzeEndpoint:
     """Test suite for /api/analyze endpoint."""
     
@@ -48,7 +64,7 @@ class TestAnalyzeEndpoint:
         
         with patch("app.api.routes.get_ai_service") as mock_service:
             mock_ai_service = Mock()
-            mock_ai_service.analyze_tasks.return_value = mock_response
+            mock_ai_service.analyze_tasks_async = AsyncMock(return_value=mock_response)
             mock_service.return_value = mock_ai_service
             
             response = await client.post(
@@ -62,6 +78,8 @@ class TestAnalyzeEndpoint:
             assert "breakdown" in data
             assert "next_action" in data
             assert data["priorities"]["must"] == ["Write report"]
+            assert response.headers["content-type"] == "application/json"
+            assert data == mock_response.model_dump()
     
     @pytest.mark.asyncio
     async def test_analyze_empty_input(self, client):
@@ -77,7 +95,7 @@ class TestAnalyzeEndpoint:
     @pytest.mark.asyncio
     async def test_analyze_too_long_input(self, client):
         """Test analysis with input exceeding character limit."""
-        long_text = "a" * 2001
+        long_text = "a" * (MAX_INPUT_CHARS + 1)
         response = await client.post(
             "/api/analyze",
             json={"tasks": long_text}
@@ -95,12 +113,73 @@ class TestAnalyzeEndpoint:
         
         assert response.status_code == 422
     
+    @pytest.mark.asyncio
+    async def test_analyze_accepts_lists_above_single_call_limit(self, client):
+        """Test that lists longer than 50 tasks are accepted for sharded analysis."""
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(return_value=make_analysis("T0"))
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post(
+                "/api/analyze",
+                json={"tasks": "\n".join(f"T{i}" for i in range(60))}
+            )
+            
+            assert response.status_code == 200
+            assert len(mock_ai_service.analyze_tasks_async.call_args.args[0]) == 60
+    
+    @pytest.mark.asyncio
+    async def test_analyze_passes_nesting(self, client):
+        """Test that sub-bullets reach the service with the task they are nested under."""
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(return_value=make_analysis("Plan trip"))
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post("/api/analyze", json={"tasks": "- Plan trip\n  - book hotel\n- Buy milk"})
+            
+            assert response.status_code == 200
+            call = mock_ai_service.analyze_tasks_async.call_args
+            assert call.args[0] == ["Plan trip", "book hotel", "Buy milk"]
+            assert call.kwargs["parents"] == {"book hotel": "Plan trip"}
+    
+    @pytest.mark.asyncio
+    async def test_analyze_server_timing(self, client):
+        """Test that per-stage timings are returned in the Server-Timing header."""
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(return_value=make_analysis("Write report"))
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post("/api/analyze", json={"tasks": "Write report"})
+            
+            assert response.status_code == 200
+            stages = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+            assert stages == ["parse", "validate", "analyze", "serialize", "total"]
+    
+    @pytest.mark.asyncio
+    async def test_analyze_queues_trace_for_export(self, client):
+        """Test that the finished trace is handed to the batch exporter, not exported by the request."""
+        exporter = Mock()
+        with patch("app.api.routes.get_ai_service") as mock_service, \
+                patch("app.api.routes.trace_exporter", exporter):
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(return_value=make_analysis("Write report"))
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post("/api/analyze", json={"tasks": "Write report"})
+            
+            assert response.status_code == 200
+            exporter.submit.assert_called_once()
+            assert exporter.submit.call_args.args[0].root.name == "POST /api/analyze"
+    
     @pytest.mark.asyncio
     async def test_analyze_openai_error(self, client):
         """Test handling of OpenAI API errors."""
         with patch("app.api.routes.get_ai_service") as mock_service:
             mock_ai_service = Mock()
-            mock_ai_service.analyze_tasks.side_effect = Exception("OpenAI API error")
+            mock_ai_service.analyze_tasks_async = AsyncMock(side_effect=Exception("OpenAI API error"))
             mock_service.return_value = mock_ai_service
             
             response = await client.post(
@@ -113,6 +192,543 @@ class TestAnalyzeEndpoint:
             assert "error" in data or "detail" in data
 
 
+class TestAdmissionControl:
+    """Test suite for load shedding on the analyze endpoints."""
+    
+    @pytest.mark.asyncio
+    async def test_client_over_rate_gets_429(self, client, admission):
+        """Test that a client that exhausts its bucket is rejected with Retry-After."""
+        admission.client_burst = 1
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(return_value=make_analysis("Write report"))
+            mock_service.return_value = mock_ai_service
+            
+            first = await client.post("/api/analyze", json={"tasks": "Write report"})
+            second = await client.post("/api/analyze", json={"tasks": "Write report"})
+            # A made-up API key does not get a fresh bucket
+            rotated = await client.post("/api/analyze", json={"tasks": "Write report"}, headers={"X-API-Key": "k"})
+            transport = ASGITransport(app=app, client=("10.0.0.2", 123))
+            async with AsyncClient(transport=transport, base_url="http://test") as other_client:
+                other = await other_client.post("/api/analyze", json={"tasks": "Write report"})
+            
+            assert first.status_code == 200
+            assert second.status_code == 429
+            assert int(second.headers["Retry-After"]) >= 1
+            assert rotated.status_code == 429
+            assert other.status_code == 200
+            assert mock_ai_service.analyze_tasks_async.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_forwarded_for_keys_on_the_proxy_entry(self, client, admission):
+        """Test that behind a proxy only the entry it appended identifies the client."""
+        admission.client_burst = 1
+        with patch("app.api.routes.get_ai_service") as mock_service, \
+                patch("app.api.routes.TRUSTED_PROXY_HOPS", 1):
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(return_value=make_analysis("Write report"))
+            mock_service.return_value = mock_ai_service
+            
+            first = await client.post(
+                "/api/analyze", json={"tasks": "Write report"}, headers={"X-Forwarded-For": "203.0.113.7"}
+            )
+            # A made-up leftmost entry does not get a fresh bucket
+            spoofed = await client.post(
+                "/api/analyze", json={"tasks": "Write report"}, headers={"X-Forwarded-For": "1.2.3.4, 203.0.113.7"}
+            )
+            other = await client.post(
+                "/api/analyze", json={"tasks": "Write report"}, headers={"X-Forwarded-For": "203.0.113.8"}
+            )
+            
+            assert first.status_code == 200
+            assert spoofed.status_code == 429
+            assert other.status_code == 200
+    
+    @pytest.mark.asyncio
+    async def test_batch_is_charged_per_item(self, client):
+        """Test that a batch larger than the burst leaves the client owing the rest."""
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(return_value=make_analysis("Write report"))
+            mock_service.return_value = mock_ai_service
+            
+            batch = await client.post("/api/analyze/batch", json={"items": ["Write report"] * 20})
+            after = await client.post("/api/analyze", json={"tasks": "Write report"})
+            
+            assert batch.status_code == 200
+            assert after.status_code == 429
+            # 20 items from a burst of 10 at 1/s: 10 owed plus the next request's token
+            assert int(after.headers["Retry-After"]) >= 10
+    
+    @pytest.mark.asyncio
+    async def test_server_at_capacity_gets_503(self, client):
+        """Test that requests are shed with 503 when no slot or queue space is left."""
+        admission = AdmissionController(max_in_flight=1, max_queue=0)
+        await admission.acquire()
+        with patch.object(routes, "admission", admission), \
+                patch("app.api.routes.get_ai_service") as mock_service:
+            model_calls = 0
+            
+            async def analyze(tasks, parents=None):
+                nonlocal model_calls
+                async with llm_slot():
+                    model_calls += 1
+                return make_analysis(tasks[0])
+            
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(side_effect=analyze)
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post("/api/analyze", json={"tasks": "Write report"})
+            
+            assert response.status_code == 503
+            assert "Retry-After" in response.headers
+            assert model_calls == 0
+        admission.release()
+
+
+class TestDeadlines:
+    """Test suite for request deadlines."""
+    
+    @pytest.mark.asyncio
+    async def test_deadline_exceeded_returns_504(self, client):
+        """Test that running out of time is reported as a gateway timeout."""
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(side_effect=DeadlineExceeded("too slow"))
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post("/api/analyze", json={"tasks": "Write report"})
+            
+            assert response.status_code == 504
+
+
+class TestAnalyzeStreamEndpoint:
+    """Test suite for /api/analyze/stream endpoint."""
+    
+    @pytest.mark.asyncio
+    async def test_stream_success(self, client):
+        """Test that analysis events are relayed as SSE."""
+        async def fake_events(tasks, parents=None):
+            yield "next_action", {"task": "Write report", "step": "Open document", "minutes": 2}
+            yield "priorities", {"must": ["Write report"], "should": [], "optional": []}
+        
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.max_stream_tasks = 30
+            mock_ai_service.stream_analysis = fake_events
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post("/api/analyze/stream", json={"tasks": "Write report"})
+            
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            messages = response.text.strip().split("\n\n")
+            assert messages[0].startswith("event: next_action\ndata: ")
+            assert json.loads(messages[0].split("data: ", 1)[1])["step"] == "Open document"
+            assert messages[1].startswith("event: priorities")
+    
+    @pytest.mark.asyncio
+    async def test_stream_error_event(self, client):
+        """Test that failures after the stream started become an error event."""
+        async def failing_events(tasks, parents=None):
+            yield "next_action", {"task": "Write report", "step": "Open document", "minutes": 2}
+            raise Exception("OpenAI API error")
+        
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.max_stream_tasks = 30
+            mock_ai_service.stream_analysis = failing_events
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post("/api/analyze/stream", json={"tasks": "Write report"})
+            
+            assert response.status_code == 200
+            assert "event: error" in response.text
+            assert "OpenAI API error" in response.text
+    
+    @pytest.mark.asyncio
+    async def test_client_leaving_early_releases_slot(self, admission):
+        """Test that a client that disconnects before or during the stream never keeps a slot."""
+        async def fake_events(tasks, parents=None):
+            yield "next_action", {"task": "Write report", "step": "Open document", "minutes": 2}
+            await asyncio.sleep(10)
+            yield "priorities", {"must": ["Write report"], "should": [], "optional": []}
+        
+        async def disconnect_after(sent_messages: int) -> None:
+            incoming = [{"type": "http.request", "body": b'{"tasks": "Write report"}', "more_body": False}]
+            sent = 0
+            gone = asyncio.Event()
+            
+            async def receive():
+                if incoming:
+                    return incoming.pop(0)
+                await gone.wait()
+                return {"type": "http.disconnect"}
+            
+            async def send(message):
+                nonlocal sent
+                sent += 1
+                if sent >= sent_messages:
+                    gone.set()
+                    await asyncio.sleep(0.05)
+            
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+                "method": "POST", "scheme": "http", "path": "/api/analyze/stream",
+                "raw_path": b"/api/analyze/stream", "query_string": b"", "root_path": "",
+                "headers": [(b"content-type", b"application/json")],
+                "client": ("127.0.0.1", 123), "server": ("test", 80),
+            }
+            await app(scope, receive, send)
+        
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.max_stream_tasks = 30
+            mock_ai_service.stream_analysis = fake_events
+            mock_service.return_value = mock_ai_service
+            
+            # Gone while the headers were being sent, then after the first event
+            for sent_messages in (1, 1, 1, 2):
+                await disconnect_after(sent_messages)
+                assert admission.stats()["in_flight"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_stream_at_capacity_gets_503(self, client):
+        """Test that a stream is refused up front when no slot or queue space is left."""
+        admission = AdmissionController(max_in_flight=1, max_queue=0)
+        await admission.acquire()
+        with patch.object(routes, "admission", admission), \
+                patch("app.api.routes.get_ai_service") as mock_service:
+            mock_service.return_value.max_stream_tasks = 30
+            response = await client.post("/api/analyze/stream", json={"tasks": "Write report"})
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+        admission.release()
+    
+    @pytest.mark.asyncio
+    async def test_stream_limited_to_one_completion(self, client):
+        """Test that a list longer than one completion can answer is refused before streaming."""
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.max_stream_tasks = 15
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post(
+                "/api/analyze/stream",
+                json={"tasks": "\n".join(f"Task {i}" for i in range(16))}
+            )
+        
+        assert response.status_code == 400
+        assert "Maximum 15 tasks" in response.json()["detail"]
+        mock_ai_service.stream_analysis.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_stream_empty_input(self, client):
+        """Test that invalid input is rejected before streaming starts."""
+        response = await client.post("/api/analyze/stream", json={"tasks": ""})
+        assert response.status_code in [400, 422]
+
+
+def make_analysis(task: str) -> TaskAnalysisResponse:
+    """Build a minimal analysis for a single task."""
+    return TaskAnalysisResponse(
+        priorities={"must": [task], "should": [], "optional": []},
+        breakdown={
+            task: TaskBreakdown(steps=[
+                TaskStep(step="Open it", minutes=2),
+                TaskStep(step="Finish it", minutes=10)
+            ])
+        },
+        next_action=NextAction(task=task, step="Open it", minutes=2)
+    )
+
+
+class TestAnalyzeBatchEndpoint:
+    """Test suite for /api/analyze/batch endpoint."""
+    
+    @pytest.mark.asyncio
+    async def test_batch_results_in_completion_order(self, client):
+        """Test that a slow item does not hold back faster ones."""
+        async def analyze(tasks, parents=None):
+            if tasks == ["Slow task"]:
+                await asyncio.sleep(0.05)
+            return make_analysis(tasks[0])
+        
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(side_effect=analyze)
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post(
+                "/api/analyze/batch",
+                json={"items": ["Slow task", "Fast task"]}
+            )
+            
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("application/x-ndjson")
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            assert [line["index"] for line in lines] == [1, 0]
+            assert lines[0]["result"]["next_action"]["task"] == "Fast task"
+            assert all(line["error"] is None for line in lines)
+    
+    @pytest.mark.asyncio
+    async def test_batch_per_item_errors(self, client):
+        """Test that a failing item reports an error without failing the batch."""
+        async def analyze(tasks, parents=None):
+            if tasks == ["Broken"]:
+                raise Exception("OpenAI API error")
+            return make_analysis(tasks[0])
+        
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(side_effect=analyze)
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post(
+                "/api/analyze/batch",
+                json={"items": ["Broken", "Works", "   "]}
+            )
+            
+            assert response.status_code == 200
+            lines = {line["index"]: line for line in map(json.loads, response.text.splitlines())}
+            assert lines[0]["result"] is None
+            assert "OpenAI API error" in lines[0]["error"]
+            assert lines[1]["result"]["priorities"]["must"] == ["Works"]
+            assert lines[2]["result"] is None
+            assert "empty" in lines[2]["error"]
+    
+    @pytest.mark.asyncio
+    async def test_batch_concurrency_limit(self, client):
+        """Test that no more than BATCH_CONCURRENCY items run at once."""
+        running = 0
+        peak = 0
+        
+        async def analyze(tasks, parents=None):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return make_analysis(tasks[0])
+        
+        with patch("app.api.routes.get_ai_service") as mock_service, \
+                patch("app.api.routes.BATCH_CONCURRENCY", 2):
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(side_effect=analyze)
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post(
+                "/api/analyze/batch",
+                json={"items": [f"Task {i}" for i in range(6)]}
+            )
+            
+            assert len(response.text.splitlines()) == 6
+            assert peak == 2
+    
+    @pytest.mark.asyncio
+    async def test_batch_empty_items(self, client):
+        """Test that an empty batch is rejected."""
+        response = await client.post("/api/analyze/batch", json={"items": []})
+        assert response.status_code == 422
+
+
+class TestJobsEndpoint:
+    """Test suite for the /api/jobs endpoints."""
+    
+    @pytest.fixture(autouse=True)
+    async def jobs(self):
+        """Give every test its own job queue and workers."""
+        queue = JobQueue(workers=2)
+        with patch.object(routes, "jobs", queue):
+            yield queue
+        await queue.close()
+    
+    async def wait_for_job(self, client, location):
+        for _ in range(100):
+            response = await client.get(location)
+            if response.json()["status"] in ("done", "failed"):
+                return response
+            await asyncio.sleep(0.01)
+        raise AssertionError("job did not finish")
+    
+    @pytest.mark.asyncio
+    async def test_job_returns_immediately_and_finishes(self, client):
+        """Test that a job id comes back before the analysis, and the result once it is done."""
+        release = asyncio.Event()
+        
+        async def analyze(tasks, parents=None):
+            await release.wait()
+            return make_analysis(tasks[0])
+        
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(side_effect=analyze)
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post("/api/jobs", json={"tasks": "Write report"})
+            
+            assert response.status_code == 202
+            job = response.json()
+            assert job["status"] == "queued"
+            assert job["result"] is None
+            assert response.headers["location"] == f"/api/jobs/{job['id']}"
+            
+            release.set()
+            done = await self.wait_for_job(client, response.headers["location"])
+            body = done.json()
+            assert body["status"] == "done"
+            assert body["result"]["next_action"]["task"] == "Write report"
+            assert body["finished_at"] >= body["started_at"] >= body["created_at"]
+    
+    @pytest.mark.asyncio
+    async def test_failed_job_reports_error(self, client):
+        """Test that an analysis error is recorded on the job rather than raised."""
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(side_effect=Exception("OpenAI API error"))
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post("/api/jobs", json={"tasks": "Write report"})
+            done = await self.wait_for_job(client, response.headers["location"])
+            
+            assert done.json()["status"] == "failed"
+            assert done.json()["error"] == "OpenAI API error"
+    
+    @pytest.mark.asyncio
+    async def test_job_model_calls_take_admission_slots(self, client):
+        """Test that each of a job's shard calls waits for an in-flight slot as background work."""
+        admission = AdmissionController(max_in_flight=2)
+        running = 0
+        peak = 0
+        
+        async def analyze(tasks, parents=None):
+            async def shard():
+                nonlocal running, peak
+                async with llm_slot():
+                    running += 1
+                    peak = max(peak, admission.stats()["background_in_flight"])
+                    await asyncio.sleep(0.01)
+                    running -= 1
+            
+            await asyncio.gather(*(shard() for _ in range(3)))
+            return make_analysis(tasks[0])
+        
+        with patch.object(routes, "admission", admission), \
+                patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(side_effect=analyze)
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.post("/api/jobs", json={"tasks": "Write report"})
+            done = await self.wait_for_job(client, response.headers["location"])
+        
+        assert done.json()["status"] == "done"
+        # Jobs get at most half of the two slots, one shard at a time
+        assert peak == 1
+        assert admission.stats()["in_flight"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_invalid_input_is_rejected_up_front(self, client):
+        """Test that inputs /analyze would reject are refused before queueing."""
+        with patch("app.api.routes.get_ai_service") as mock_service, \
+                patch("app.api.routes.MAX_TASKS", 2):
+            response = await client.post("/api/jobs", json={"tasks": "Task 1\nTask 2\nTask 3"})
+        assert response.status_code == 400
+        assert "Too many tasks" in response.json()["detail"]
+        mock_service.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_full_queue_returns_503(self, client, jobs):
+        """Test that submissions beyond the queue bound are shed with Retry-After."""
+        jobs.max_queued = 0
+        with patch("app.api.routes.get_ai_service"):
+            response = await client.post("/api/jobs", json={"tasks": "Write report"})
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+    
+    @pytest.mark.asyncio
+    async def test_several_workers_without_store_refuse_jobs(self, client):
+        """Test that jobs are refused when polls could land on a worker that never saw them."""
+        with patch("app.api.routes.get_ai_service") as mock_service, \
+                patch("app.api.routes.WORKER_PROCESSES", 2):
+            response = await client.post("/api/jobs", json={"tasks": "Write report"})
+        assert response.status_code == 503
+        assert "ANALYSIS_STORE_PATH" in response.json()["detail"]
+        mock_service.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_unknown_job(self, client):
+        """Test that an unknown or expired job id is a 404."""
+        response = await client.get("/api/jobs/missing")
+        assert response.status_code == 404
+
+
+class TestCacheStatsEndpoint:
+    """Test suite for /api/cache/stats endpoint."""
+    
+    @pytest.mark.asyncio
+    async def test_cache_stats(self, client):
+        """Test that cache counters are exposed."""
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.result_cache.stats.return_value = {"hits": 3, "misses": 1, "evictions": 0}
+            mock_ai_service.breakdown_cache.stats.return_value = {"hits": 0, "misses": 2, "evictions": 0}
+            mock_ai_service.inflight.stats.return_value = {"leaders": 1, "coalesced": 4, "in_flight": 0}
+            mock_ai_service.store = None
+            mock_ai_service.similar = None
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.get("/api/cache/stats")
+            
+            assert response.status_code == 200
+            assert response.json()["analysis"]["hits"] == 3
+            assert response.json()["breakdown"]["misses"] == 2
+            assert response.json()["coalescing"]["coalesced"] == 4
+            assert "store" not in response.json()
+            assert "similarity" not in response.json()
+    
+    @pytest.mark.asyncio
+    async def test_cache_stats_include_store(self, client):
+        """Test that persistent store counters are exposed when the store is enabled."""
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.result_cache.stats.return_value = {}
+            mock_ai_service.breakdown_cache.stats.return_value = {}
+            mock_ai_service.inflight.stats.return_value = {}
+            mock_ai_service.store.stats.return_value = {"hits": 7, "misses": 2, "errors": 0, "size": 9}
+            mock_ai_service.similar = None
+            mock_service.return_value = mock_ai_service
+            
+            response = await client.get("/api/cache/stats")
+            
+            assert response.json()["store"]["hits"] == 7
+    
+    @pytest.mark.asyncio
+    async def test_cache_stats_of_every_worker(self, client, tmp_path):
+        """Test that with several workers every live worker's counters are listed by process id."""
+        with patch("app.api.routes.get_ai_service") as mock_service, \
+                patch("app.api.routes.metrics_directory", MetricsDirectory(str(tmp_path), MetricsRegistry())):
+            mock_ai_service = Mock()
+            mock_ai_service.result_cache.stats.return_value = {"hits": 3}
+            mock_ai_service.breakdown_cache.stats.return_value = {}
+            mock_ai_service.inflight.stats.return_value = {}
+            mock_ai_service.store = None
+            mock_ai_service.similar = None
+            mock_service.return_value = mock_ai_service
+            other = MetricsDirectory(str(tmp_path), MetricsRegistry())
+            with patch("os.getpid", return_value=os.getppid()):
+                other.write({"analysis": {"hits": 5}})
+            
+            response = await client.get("/api/cache/stats")
+            
+            workers = response.json()["workers"]
+            assert response.json()["worker"] == str(os.getpid())
+            assert workers[str(os.getpid())]["analysis"]["hits"] == 3
+            assert workers[str(os.getppid())]["analysis"]["hits"] == 5
+            assert "in_flight" in workers[str(os.getpid())]["admission"]
+
+
 class TestHealthEndpoints:
     """Test suite for health check endpoints."""
     
@@ -129,4 +745,96 @@ class TestHealthEndpoints:
         response = await client.get("/health")
         assert response.status_code == 200
         assert response.json() == {"status": "healthy"}
+    
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(self, client):
+        """Test that stage histograms and error counters are exposed for Prometheus."""
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.analyze_tasks_async = AsyncMock(side_effect=Exception("OpenAI API error"))
+            mock_service.return_value = mock_ai_service
+            await client.post("/api/analyze", json={"tasks": "Write report"})
+        
+        response = await client.get("/metrics")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "# TYPE parse_tasks_seconds histogram" in response.text
+        assert "analyze_request_seconds_count" in response.text
+        assert 'analyze_errors_total{error="Exception"}' in response.text
+        assert "llm_prompt_tokens_total" in response.text
+    
+    @pytest.mark.asyncio
+    async def test_metrics_summed_over_workers(self, client, tmp_path):
+        """Test that a scrape reports the metrics of the other workers as well as its own."""
+        other = MetricsRegistry()
+        other.counter("analyze_errors_total", "Failed or rejected analyses by exception class", labels={"error": "Exception"}).inc(1000)
+        with patch("os.getpid", return_value=os.getppid()):
+            MetricsDirectory(str(tmp_path), other).write()
+        own = main.REGISTRY.counter("analyze_errors_total", "Failed or rejected analyses by exception class", labels={"error": "Exception"}).value
+        
+        with patch("app.api.routes.metrics_directory", MetricsDirectory(str(tmp_path))):
+            response = await client.get("/metrics")
+        
+        assert response.status_code == 200
+        assert f'analyze_errors_total{{error="Exception"}} {int(own) + 1000}' in response.text
+        assert "# TYPE parse_tasks_seconds histogram" in response.text
 
+
+class TestReadiness:
+    """Test suite for startup warm-up and the /ready endpoint."""
+    
+    @pytest.fixture(autouse=True)
+    def readiness(self):
+        """Start every test from a cold instance."""
+        with patch.dict(main.readiness, {"ready": False, "warmup": None}):
+            yield main.readiness
+    
+    @pytest.mark.asyncio
+    async def test_not_ready_before_warm_up(self, client):
+        """Test that /ready answers 503 until the warm-up has run."""
+        response = await client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming"
+    
+    @pytest.mark.asyncio
+    async def test_ready_after_warm_up(self, client):
+        """Test that warm-up builds the service and opens a connection before reporting ready."""
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.local_engine.analyze.return_value = make_analysis("Warm up the service")
+            mock_ai_service.async_client.models.list = AsyncMock(return_value=[])
+            mock_service.return_value = mock_ai_service
+            
+            await main.warm_up()
+            response = await client.get("/ready")
+            
+            assert response.status_code == 200
+            assert response.json()["warmup"]["connection"] == "open"
+            mock_ai_service.async_client.models.list.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_connection_failure_does_not_block_readiness(self, client):
+        """Test that an unreachable API is reported but the instance still becomes ready."""
+        with patch("app.api.routes.get_ai_service") as mock_service:
+            mock_ai_service = Mock()
+            mock_ai_service.local_engine.analyze.return_value = make_analysis("Warm up the service")
+            mock_ai_service.async_client.models.list = AsyncMock(side_effect=ConnectionError())
+            mock_service.return_value = mock_ai_service
+            
+            await main.warm_up()
+            response = await client.get("/ready")
+            
+            assert response.status_code == 200
+            assert response.json()["warmup"]["connection"] == "failed: ConnectionError"
+    
+    @pytest.mark.asyncio
+    async def test_failed_warm_up_stays_not_ready(self, client):
+        """Test that an instance whose service cannot be built never reports ready."""
+        with patch("app.api.routes.get_ai_service", side_effect=ValueError("OPENAI_API_KEY environment variable is not set")):
+            await main.warm_up()
+        
+        response = await client.get("/ready")
+        
+        assert response.status_code == 503
+        assert "OPENAI_API_KEY" in response.json()["warmup"]["error"]
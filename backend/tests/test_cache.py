@@ -0,0 +1,77 @@
+import pytest
+from app.services.cache import TTLLRUCache, analysis_cache_key, normalize_task
+
+
+class TestAnalysisCacheKey:
+    """Test suite for content-addressed cache keys."""
+
+    def test_same_input_same_key(self):
+        """Test that identical requests hash to the same key."""
+        key1 = analysis_cache_key(["Task 1", "Task 2"], "gpt-4o-mini", "1")
+        key2 = analysis_cache_key(["Task 1", "Task 2"], "gpt-4o-mini", "1")
+        assert key1 == key2
+
+    def test_key_depends_on_model_and_prompt_version(self):
+        """Test that model and prompt version are part of the key."""
+        base = analysis_cache_key(["Task 1"], "gpt-4o-mini", "1")
+        assert base != analysis_cache_key(["Task 1"], "gpt-4o", "1")
+        assert base != analysis_cache_key(["Task 1"], "gpt-4o-mini", "2")
+
+    def test_key_depends_on_tasks(self):
+        """Test that different task lists produce different keys."""
+        assert analysis_cache_key(["a", "b"], "m", "1") != analysis_cache_key(["ab"], "m", "1")
+
+
+class TestTTLLRUCache:
+    """Test suite for the TTL/LRU cache."""
+
+    def test_hit_and_miss_counters(self):
+        """Test that hits and misses are counted."""
+        cache = TTLLRUCache(max_size=2)
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["size"] == 1
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = TTLLRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now least recently used
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self, clock):
+        """Test that entries expire after the TTL."""
+        cache = TTLLRUCache(max_size=2, ttl_seconds=10, clock=clock)
+        start = clock.now
+        cache.set("a", 1)
+        clock.now = start + 9.9
+        assert cache.get("a") == 1
+        clock.now = start + 10.0
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+        assert len(cache) == 0
+
+    def test_zero_size_disables_cache(self):
+        """Test that max_size=0 never stores anything."""
+        cache = TTLLRUCache(max_size=0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+class TestNormalizeTask:
+    """Test suite for per-task key normalization."""
+
+    def test_case_whitespace_and_punctuation(self):
+        """Test that trivial variants normalize to the same string."""
+        assert normalize_task("Call  Dentist.") == "call dentist"
+        assert normalize_task("  call dentist ") == "call dentist"
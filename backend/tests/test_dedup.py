@@ -0,0 +1,71 @@
+import pytest
+from app.models.schemas import TaskAnalysisResponse, TaskBreakdown, TaskStep, NextAction
+from app.services.dedup import NearDuplicateDetector, canonical_task, expand_duplicates
+
+
+class TestNearDuplicateDetector:
+    """Test suite for near-duplicate task detection."""
+
+    def test_canonical_task_drops_filler(self):
+        """Test that punctuation, filler words and plurals are normalized away."""
+        assert canonical_task("Email Bob re: invoice") == canonical_task("email bob about the invoices")
+
+    @pytest.mark.parametrize("first,second", [
+        ("Email Bob re: invoice", "email bob about the invoice"),
+        ("Do taxes", "Do the taxes!"),
+        ("Write report", "Write reports"),
+        ("Send invoice to Alice", "send the invoices to alice"),
+        ("Write report for client A", "Write a report for client A"),
+    ])
+    def test_collapses_variants(self, first, second):
+        """Test that reworded tasks are merged onto the first occurrence."""
+        unique, aliases = NearDuplicateDetector().collapse([first, "Buy milk", second])
+        assert unique == [first, "Buy milk"]
+        assert aliases == {second: first}
+
+    @pytest.mark.parametrize("first,second", [
+        ("Call mom", "Call dad"),
+        ("Buy milk", "Buy milk and eggs"),
+        ("Pay invoice 12", "Pay invoice 13"),
+        ("Write report for client A", "Write report for client B"),
+        ("Send invoice to Alice", "Send invoice to Alicia"),
+    ])
+    def test_keeps_distinct_tasks(self, first, second):
+        """Test that different tasks, including ones differing only by a number, label or name, are kept."""
+        unique, aliases = NearDuplicateDetector().collapse([first, second])
+        assert unique == [first, second]
+        assert aliases == {}
+
+    def test_threshold_is_configurable(self):
+        """Test that a lower threshold merges looser matches and above 1 disables."""
+        tasks = ["Buy milk", "Buy milk and eggs"]
+        assert NearDuplicateDetector(threshold=0.6).collapse(tasks)[1] == {"Buy milk and eggs": "Buy milk"}
+        assert NearDuplicateDetector(threshold=1.5).collapse(["Do taxes", "Do the taxes"])[1] == {}
+
+
+class TestExpandDuplicates:
+    """Test suite for mapping collapsed analyses back to the original tasks."""
+
+    def test_aliases_follow_their_original(self):
+        """Test that merged tasks are ranked after their original and share its breakdown."""
+        steps = TaskBreakdown(steps=[TaskStep(step="Open inbox", minutes=2)])
+        result = TaskAnalysisResponse(
+            priorities={"must": ["Email Bob re: invoice", "Pay rent"], "should": [], "optional": []},
+            breakdown={"Email Bob re: invoice": steps, "Pay rent": steps},
+            next_action=NextAction(task="Pay rent", step="Open inbox", minutes=2)
+        )
+
+        expanded = expand_duplicates(result, {"email bob about the invoice": "Email Bob re: invoice"})
+
+        assert expanded.priorities["must"] == ["Email Bob re: invoice", "email bob about the invoice", "Pay rent"]
+        assert expanded.breakdown["email bob about the invoice"] == steps
+        assert expanded.next_action == result.next_action
+
+    def test_no_aliases_returns_result(self):
+        """Test that nothing is rebuilt when no tasks were merged."""
+        result = TaskAnalysisResponse(
+            priorities={"must": [], "should": [], "optional": ["A"]},
+            breakdown={},
+            next_action=NextAction(task="A", step="Start", minutes=2)
+        )
+        assert expand_duplicates(result, {}) is result
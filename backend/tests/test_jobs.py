@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+from app.services.admission import AdmissionRejected
+from app.services.jobs import JOBS_QUEUED, JobQueue
+from app.services.store import PersistentStore
+
+
+async def finished(queue: JobQueue, job_id: str) -> dict:
+    for _ in range(100):
+        view = await queue.get(job_id)
+        if view["status"] in ("done", "failed"):
+            return view
+        await asyncio.sleep(0.005)
+    raise AssertionError("job did not finish")
+
+
+class TestJobQueue:
+    """Test suite for the background job queue."""
+
+    @pytest.fixture
+    async def queue(self):
+        queue = JobQueue(workers=2)
+        yield queue
+        await queue.close()
+
+    async def test_job_runs_in_background(self, queue):
+        """Test that submit returns a queued job whose result appears once it has run."""
+        async def work():
+            return {"answer": 42}
+
+        job = await queue.submit(work)
+        assert (await queue.get(job.id))["status"] == "queued"
+        view = await finished(queue, job.id)
+        assert view["status"] == "done"
+        assert view["result"] == {"answer": 42}
+        assert queue.stats()["completed"] == 1
+
+    async def test_failure_is_recorded(self, queue):
+        """Test that an exception fails the job and leaves the workers running."""
+        async def broken():
+            raise ValueError("bad input")
+
+        async def work():
+            return {}
+
+        failed = await queue.submit(broken)
+        ok = await queue.submit(work)
+        assert (await finished(queue, failed.id))["error"] == "bad input"
+        assert (await finished(queue, ok.id))["status"] == "done"
+
+    async def test_worker_pool_bounds_concurrency(self, queue):
+        """Test that no more than `workers` jobs run at once and the rest wait."""
+        running = 0
+        peak = 0
+
+        async def work():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return {}
+
+        jobs = [await queue.submit(work) for _ in range(6)]
+        assert JOBS_QUEUED.value == 6
+        for job in jobs:
+            await finished(queue, job.id)
+        assert peak == 2
+        assert JOBS_QUEUED.value == 0
+
+    async def test_full_queue_rejects(self):
+        """Test that submissions beyond max_queued are refused with a 503."""
+        queue = JobQueue(workers=1, max_queued=1)
+
+        async def work():
+            return {}
+
+        await queue.submit(work)
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await queue.submit(work)
+        assert exc_info.value.status_code == 503
+        assert queue.stats()["rejected"] == 1
+        await queue.close()
+
+    async def test_results_expire(self, clock):
+        """Test that finished jobs are forgotten after ttl_seconds."""
+        queue = JobQueue(ttl_seconds=60, clock=clock)
+
+        async def work():
+            return {}
+
+        job = await queue.submit(work)
+        await finished(queue, job.id)
+        clock.now += 59
+        assert await queue.get(job.id) is not None
+        clock.now += 2
+        assert await queue.get(job.id) is None
+        assert queue.stats()["jobs"] == 0
+        await queue.close()
+
+    async def test_status_is_shared_through_the_store(self, tmp_path):
+        """Test that another worker sharing the store can report on a job it did not run."""
+        path = str(tmp_path / "store.db")
+        queue = JobQueue(store=PersistentStore(path))
+        other = JobQueue(store=PersistentStore(path))
+
+        async def work():
+            return {"answer": 42}
+
+        job = await queue.submit(work)
+        await finished(queue, job.id)
+        assert (await other.get(job.id))["result"] == {"answer": 42}
+        assert await other.get("missing") is None
+        await queue.close()
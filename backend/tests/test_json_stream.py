@@ -0,0 +1,96 @@
+import json
+import pytest
+from app.services.json_stream import StreamingJSONParser, salvage_json_object
+
+
+DOCUMENT = json.dumps({
+    "next_action": {"task": "Call \"Bob\"", "step": "Find number", "minutes": 3},
+    "priorities": {"must": ["Call \"Bob\""], "should": [], "optional": ["Buy milk"]},
+    "breakdown": {
+        "Call \"Bob\"": {"steps": [{"step": "Find number, then dial }", "minutes": 3}]},
+        "Buy milk": {"steps": []}
+    }
+}, indent=2)
+
+
+def feed_in_chunks(parser, text, size):
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return events
+
+
+class TestStreamingJSONParser:
+    """Test suite for the incremental JSON scanner."""
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 5, 64, 10000])
+    def test_events_independent_of_chunking(self, chunk_size):
+        """Test that any chunking yields the same completed values."""
+        parser = StreamingJSONParser(max_depth=2)
+        events = feed_in_chunks(parser, DOCUMENT, chunk_size)
+        paths = [path for path, _ in events if len(path) == 1 or path[0] == "breakdown"]
+        assert paths == [
+            ("next_action",),
+            ("priorities",),
+            ("breakdown", "Call \"Bob\""),
+            ("breakdown", "Buy milk"),
+            ("breakdown",),
+        ]
+        assert parser.done
+
+    def test_values_are_decoded(self):
+        """Test that reported values are decoded JSON, escapes included."""
+        parser = StreamingJSONParser(max_depth=2)
+        events = dict(parser.feed(DOCUMENT))
+        assert events[("next_action",)]["task"] == "Call \"Bob\""
+        assert events[("breakdown", "Call \"Bob\"")]["steps"][0]["step"] == "Find number, then dial }"
+
+    def test_value_reported_before_document_ends(self):
+        """Test that a value is reported as soon as it closes."""
+        parser = StreamingJSONParser(max_depth=1)
+        events = parser.feed('{"next_action": {"task": "A", "step": "B"}, "priorities": {"mu')
+        assert events == [(("next_action",), {"task": "A", "step": "B"})]
+        assert not parser.done
+        assert parser.open_path() == ("priorities",)
+
+    def test_array_indices_in_paths(self):
+        """Test that array elements are addressed by index."""
+        parser = StreamingJSONParser(max_depth=3)
+        events = parser.feed('{"p": {"must": ["a", "b", "c')
+        assert events == [(("p", "must", 0), "a"), (("p", "must", 1), "b")]
+
+    def test_leading_text_is_skipped(self):
+        """Test that text before the opening brace is ignored."""
+        parser = StreamingJSONParser(max_depth=1)
+        events = parser.feed('```json\n{"a": 1, "b": null}\n```')
+        assert events == [(("a",), 1), (("b",), None)]
+        assert parser.done
+
+
+class TestSalvageJSONObject:
+    """Test suite for recovering truncated JSON."""
+
+    def test_complete_document_round_trips(self):
+        """Test that a complete document is recovered unchanged."""
+        assert salvage_json_object(DOCUMENT) == json.loads(DOCUMENT)
+
+    def test_truncated_inside_breakdown(self):
+        """Test that only complete breakdowns survive a cut mid-breakdown."""
+        cut = DOCUMENT.index('"Buy milk": {') + 20
+        result = salvage_json_object(DOCUMENT[:cut])
+        assert result["next_action"]["step"] == "Find number"
+        assert result["priorities"]["optional"] == ["Buy milk"]
+        assert list(result["breakdown"]) == ["Call \"Bob\""]
+
+    def test_partial_priority_lists_are_kept(self):
+        """Test that closed list items are recovered from an open list."""
+        result = salvage_json_object('{"priorities": {"must": ["A", "B"], "should": ["C", "D')
+        assert result == {"priorities": {"must": ["A", "B"], "should": ["C"]}}
+
+    def test_trailing_garbage(self):
+        """Test that extra text after the object does not lose the object."""
+        assert salvage_json_object('{"a": 1} trailing') == {"a": 1}
+
+    def test_nothing_recoverable(self):
+        """Test that non-JSON text yields an empty result."""
+        assert salvage_json_object("not json at all") == {}
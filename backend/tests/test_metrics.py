@@ -0,0 +1,154 @@
+import os
+import subprocess
+import sys
+import pytest
+from unittest.mock import patch
+from app.services.metrics import Histogram, MetricsDirectory, MetricsRegistry
+
+
+class TestMetricsRegistry:
+    """Test suite for the metrics registry."""
+
+    def test_counter_is_created_once(self):
+        """Test that a counter name maps to a single instance."""
+        registry = MetricsRegistry()
+        first = registry.counter("requests_total", "Requests")
+        second = registry.counter("requests_total", "Requests")
+        assert first is second
+
+    def test_counter_increments(self):
+        """Test that counter increments show up in the snapshot."""
+        registry = MetricsRegistry()
+        counter = registry.counter("requests_total", "Requests")
+        counter.inc()
+        counter.inc(2)
+        assert registry.snapshot() == {"requests_total": 3}
+
+    def test_labeled_counters(self):
+        """Test that each label set is its own counter under one name."""
+        registry = MetricsRegistry()
+        registry.counter("errors_total", "Errors", labels={"error": "ValueError"}).inc()
+        registry.counter("errors_total", "Errors", labels={"error": "TimeoutError"}).inc(2)
+        assert registry.snapshot() == {
+            'errors_total{error="ValueError"}': 1,
+            'errors_total{error="TimeoutError"}': 2,
+        }
+
+    def test_gauge_goes_up_and_down(self):
+        """Test that a gauge can be raised, lowered and set."""
+        registry = MetricsRegistry()
+        gauge = registry.gauge("queue_depth", "Queued items")
+        gauge.inc(3)
+        gauge.dec()
+        assert registry.snapshot() == {"queue_depth": 2}
+        gauge.set(7)
+        assert "# TYPE queue_depth gauge\nqueue_depth 7\n" in registry.render()
+
+
+class TestHistogram:
+    """Test suite for histograms."""
+
+    def test_observe_fills_buckets(self):
+        """Test that observations land in the first bucket whose bound is not exceeded."""
+        histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.count == 4
+        assert histogram.sum == pytest.approx(3.65)
+
+    def test_time_observes_duration(self):
+        """Test that the timer context manager records one observation."""
+        histogram = Histogram("latency_seconds", "Latency")
+        with histogram.time():
+            pass
+        assert histogram.count == 1
+
+
+class TestPrometheusRendering:
+    """Test suite for the Prometheus text format."""
+
+    def test_render(self):
+        """Test that counters and cumulative histogram buckets are rendered."""
+        registry = MetricsRegistry()
+        registry.counter("requests_total", "Requests").inc(3)
+        registry.counter("errors_total", "Errors", labels={"error": 'Bad "quote"'}).inc()
+        histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+
+        text = registry.render()
+
+        assert "# TYPE requests_total counter\nrequests_total 3\n" in text
+        assert 'errors_total{error="Bad \\"quote\\""} 1' in text
+        assert "# TYPE latency_seconds histogram" in text
+        assert 'latency_seconds_bucket{le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{le="1"} 2' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+        assert "latency_seconds_count 2" in text
+
+
+@pytest.fixture
+def dead_pid():
+    """The id of a process that has already exited."""
+    process = subprocess.Popen([sys.executable, "-c", ""])
+    process.wait()
+    return process.pid
+
+
+def worker_registry(requests: int, latency: float, queued: int) -> MetricsRegistry:
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests").inc(requests)
+    registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)).observe(latency)
+    registry.gauge("queue_depth", "Queued items").set(queued)
+    return registry
+
+
+class TestMetricsDirectory:
+    """Test suite for metrics shared by pre-forked workers."""
+
+    def test_workers_are_summed(self, tmp_path):
+        """Test that a scrape on either worker reports the counters and histograms of both."""
+        first = MetricsDirectory(str(tmp_path), worker_registry(3, 0.05, 2))
+        second = MetricsDirectory(str(tmp_path), worker_registry(4, 0.5, 1))
+        first.write()
+        with patch("os.getpid", return_value=os.getppid()):
+            second.write()
+
+        text = first.merged().render()
+
+        assert "requests_total 7" in text
+        assert 'latency_seconds_bucket{le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{le="1"} 2' in text
+        assert "latency_seconds_count 2" in text
+        assert "queue_depth 3" in text
+
+    def test_exited_worker_keeps_counters_but_not_gauges(self, tmp_path, dead_pid):
+        """Test that totals do not go backwards when a worker is replaced, while its gauges stop counting."""
+        live = MetricsDirectory(str(tmp_path), worker_registry(3, 0.05, 2))
+        exited = MetricsDirectory(str(tmp_path), worker_registry(4, 0.5, 5))
+        live.write({"jobs": {"running": 0}})
+        with patch("os.getpid", return_value=dead_pid):
+            exited.write({"jobs": {"running": 1}})
+
+        text = live.merged().render()
+
+        assert "requests_total 7" in text
+        assert "latency_seconds_count 2" in text
+        assert "queue_depth 2" in text
+        assert live.worker_stats() == {str(os.getpid()): {"jobs": {"running": 0}}}
+
+    def test_write_without_stats_keeps_the_last(self, tmp_path):
+        """Test that a metrics-only write does not drop the stats this worker published before."""
+        directory = MetricsDirectory(str(tmp_path), MetricsRegistry())
+        directory.write({"admission": {"in_flight": 1}})
+        directory.write()
+        assert directory.worker_stats() == {str(os.getpid()): {"admission": {"in_flight": 1}}}
+
+    def test_clear_removes_earlier_snapshots(self, tmp_path):
+        """Test that a new run does not start from the last run's totals."""
+        directory = MetricsDirectory(str(tmp_path / "metrics"), worker_registry(3, 0.05, 2))
+        directory.clear()
+        directory.write()
+        directory.clear()
+        assert directory.read() == []
@@ -1,5 +1,14 @@
 import pytest
-from app.services.parser import parse_tasks, validate_task_count
+import io
+from app.services.parser import (
+    ParsedTask,
+    iter_tasks,
+    parse_task_records,
+    parse_tasks,
+    presort_tasks,
+    task_parents,
+    validate_task_count,
+)
 
 
 class TestTaskParser:
@@ -84,3 +93,155 @@ class TestTaskParser:
         result = parse_tasks(input_text)
         assert len(result) >= 3
 
+
+class TestTaskRecords:
+    """Test suite for structured task parsing."""
+    
+    @pytest.mark.parametrize("task,level", [
+        ("Submit report today", 3),
+        ("URGENT: fix login bug", 3),
+        ("Pay rent by Friday", 2),
+        ("Send slides before 5pm", 2),
+        ("Call plumber tomorrow", 2),
+        ("Plan trip next week", 1),
+        ("Review slides on Tues", 2),
+        ("Buy milk", 0),
+    ])
+    def test_urgency_level(self, task, level):
+        """Test that deadline phrases and markers map to the expected urgency."""
+        assert ParsedTask(task).urgency == level
+    
+    @pytest.mark.parametrize("task", [
+        "Work on wedding invitations",
+        "Focus on monitor setup",
+        "Read up on satellite tech",
+        "Decide on sundial design",
+        "Sort files for now",
+        "Review deadline policy",
+    ])
+    def test_ordinary_words_are_not_deadlines(self, task):
+        """Test that words starting like day names, a plain "now" or "deadline", carry no urgency."""
+        record = ParsedTask(task)
+        assert record.deadline is None
+        assert record.urgency == 0
+        assert record.title == task
+    
+    def test_extracts_deadline_and_effort(self):
+        """Test that deadline and effort are extracted and stripped from the title."""
+        record = ParsedTask("Do taxes by 10/18 (2 hours)")
+        assert record.text == "Do taxes by 10/18 (2 hours)"
+        assert record.title == "Do taxes"
+        assert record.deadline == "by 10/18"
+        assert record.effort_minutes == 120
+        assert record.urgency == 2
+    
+    @pytest.mark.parametrize("task,minutes", [
+        ("Gym 45m", 45),
+        ("Read for half an hour", 30),
+        ("Fix bug 1.5h", 90),
+        ("Call mom (15 min)", 15),
+        ("Build 2 m shelf", None),
+    ])
+    def test_effort_units(self, task, minutes):
+        """Test the supported effort notations."""
+        assert ParsedTask(task).effort_minutes == minutes
+    
+    def test_urgency_markers(self):
+        """Test that urgency markers are recorded and removed from the title."""
+        record = ParsedTask("URGENT: fix login bug")
+        assert record.markers == ("urgent",)
+        assert record.title == "fix login bug"
+        assert record.annotation() == "[urgent]"
+    
+    def test_no_details(self):
+        """Test that plain tasks keep their text as title and have no annotation."""
+        record = ParsedTask("Buy milk")
+        assert record.title == "Buy milk"
+        assert record.deadline is None
+        assert record.effort_minutes is None
+        assert record.annotation() == ""
+    
+    def test_slots(self):
+        """Test that records are compact slotted objects."""
+        with pytest.raises(AttributeError):
+            ParsedTask("Buy milk").extra = 1
+    
+    def test_nested_sub_bullets(self):
+        """Test that indented items are linked to their parent."""
+        records = parse_task_records("- Plan offsite\n    - Book venue\n    - Email team\n- Buy milk")
+        assert [r.text for r in records] == ["Plan offsite", "Book venue", "Email team", "Buy milk"]
+        assert records[0].children == [1, 2]
+        assert records[1].parent == 0
+        assert records[3].parent is None
+    
+    def test_task_parents(self):
+        """Test that sub-items map to the text of the task they are nested under, at any depth."""
+        records = parse_task_records("- Plan trip\n  - Book hotel\n    - Compare prices\n- Buy milk")
+        assert task_parents(records) == {"Book hotel": "Plan trip", "Compare prices": "Book hotel"}
+    
+    @pytest.mark.parametrize("input_text", [
+        "- Task 1\n- Task 2\n- Task 3",
+        "1. First task\n2. Second task",
+        "Task 1, Task 2, Task 3",
+        "Task 1\nTask 1\nTask 2",
+        "   ",
+        "I need to:\n  - Write a report\n  - Call my client",
+        "\tIndented first line\nSecond",
+    ])
+    def test_same_tasks_as_parse_tasks(self, input_text):
+        """Test that records cover exactly the tasks parse_tasks returns."""
+        assert [r.text for r in parse_task_records(input_text)] == parse_tasks(input_text)
+    
+    def test_annotation_names_parent(self):
+        """Test that a sub-item's hint names the task it belongs to, ahead of its other details."""
+        record = ParsedTask("Book hotel by Friday")
+        assert record.annotation("Plan trip") == "[part of: Plan trip | deadline: by Friday]"
+    
+    def test_presort_by_urgency(self):
+        """Test that urgent tasks come first and ties keep input order."""
+        records = [ParsedTask(t) for t in ["Buy milk", "Pay rent by Friday", "Email Bob", "Fix bug asap"]]
+        assert [r.text for r in presort_tasks(records)] == [
+            "Fix bug asap", "Pay rent by Friday", "Buy milk", "Email Bob"
+        ]
+
+
+class TestStreamingParser:
+    """Tests for the streaming iter_tasks API."""
+    
+    @pytest.mark.parametrize("input_text", [
+        "- Task 1\n- Task 2\n- Task 3",
+        "1. First task\n2. Second task",
+        "Task 1, Task 2, Task 3",
+        "Task 1, Task 1",
+        "Task 1\nTask 1\nTask 2",
+        "\n\n   \nOnly one, with comma\n\n",
+        "Buy milk, eggs\nCall mom",
+        "   ",
+        "",
+    ])
+    def test_same_tasks_as_parse_tasks(self, input_text):
+        """Test that streaming yields exactly what parse_tasks returns."""
+        assert list(iter_tasks(input_text)) == parse_tasks(input_text)
+    
+    def test_chunk_boundaries(self):
+        """Test that lines split across chunks are reassembled."""
+        text = "- Write report\n- Call client\n- (a) Pay rent\n- write report"
+        chunks = [text[i:i + 3] for i in range(0, len(text), 3)]
+        assert list(iter_tasks(chunks)) == parse_tasks(text)
+    
+    def test_file_object(self):
+        """Test that a text file object is consumed in small reads."""
+        text = "\n".join(f"{i}. Task number {i}" for i in range(1, 1001))
+        tasks = list(iter_tasks(io.StringIO(text), chunk_size=17))
+        assert len(tasks) == 1000
+        assert tasks[0] == "Task number 1"
+        assert tasks == parse_tasks(text)
+    
+    def test_lazy(self):
+        """Test that tasks are yielded before the input is exhausted."""
+        def chunks():
+            yield "Task 1\nTask 2\n"
+            raise AssertionError("read past the first tasks")
+        
+        stream = iter_tasks(chunks())
+        assert next(stream) == "Task 1"
@@ -0,0 +1,100 @@
+import pytest
+from app.models.schemas import TaskAnalysisResponse
+from app.services.prioritizer import HeuristicPrioritizer, RoutingPolicy
+
+
+class TestHeuristicPrioritizer:
+    """Test suite for the local prioritization engine."""
+
+    @pytest.fixture
+    def engine(self):
+        return HeuristicPrioritizer()
+
+    def test_returns_valid_response(self, engine):
+        """Test that every task is bucketed once and broken down."""
+        tasks = ["Buy milk", "Email Bob about invoice", "Pay rent by Friday", "Clean garage maybe"]
+        result = engine.analyze(tasks)
+
+        assert isinstance(result, TaskAnalysisResponse)
+        bucketed = result.priorities["must"] + result.priorities["should"] + result.priorities["optional"]
+        assert sorted(bucketed) == sorted(tasks)
+        assert set(result.breakdown) == set(tasks)
+        assert all(len(b.steps) >= 2 for b in result.breakdown.values())
+
+    def test_buckets(self, engine):
+        """Test that deadlines, impact and optional markers drive the buckets."""
+        result = engine.analyze(["Buy milk", "Pay rent by Friday", "Clean garage maybe"])
+        assert result.priorities["must"] == ["Pay rent by Friday"]
+        assert result.priorities["should"] == ["Buy milk"]
+        assert result.priorities["optional"] == ["Clean garage maybe"]
+
+    def test_words_like_day_names_are_not_deadlines(self, engine):
+        """Test that "on wedding ..." neither promotes a task nor is cut from its steps."""
+        result = engine.analyze(["Work on wedding invitations", "Pay rent by Friday"])
+        assert result.priorities["must"] == ["Pay rent by Friday"]
+        steps = " ".join(step.step for step in result.breakdown["Work on wedding invitations"].steps)
+        assert "wedding" in steps
+
+    def test_next_action_from_top_bucket(self, engine):
+        """Test that the next action is the first step of a must task."""
+        result = engine.analyze(["Buy milk", "Call dentist today"])
+        assert result.next_action.task == "Call dentist today"
+        assert result.next_action.step == result.breakdown["Call dentist today"].steps[0].step
+        assert 2 <= result.next_action.minutes <= 5
+
+    def test_verb_templates(self, engine):
+        """Test that the leading verb selects the breakdown template."""
+        steps = engine.breakdown("Call dentist").steps
+        assert steps[0].step == "Look up the number for dentist"
+
+    def test_deadline_not_repeated_in_steps(self, engine):
+        """Test that extracted deadline phrases are left out of the step text."""
+        steps = engine.breakdown("Pay rent by Friday").steps
+        assert steps[0].step == "Find the bill or account for rent"
+
+    def test_unknown_verb_gets_generic_steps(self, engine):
+        """Test that unknown verbs still get a usable breakdown."""
+        steps = engine.breakdown("Quarterly planning").steps
+        assert "Quarterly planning" in steps[0].step
+
+    def test_deterministic(self, engine):
+        """Test that the same input gives the same output."""
+        tasks = ["Buy milk", "Email Bob", "Pay rent"]
+        assert engine.analyze(tasks) == engine.analyze(tasks)
+
+    def test_empty_list(self, engine):
+        """Test that an empty list raises error."""
+        with pytest.raises(ValueError, match="cannot be empty"):
+            engine.analyze([])
+
+
+class TestRoutingPolicy:
+    """Test suite for local/LLM routing."""
+
+    def test_auto_routes_simple_lists_locally(self):
+        """Test that short lists with known verbs stay local."""
+        assert RoutingPolicy(mode="auto").use_local(["Buy milk", "Email Bob"])
+
+    def test_auto_escalates_unknown_verbs(self):
+        """Test that tasks without a template go to the LLM."""
+        assert not RoutingPolicy(mode="auto").use_local(["Buy milk", "Quarterly planning offsite"])
+
+    def test_auto_escalates_long_lists(self):
+        """Test that lists above max_tasks go to the LLM."""
+        policy = RoutingPolicy(mode="auto", max_tasks=2)
+        assert not policy.use_local(["Buy milk", "Email Bob", "Call mom"])
+
+    def test_auto_escalates_long_tasks(self):
+        """Test that wordy tasks go to the LLM."""
+        policy = RoutingPolicy(mode="auto", max_words=3)
+        assert not policy.use_local(["Email Bob about the budget review"])
+
+    def test_fixed_modes(self):
+        """Test that llm and local modes ignore the heuristics."""
+        assert not RoutingPolicy(mode="llm").use_local(["Buy milk"])
+        assert RoutingPolicy(mode="local").use_local(["Quarterly planning offsite"])
+
+    def test_unknown_mode(self):
+        """Test that an invalid mode raises error."""
+        with pytest.raises(ValueError, match="Unknown prioritizer mode"):
+            RoutingPolicy(mode="magic")
@@ -0,0 +1,234 @@
+import asyncio
+import httpx
+import openai
+import pytest
+from app.services.resilience import (
+    CircuitBreaker,
+    HEDGE_WINS,
+    HEDGES_SENT,
+    LLM_RETRIES,
+    Deadline,
+    DeadlineExceeded,
+    LatencyTracker,
+    RetryPolicy,
+    current_deadline,
+    deadline_scope,
+    hedge,
+    iterate_within,
+    retry_async,
+    retry_sync,
+)
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+def status_error(status_code):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return openai.APIStatusError("error", response=httpx.Response(status_code, request=request), body=None)
+
+
+class TestDeadline:
+    """Test suite for deadline propagation."""
+
+    def test_scope_sets_current_deadline(self):
+        """Test that the deadline is visible inside the scope only."""
+        assert current_deadline() is None
+        with deadline_scope(5) as deadline:
+            assert current_deadline() is deadline
+            assert 0 < deadline.remaining() <= 5
+        assert current_deadline() is None
+
+    def test_nested_scope_never_extends(self):
+        """Test that an inner scope keeps the tighter outer deadline."""
+        with deadline_scope(1) as outer:
+            with deadline_scope(60) as inner:
+                assert inner is outer
+
+    async def test_spawned_tasks_inherit_deadline(self):
+        """Test that tasks created inside the scope see the same deadline."""
+        async def read_deadline():
+            return current_deadline()
+
+        with deadline_scope(5) as deadline:
+            assert await asyncio.ensure_future(read_deadline()) is deadline
+
+
+class TestRetries:
+    """Test suite for deadline-aware retries."""
+
+    def test_retryable_errors(self):
+        """Test which errors are retried."""
+        policy = RetryPolicy()
+        assert policy.is_retryable(connection_error())
+        assert policy.is_retryable(status_error(429))
+        assert policy.is_retryable(status_error(503))
+        assert not policy.is_retryable(status_error(400))
+        assert not policy.is_retryable(ValueError("bad"))
+
+    async def test_retries_until_success(self):
+        """Test that retryable errors are retried and counted."""
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise connection_error()
+            return "ok"
+
+        before = LLM_RETRIES.value
+        result = await retry_async(flaky, RetryPolicy(base_delay=0.001), Deadline(5))
+        assert result == "ok"
+        assert len(calls) == 3
+        assert LLM_RETRIES.value == before + 2
+
+    async def test_non_retryable_error_fails_fast(self):
+        """Test that client errors are raised on the first attempt."""
+        calls = []
+
+        async def bad_request():
+            calls.append(1)
+            raise status_error(400)
+
+        with pytest.raises(openai.APIStatusError):
+            await retry_async(bad_request, RetryPolicy(base_delay=0.001), Deadline(5))
+        assert len(calls) == 1
+
+    async def test_deadline_cuts_off_slow_call(self):
+        """Test that a call outliving the deadline raises DeadlineExceeded."""
+        async def slow():
+            await asyncio.sleep(1)
+
+        with pytest.raises(DeadlineExceeded):
+            await retry_async(slow, RetryPolicy(), Deadline(0.01))
+
+    async def test_iterate_within_stops_stalled_iteration(self):
+        """Test that items arriving in time are passed on and a stall ends at the deadline."""
+        async def stalls_after_two():
+            yield 1
+            yield 2
+            await asyncio.sleep(1)
+            yield 3
+
+        received = []
+        with pytest.raises(DeadlineExceeded):
+            async for item in iterate_within(stalls_after_two(), Deadline(0.05)):
+                received.append(item)
+        assert received == [1, 2]
+
+    def test_retry_sync_passes_remaining_time(self):
+        """Test that the blocking variant hands the remaining budget to each attempt."""
+        timeouts = []
+
+        def flaky(remaining):
+            timeouts.append(remaining)
+            if len(timeouts) == 1:
+                raise status_error(500)
+            return "ok"
+
+        assert retry_sync(flaky, RetryPolicy(base_delay=0.001), Deadline(5)) == "ok"
+        assert all(0 < timeout <= 5 for timeout in timeouts)
+
+
+class TestHedging:
+    """Test suite for hedged calls."""
+
+    def test_latency_percentile(self):
+        """Test that percentiles need a minimum number of samples."""
+        tracker = LatencyTracker(min_samples=10)
+        for i in range(9):
+            tracker.record(i / 10)
+        assert tracker.percentile(0.9) is None
+        tracker.record(0.9)
+        assert tracker.percentile(0.9) == 0.9
+
+    async def test_hedge_wins_when_first_call_is_slow(self):
+        """Test that a second call is fired after the delay and can win."""
+        delays = [1.0, 0.0]
+
+        async def call():
+            delay = delays.pop(0)
+            await asyncio.sleep(delay)
+            return delay
+
+        sent, wins = HEDGES_SENT.value, HEDGE_WINS.value
+        assert await hedge(call, 0.01) == 0.0
+        assert HEDGES_SENT.value == sent + 1
+        assert HEDGE_WINS.value == wins + 1
+
+    async def test_no_hedge_when_first_call_is_fast(self):
+        """Test that fast calls never trigger a hedge."""
+        async def call():
+            return "fast"
+
+        sent = HEDGES_SENT.value
+        assert await hedge(call, 0.5) == "fast"
+        assert HEDGES_SENT.value == sent
+
+    async def test_hedge_survives_one_failure(self):
+        """Test that the surviving call's result is used when the other fails."""
+        outcomes = [connection_error(), "ok"]
+
+        async def call():
+            outcome = outcomes.pop(0)
+            await asyncio.sleep(0.02)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        assert await hedge(call, 0.01) == "ok"
+
+
+class TestCircuitBreaker:
+    """Test suite for the LLM circuit breaker."""
+
+    def test_trips_on_error_rate(self):
+        """Test that the breaker opens once enough calls fail."""
+        breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, window=10)
+        breaker.record_success(1)
+        breaker.record_failure()
+        breaker.record_success(1)
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow()
+
+    def test_trips_on_slow_calls(self):
+        """Test that calls over the latency limit count as bad."""
+        breaker = CircuitBreaker(min_calls=2, slow_call_seconds=5)
+        breaker.record_success(30)
+        breaker.record_success(30)
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_half_open_probe_recovers(self, clock):
+        """Test that one probe is allowed after the open period and success closes the breaker."""
+        breaker = CircuitBreaker(min_calls=1, open_seconds=10, clock=clock)
+        breaker.record_failure()
+        clock.now += 10
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success(1)
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow()
+
+    def test_failed_probe_reopens(self, clock):
+        """Test that a failing probe opens the breaker for another period."""
+        breaker = CircuitBreaker(min_calls=1, open_seconds=10, clock=clock)
+        breaker.record_failure()
+        clock.now += 10
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        clock.now += 5
+        assert not breaker.allow()
+
+    def test_lost_probe_is_replaced(self, clock):
+        """Test that a probe that never reports back does not wedge the breaker."""
+        breaker = CircuitBreaker(min_calls=1, open_seconds=10, clock=clock)
+        breaker.record_failure()
+        clock.now += 10
+        assert breaker.allow()
+        clock.now += 10
+        assert breaker.allow()
@@ -1,6 +1,8 @@
 import pytest
 from pydantic import ValidationError
 from app.models.schemas import (
+    MAX_INPUT_CHARS,
+    BatchAnalysisRequest,
     TaskAnalysisRequest,
     TaskStep,
     TaskBreakdown,
@@ -29,16 +31,40 @@ class TestTaskAnalysisRequest:
     
     def test_tasks_too_long(self):
         """Test that tasks exceeding max length raises error."""
-        long_text = "a" * 2001
+        long_text = "a" * (MAX_INPUT_CHARS + 1)
         with pytest.raises(ValidationError):
             TaskAnalysisRequest(tasks=long_text)
     
+    def test_max_tasks_fit_in_input(self):
+        """Test that the default input limit leaves room for MAX_TASKS ordinary tasks."""
+        text = "\n".join(f"- Task {i}: " + "x" * 85 for i in range(500))
+        assert len(TaskAnalysisRequest(tasks=text).tasks) <= MAX_INPUT_CHARS
+    
     def test_tasks_stripped(self):
         """Test that tasks are stripped of leading/trailing whitespace."""
         request = TaskAnalysisRequest(tasks="  Write report  ")
         assert request.tasks == "Write report"
 
 
+class TestBatchAnalysisRequest:
+    """Test suite for BatchAnalysisRequest model."""
+    
+    def test_valid_request(self):
+        """Test valid batch request."""
+        request = BatchAnalysisRequest(items=["Write report", "Call client, Buy milk"])
+        assert len(request.items) == 2
+    
+    def test_empty_batch(self):
+        """Test that an empty batch raises error."""
+        with pytest.raises(ValidationError):
+            BatchAnalysisRequest(items=[])
+    
+    def test_too_many_items(self):
+        """Test that batches above the item limit raise error."""
+        with pytest.raises(ValidationError):
+            BatchAnalysisRequest(items=["Task"] * 101)
+
+
 class TestTaskStep:
     """Test suite for TaskStep model."""
     
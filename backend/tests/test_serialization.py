@@ -0,0 +1,55 @@
+import json
+import pytest
+from unittest.mock import patch
+from pydantic import ValidationError
+from app.models.schemas import TaskAnalysisResponse
+from app.services import serialization
+from app.services.serialization import dumps, loads, render_analysis, validate_analysis
+
+
+ANALYSIS = {
+    "priorities": {"must": ["Café order"], "should": [], "optional": []},
+    "breakdown": {"Café order": {"steps": [{"step": "Open menu", "minutes": 2}]}},
+    "next_action": {"task": "Café order", "step": "Open menu", "minutes": 2},
+}
+
+
+class TestSerialization:
+    """Test suite for the JSON helpers."""
+
+    def test_validate_analysis_builds_models(self):
+        """Test that a plain dict tree is validated into nested models in one call."""
+        result = validate_analysis(ANALYSIS)
+        assert isinstance(result, TaskAnalysisResponse)
+        assert result.breakdown["Café order"].steps[0].minutes == 2
+        assert result.degraded is False
+
+    def test_validate_analysis_rejects_invalid_steps(self):
+        """Test that the single validation pass still enforces field constraints."""
+        invalid = {**ANALYSIS, "breakdown": {"Café order": {"steps": [{"step": "Open menu", "minutes": 90}]}}}
+        with pytest.raises(ValidationError):
+            validate_analysis(invalid)
+
+    def test_render_analysis_matches_model_dump(self):
+        """Test that the rendered body decodes to the model's own dump, non-ASCII intact."""
+        result = validate_analysis(ANALYSIS)
+        body = render_analysis(result)
+        assert json.loads(body) == result.model_dump()
+        assert "Café".encode("utf-8") in body
+
+    @pytest.mark.parametrize("fast", [True, False])
+    def test_dumps_and_loads_round_trip(self, fast):
+        """Test compact UTF-8 output with and without orjson."""
+        module = serialization.orjson if fast else None
+        with patch.object(serialization, "orjson", module):
+            body = dumps({"task": "Café", "n": [1, 2]})
+            assert body == '{"task":"Café","n":[1,2]}'.encode("utf-8")
+            assert loads(body) == {"task": "Café", "n": [1, 2]}
+
+    @pytest.mark.parametrize("fast", [True, False])
+    def test_loads_raises_json_decode_error(self, fast):
+        """Test that invalid JSON raises json.JSONDecodeError with either backend."""
+        module = serialization.orjson if fast else None
+        with patch.object(serialization, "orjson", module):
+            with pytest.raises(json.JSONDecodeError):
+                loads('{"priorities": ')
@@ -0,0 +1,47 @@
+import os
+from unittest.mock import patch
+from app.serve import DEFAULT_WORKERS, share_metrics, worker_count
+
+
+class TestWorkerCount:
+    """Test suite for the pre-fork worker count."""
+
+    def test_web_concurrency_is_used(self):
+        """Test that WEB_CONCURRENCY sets the number of workers, at least one."""
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": "3"}):
+            assert worker_count() == 3
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": "0"}):
+            assert worker_count() == 1
+
+    def test_default_does_not_follow_cpu_count(self):
+        """Test that without WEB_CONCURRENCY the fixed default is used, however many CPUs there are."""
+        with patch.dict(os.environ, {}, clear=True), patch("os.cpu_count", return_value=64):
+            assert worker_count() == DEFAULT_WORKERS
+
+
+class TestShareMetrics:
+    """Test suite for the metrics directory shared by the workers."""
+
+    def test_several_workers_get_a_fresh_directory(self):
+        """Test that without METRICS_DIR, several workers share a new temporary directory."""
+        with patch.dict(os.environ, {}, clear=True):
+            created = share_metrics(2)
+            try:
+                assert created is not None
+                assert os.environ["METRICS_DIR"] == created
+                assert os.listdir(created) == []
+            finally:
+                os.rmdir(created)
+
+    def test_configured_directory_is_cleared(self, tmp_path):
+        """Test that METRICS_DIR is kept but emptied of an earlier run's snapshots."""
+        (tmp_path / "123.json").write_text("{}")
+        with patch.dict(os.environ, {"METRICS_DIR": str(tmp_path)}, clear=True):
+            assert share_metrics(2) is None
+        assert list(tmp_path.iterdir()) == []
+
+    def test_single_worker_shares_nothing(self):
+        """Test that one worker keeps its metrics in process."""
+        with patch.dict(os.environ, {}, clear=True):
+            assert share_metrics(1) is None
+            assert "METRICS_DIR" not in os.environ
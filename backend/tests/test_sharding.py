@@ -0,0 +1,76 @@
+import pytest
+from app.models.schemas import TaskAnalysisResponse, TaskBreakdown, TaskStep, NextAction
+from app.services.sharding import merge_shard_results, split_into_shards
+
+
+def make_shard_result(must, should, optional, next_task, next_minutes=2):
+    """Build a shard analysis where every task has a two-step breakdown."""
+    tasks = must + should + optional
+    return TaskAnalysisResponse(
+        priorities={"must": must, "should": should, "optional": optional},
+        breakdown={
+            task: TaskBreakdown(steps=[
+                TaskStep(step=f"Open {task}", minutes=next_minutes),
+                TaskStep(step=f"Finish {task}", minutes=15)
+            ])
+            for task in tasks
+        },
+        next_action=NextAction(task=next_task, step=f"Open {next_task}", minutes=next_minutes)
+    )
+
+
+class TestSplitIntoShards:
+    """Test suite for task sharding."""
+
+    def test_small_list_is_one_shard(self):
+        """Test that lists within the shard size are not split."""
+        tasks = ["a", "b", "c"]
+        assert split_into_shards(tasks, 5) == [tasks]
+
+    def test_shards_are_balanced_and_ordered(self):
+        """Test that shards have near-equal sizes and keep task order."""
+        tasks = [f"Task {i}" for i in range(45)]
+        shards = split_into_shards(tasks, 20)
+        assert [len(shard) for shard in shards] == [15, 15, 15]
+        assert [task for shard in shards for task in shard] == tasks
+
+    def test_no_shard_exceeds_size(self):
+        """Test that every shard respects the maximum size."""
+        tasks = [f"Task {i}" for i in range(101)]
+        shards = split_into_shards(tasks, 20)
+        assert max(len(shard) for shard in shards) <= 20
+        assert sum(len(shard) for shard in shards) == 101
+
+
+class TestMergeShardResults:
+    """Test suite for merging shard analyses."""
+
+    def test_buckets_interleaved(self):
+        """Test that each shard's top tasks lead the merged buckets."""
+        first = make_shard_result(["A1", "A2"], ["A3"], [], "A1")
+        second = make_shard_result(["B1"], ["B2"], ["B3"], "B1")
+        merged = merge_shard_results([first, second])
+        assert merged.priorities["must"] == ["A1", "B1", "A2"]
+        assert merged.priorities["should"] == ["A3", "B2"]
+        assert merged.priorities["optional"] == ["B3"]
+        assert set(merged.breakdown) == {"A1", "A2", "A3", "B1", "B2", "B3"}
+
+    def test_next_action_from_highest_bucket(self):
+        """Test that a must-task next action beats a should-task one."""
+        first = make_shard_result([], ["A1"], [], "A1", next_minutes=2)
+        second = make_shard_result(["B1"], [], [], "B1", next_minutes=5)
+        merged = merge_shard_results([first, second])
+        assert merged.next_action.task == "B1"
+
+    def test_next_action_prefers_shortest_step(self):
+        """Test that the shortest first step wins within the same bucket."""
+        first = make_shard_result(["A1"], [], [], "A1", next_minutes=5)
+        second = make_shard_result(["B1"], [], [], "B1", next_minutes=3)
+        merged = merge_shard_results([first, second])
+        assert merged.next_action.task == "B1"
+        assert merged.next_action.minutes == 3
+
+    def test_single_result_passthrough(self):
+        """Test that a single shard is returned unchanged."""
+        only = make_shard_result(["A1"], [], [], "A1")
+        assert merge_shard_results([only]) is only
@@ -0,0 +1,114 @@
+import pytest
+from app.services.similarity import SimilarityIndex, task_features
+
+
+class TestTaskFeatures:
+    """Test suite for the features similarity is computed from."""
+
+    def test_abbreviations_and_quarters_are_expanded(self):
+        """Test that shorthand produces the same word features as the spelled-out form."""
+        features = task_features("Prep Q3 rpt")
+        assert "w:prepare" in features
+        assert "w:quarterly" in features
+        assert "w:report" in features
+
+
+class TestSimilarityIndex:
+    """Test suite for the offline task similarity index."""
+
+    @pytest.fixture
+    def index(self):
+        return SimilarityIndex(capacity=100)
+
+    def test_reworded_task_matches(self, index):
+        """Test that a reworded task finds the stored one."""
+        index.add("Prepare Q3 report", "breakdown")
+        [match] = index.lookup_many(["prep the quarterly report"])
+        assert match is not None
+        key, value, score = match
+        assert key == "prepare q3 report"
+        assert value == "breakdown"
+        assert score >= index.threshold
+
+    def test_unrelated_tasks_do_not_match(self, index):
+        """Test that tasks sharing a word but not a meaning stay apart."""
+        index.add("Call mom", "mom")
+        assert index.lookup_many(["Call dentist", "Do taxes"]) == [None, None]
+        assert index.stats()["misses"] == 2
+
+    def test_different_numbers_never_match(self, index):
+        """Test that tasks naming different numbers are not treated as the same task."""
+        index.add("Pay invoice 12", "12")
+        assert index.lookup_many(["Pay invoice 13"]) == [None]
+        assert index.lookup_many(["pay invoice 12"])[0][1] == "12"
+
+    def test_different_labels_and_names_never_match(self):
+        """Test that tasks for another client or person are not treated as the same task."""
+        index = SimilarityIndex(capacity=100, threshold=0.75)
+        index.add("Email client A about the renewal", "client A")
+        index.add("Call Alice about the lease", "Alice")
+        assert index.lookup_many([
+            "Email client B about the renewal",
+            "Call Alicia about the lease",
+        ]) == [None, None]
+        # Specifics named on one side only do not block a match
+        assert index.lookup_many(["email client a about renewal"])[0][1] == "client A"
+
+    def test_threshold(self):
+        """Test that a stricter threshold rejects looser paraphrases."""
+        index = SimilarityIndex(threshold=0.999)
+        index.add("Prepare Q3 report", "breakdown")
+        assert index.lookup_many(["prep the quarterly report"]) == [None]
+
+    def test_add_replaces_same_task(self, index):
+        """Test that adding a task again updates its entry in place."""
+        index.add("Call dentist", "old")
+        index.add("call  dentist", "new")
+        assert len(index) == 1
+        assert index.lookup_many(["Call dentist"])[0][1] == "new"
+
+    def test_grows_incrementally(self):
+        """Test that the matrix grows past its initial size without losing entries."""
+        index = SimilarityIndex(capacity=5000)
+        for i in range(1500):
+            index.add(f"task {i}", i)
+        assert len(index) == 1500
+        assert index.lookup_many(["Task 1499"])[0][1] == 1499
+        assert index.lookup_many(["task 3"])[0][1] == 3
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test that a full index replaces the entry that was matched longest ago."""
+        index = SimilarityIndex(capacity=2)
+        index.add("Call dentist", "dentist")
+        index.add("Do taxes", "taxes")
+        index.lookup_many(["call dentist"])
+        index.add("Water the plants", "plants")
+        assert len(index) == 2
+        assert index.stats()["evictions"] == 1
+        assert index.lookup_many(["Do taxes"]) == [None]
+        assert index.lookup_many(["Call dentist"])[0][1] == "dentist"
+
+    def test_adding_again_counts_as_use(self):
+        """Test that re-adding a task protects it from the next eviction."""
+        index = SimilarityIndex(capacity=2)
+        index.add("Call dentist", "dentist")
+        index.add("Do taxes", "taxes")
+        index.add("Call dentist", "dentist again")
+        index.add("Water the plants", "plants")
+        assert index.lookup_many(["Do taxes"]) == [None]
+        assert index.lookup_many(["Call dentist"])[0][1] == "dentist again"
+
+    def test_dimensions_must_be_power_of_two(self):
+        """Test that the hashing trick's bit mask is only used with a power-of-two width."""
+        with pytest.raises(ValueError, match="power of two"):
+            SimilarityIndex(dimensions=300)
+
+    def test_from_env(self, monkeypatch):
+        """Test that the index is sized from the environment and can be disabled."""
+        monkeypatch.setenv("SIMILARITY_CACHE_SIZE", "10")
+        monkeypatch.setenv("SIMILARITY_THRESHOLD", "0.9")
+        index = SimilarityIndex.from_env()
+        assert index.capacity == 10
+        assert index.threshold == 0.9
+        monkeypatch.setenv("SIMILARITY_CACHE_SIZE", "0")
+        assert SimilarityIndex.from_env() is None
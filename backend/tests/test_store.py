@@ -0,0 +1,100 @@
+import multiprocessing
+import pytest
+from app.services.store import PersistentStore
+
+
+def write_keys(path: str, worker: int, count: int) -> None:
+    store = PersistentStore(path, busy_timeout=5.0)
+    for i in range(count):
+        store.set(f"{worker}:{i}", f"value {worker}-{i}".encode())
+    assert store.errors == 0
+
+
+class TestPersistentStore:
+    """Test suite for the SQLite-backed persistent store."""
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / "store.db")
+
+    def test_round_trip(self, path):
+        """Test that a stored value is returned and counted as a hit."""
+        store = PersistentStore(path)
+        store.set("analysis:abc", b'{"ok":true}')
+        assert store.get("analysis:abc") == b'{"ok":true}'
+        assert store.get("analysis:missing") is None
+        stats = store.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["size"] == 1
+
+    def test_entries_expire(self, path, clock):
+        """Test that entries are not returned after their TTL."""
+        store = PersistentStore(path, ttl_seconds=60, clock=clock)
+        store.set("short", b"1", ttl_seconds=10)
+        store.set("long", b"2")
+        clock.now += 30
+        assert store.get("short") is None
+        assert store.get("long") == b"2"
+
+    def test_prune_removes_expired_and_caps_size(self, path, clock):
+        """Test that pruning drops expired entries, then the soonest-expiring ones above the cap."""
+        store = PersistentStore(path, max_entries=3, ttl_seconds=100, prune_every=1000, clock=clock)
+        store.set("expired", b"x", ttl_seconds=1)
+        for i in range(5):
+            clock.now += 1
+            store.set(f"key{i}", b"x")
+        store._prune(store._connect())
+        assert len(store) == 3
+        assert [store.get(f"key{i}") for i in range(5)] == [None, None, b"x", b"x", b"x"]
+
+    def test_set_many(self, path, clock):
+        """Test that a batch is written in one go and counts towards pruning like single writes."""
+        store = PersistentStore(path, max_entries=2, ttl_seconds=100, prune_every=4, clock=clock)
+        store.set_many({"a": b"1", "b": b"2", "c": b"3"}, ttl_seconds=10)
+        assert [store.get(key) for key in "abc"] == [b"1", b"2", b"3"]
+        store.set_many({})
+        store.set("d", b"4")
+        assert len(store) == 2
+        clock.now += 11
+        assert store.get("d") == b"4"
+        assert store.get("c") is None
+
+    def test_connects_on_first_use(self, tmp_path):
+        """Test that building a store opens nothing, so forked workers inherit no connection."""
+        path = tmp_path / "store.db"
+        store = PersistentStore(str(path))
+        assert not path.exists()
+        store.set("key", b"value")
+        assert path.exists()
+
+    def test_shared_between_instances(self, path):
+        """Test that a second store on the same file (another worker) sees the entries."""
+        PersistentStore(path).set("breakdown:call dentist", b"steps")
+        assert PersistentStore(path).get("breakdown:call dentist") == b"steps"
+
+    def test_concurrent_processes(self, path):
+        """Test that several processes can write to the store at once."""
+        PersistentStore(path)
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=write_keys, args=(path, worker, 50)) for worker in range(4)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        assert all(process.exitcode == 0 for process in workers)
+        assert len(PersistentStore(path)) == 200
+
+    def test_database_errors_are_misses(self, path):
+        """Test that a broken connection is logged and treated as a miss, not raised."""
+        store = PersistentStore(path)
+        store.set("key", b"value")
+        store._connect().close()
+        assert store.get("key") is None
+        store.set("key", b"value")
+        assert store.errors == 2
+
+    def test_from_env_disabled_by_default(self, monkeypatch):
+        """Test that no store is created unless ANALYSIS_STORE_PATH is set."""
+        monkeypatch.delenv("ANALYSIS_STORE_PATH", raising=False)
+        assert PersistentStore.from_env() is None
@@ -0,0 +1,93 @@
+import json
+import pytest
+from app.services.tokens import (
+    BREAKDOWN_TOKENS_PER_TASK,
+    MAX_COMPLETION_TOKENS,
+    MIN_COMPLETION_TOKENS,
+    completion_cap,
+    estimate_tokens,
+    max_completion_tokens,
+    tasks_within,
+)
+
+
+class TestEstimateTokens:
+    """Test suite for the local token estimator."""
+
+    def test_empty_text(self):
+        """Test that empty text has no tokens."""
+        assert estimate_tokens("") == 0
+
+    def test_words_and_punctuation(self):
+        """Test that short words and punctuation count one token each."""
+        assert estimate_tokens("Call the dentist, today!") == 6
+
+    def test_grows_with_text(self):
+        """Test that longer text never estimates fewer tokens."""
+        short = estimate_tokens("Write report")
+        long = estimate_tokens("Write the quarterly report for the board meeting")
+        assert long > short
+
+
+class TestMaxCompletionTokens:
+    """Test suite for completion budget sizing."""
+
+    def test_small_list_gets_floor(self):
+        """Test that tiny lists get at least the minimum budget."""
+        assert max_completion_tokens(["Buy milk"]) == MIN_COMPLETION_TOKENS
+
+    def test_scales_with_task_count(self):
+        """Test that more tasks get a bigger budget."""
+        five = max_completion_tokens([f"Task {i}" for i in range(5)])
+        ten = max_completion_tokens([f"Task {i}" for i in range(10)])
+        assert ten > five
+
+    def test_cached_breakdowns_shrink_budget(self):
+        """Test that tasks with cached breakdowns need fewer output tokens."""
+        tasks = [f"Task {i}" for i in range(10)]
+        assert max_completion_tokens(tasks, known_count=8) < max_completion_tokens(tasks)
+
+    def test_full_breakdown_fits_budget(self):
+        """Test that a realistic eight-step breakdown fits in the per-task budget."""
+        steps = [
+            "Open the quarterly report template in the shared drive",
+            "Pull last quarter's revenue numbers from the finance dashboard",
+            "Write a three-sentence summary of the key results",
+            "Draft the section on customer growth with two charts",
+            "List the three biggest risks and a mitigation for each",
+            "Ask Sam to review the numbers for accuracy",
+            "Fix the comments from the review",
+            "Export the report as PDF and email it to the team",
+        ]
+        breakdown = {"Prepare the quarterly report": {"steps": [{"step": s, "minutes": 10} for s in steps]}}
+        assert estimate_tokens(json.dumps(breakdown)) <= BREAKDOWN_TOKENS_PER_TASK
+
+    def test_capped(self):
+        """Test that huge lists are capped at the maximum budget."""
+        assert max_completion_tokens([f"Task {i}" for i in range(500)]) == MAX_COMPLETION_TOKENS
+
+
+class TestModelBudget:
+    """Test suite for per-model completion limits."""
+
+    @pytest.mark.parametrize("model,cap", [
+        ("gpt-3.5-turbo", 4096),
+        ("gpt-3.5-turbo-0125", 4096),
+        ("gpt-4-turbo", 4096),
+        ("gpt-4o-mini", MAX_COMPLETION_TOKENS),
+        ("some-new-model", MAX_COMPLETION_TOKENS),
+    ])
+    def test_cap_per_model(self, model, cap):
+        """Test that the cap never exceeds what the model can produce, matching dated snapshots by prefix."""
+        assert completion_cap(model) == cap
+
+    def test_cap_bounds_budget(self):
+        """Test that a lower cap clamps the budget of a long list."""
+        assert max_completion_tokens([f"Task {i}" for i in range(50)], cap=4096) == 4096
+
+    @pytest.mark.parametrize("cap", [4096, 8192, 16384])
+    def test_tasks_within_fit_the_cap(self, cap):
+        """Test that the number of tasks said to fit a cap needs no more than the cap."""
+        count = tasks_within(cap)
+        tasks = ["Prepare the quarterly board report"] * count
+        assert max_completion_tokens(tasks, cap=10 ** 6) <= cap
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import threading
+import pytest
+from unittest.mock import patch
+from app.services.tracing import (
+    BatchExporter, JsonlFileExporter, OTLPHttpExporter, current_trace, span, start_trace
+)
+
+
+class TestSpans:
+    """Test suite for request trace spans."""
+
+    def test_span_outside_trace_is_noop(self):
+        """Test that spans cost nothing and record nothing without an active trace."""
+        assert current_trace() is None
+        with span("parse") as recorded:
+            assert recorded is None
+
+    def test_nested_spans_link_to_parent(self):
+        """Test that a span opened inside another records it as its parent."""
+        with start_trace("request") as trace:
+            with span("analyze") as outer:
+                with span("llm", model="gpt-4o-mini") as inner:
+                    pass
+        assert [s.name for s in trace.spans] == ["analyze", "llm"]
+        assert inner.parent_id == outer.span_id
+        assert outer.parent_id is None
+        assert inner.attributes == {"model": "gpt-4o-mini"}
+
+    def test_errors_are_recorded(self):
+        """Test that a span closed by an exception notes the error class."""
+        with start_trace("request") as trace:
+            with pytest.raises(ValueError):
+                with span("validate"):
+                    raise ValueError("too many tasks")
+        assert trace.spans[0].attributes["error"] == "ValueError"
+
+    async def test_concurrent_tasks_share_trace(self):
+        """Test that spans from spawned tasks land in the same trace and are summed in Server-Timing."""
+        async def shard():
+            with span("llm"):
+                await asyncio.sleep(0)
+
+        with start_trace("request") as trace:
+            await asyncio.gather(shard(), shard())
+
+        header = trace.server_timing()
+        assert 'llm;dur=' in header
+        assert 'desc="2 calls"' in header
+        assert header.split(", ")[-1].startswith("total;dur=")
+
+
+class TestExport:
+    """Test suite for trace export."""
+
+    def test_jsonl_exporter_writes_otlp(self, tmp_path):
+        """Test that each trace becomes one OTLP JSON line."""
+        with start_trace("POST /api/analyze") as trace:
+            with span("parse"):
+                pass
+        path = tmp_path / "traces.jsonl"
+        JsonlFileExporter(str(path)).export([trace])
+
+        lines = path.read_text().splitlines()
+        assert len(lines) == 1
+        spans = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert [s["name"] for s in spans] == ["POST /api/analyze", "parse"]
+        assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+        assert spans[1]["traceId"] == trace.trace_id
+
+    def test_otlp_exporter_sends_one_request_per_batch(self):
+        """Test that a batch of traces is posted as a single OTLP request."""
+        traces = []
+        for name in ("first", "second"):
+            with start_trace(name) as trace:
+                pass
+            traces.append(trace)
+
+        with patch("httpx.post") as post:
+            OTLPHttpExporter("http://collector:4318/v1/traces").export(traces)
+
+        post.assert_called_once()
+        spans = post.call_args.kwargs["json"]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert [s["name"] for s in spans] == ["first", "second"]
+
+
+class RecordingExporter:
+    def __init__(self, gate: threading.Event = None):
+        self.batches = []
+        self.gate = gate
+
+    def export(self, traces):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append([trace.root.name for trace in traces])
+
+
+def finished_trace(name: str):
+    with start_trace(name) as trace:
+        pass
+    return trace
+
+
+class TestBatchExporter:
+    """Test suite for exporting traces from a dedicated thread."""
+
+    def test_traces_are_exported_in_batches(self):
+        """Test that traces submitted together go out in one export call, flushed by close()."""
+        exporter = RecordingExporter()
+        batches = BatchExporter(exporter, delay_seconds=60)
+        for name in ("a", "b", "c"):
+            batches.submit(finished_trace(name))
+
+        batches.close()
+
+        assert exporter.batches == [["a", "b", "c"]]
+
+    def test_batch_size_is_bounded(self):
+        """Test that no export call carries more than max_batch traces."""
+        exporter = RecordingExporter()
+        batches = BatchExporter(exporter, max_batch=2, delay_seconds=60)
+        for name in ("a", "b", "c"):
+            batches.submit(finished_trace(name))
+
+        batches.close()
+
+        assert [len(batch) for batch in exporter.batches] == [2, 1]
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test that while the exporter is stuck, traces beyond the queue bound are dropped and counted."""
+        gate = threading.Event()
+        exporter = RecordingExporter(gate)
+        batches = BatchExporter(exporter, max_queue=2, max_batch=1, delay_seconds=0)
+        batches.submit(finished_trace("stuck"))
+        while not batches._queue.empty():
+            pass
+        for name in ("a", "b", "c"):
+            batches.submit(finished_trace(name))
+
+        assert batches.dropped == 1
+        gate.set()
+        batches.close()
+        assert exporter.batches == [["stuck"], ["a"], ["b"]]
+
+    def test_export_errors_do_not_stop_the_thread(self):
+        """Test that a failed export is logged and later batches still go out."""
+        exporter = RecordingExporter()
+        calls = []
+
+        def flaky(traces):
+            calls.append(len(traces))
+            if len(calls) == 1:
+                raise ConnectionError("collector down")
+            RecordingExporter.export(exporter, traces)
+
+        batches = BatchExporter(exporter, max_batch=1, delay_seconds=0)
+        with patch.object(exporter, "export", flaky):
+            batches.submit(finished_trace("lost"))
+            batches.submit(finished_trace("kept"))
+            batches.close()
+
+        assert exporter.batches == [["kept"]]
@@ -9,7 +9,8 @@ interface TaskInputProps {
 
 export default function TaskInput({ onAnalyze, isLoading }: TaskInputProps) {
   const [tasks, setTasks] = useState('');
-  const MAX_LENGTH = 2000;
+  // Matches the backend's default MAX_INPUT_CHARS
+  const MAX_LENGTH = 50000;
 
   const handleSubmit = (e: React.FormEvent) => {
     e.preventDefault();
@@ -25,6 +25,8 @@ export interface TaskAnalysisResponse {
   };
   breakdown: Record<string, TaskBreakdown>;
   next_action: NextAction;
+  // True when the AI backend was unavailable and the analysis was produced locally
+  degraded?: boolean;
 }
 
 export interface TaskAnalysisRequest {